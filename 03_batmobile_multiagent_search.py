@@ -2,9 +2,11 @@ import math
 from typing import Optional, Tuple
 import os
 from PIL import Image
-from smolagents import CodeAgent, GoogleSearchTool, VisitWebpageTool, LiteLLMModel
+from smolagents import CodeAgent, LiteLLMModel
 from smolagents import tool
 from smolagents.utils import encode_image_base64, make_image_url
+from tools.visit_webpage import VisitWebpageTool, VisitWebpagesTool
+from tools.web_search import GoogleSearchTool
 import dotenv
 import requests
 
@@ -136,6 +138,7 @@ web_agent = CodeAgent(
     tools=[
         GoogleSearchTool(provider="serper"),
         VisitWebpageTool(),
+        VisitWebpagesTool(),
         calculate_cargo_travel_time
     ],
     name="web_agent",
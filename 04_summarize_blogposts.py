@@ -2,16 +2,20 @@ import math
 from typing import Optional, Tuple
 import os
 from PIL import Image
-from smolagents import CodeAgent, GoogleSearchTool, HfApiModel, VisitWebpageTool, LiteLLMModel, DuckDuckGoSearchTool
+from smolagents import CodeAgent, GoogleSearchTool, HfApiModel, VisitWebpageTool, LiteLLMModel
 from smolagents import tool
+from tools.corpus_index import search_local_corpus
+from tools.read_article import ReadArticleTool, SummarizeArticleTool
+from tools.web_search import DuckDuckGoSearchTool
 
 
+NUM_CTX = 8192
 
 model = LiteLLMModel(
     model_id="ollama/qwen2.5-coder:14b",
     api_base="http://localhost:11434",
     api_key="noone needs an api key",
-    num_ctx=8192
+    num_ctx=NUM_CTX
 )
 # print(calculate_cargo_travel_time((41.8781, -87.6298), (-33.8688, 151.2093)))
 
@@ -22,7 +26,8 @@ model = LiteLLMModel(
 
 agent = CodeAgent(
     model=model,
-    tools=[DuckDuckGoSearchTool(), VisitWebpageTool()],
+    tools=[search_local_corpus, SummarizeArticleTool(model, context_tokens=NUM_CTX), ReadArticleTool(),
+           DuckDuckGoSearchTool()],
     additional_authorized_imports=["pandas"],
     max_steps=20,
 )
@@ -35,13 +40,14 @@ if __name__ == "__main__":
     input_site = "https://towardsdatascience.com/3-challenges-of-data-adoption-790a87ae3472/"
 
     task = f"""
-    Read the article on {input_site} using the tools at you disposal. Summarize the content of the blogpost extracting the key insights.
+    Summarize the article on {input_site} with the summarize_article tool, extracting the key insights.
+    Use read_article with a question to look up the sections you want to check, instead of reading the whole page again.
     """
 
     detailed_report = agent.run(f"""
     You're an expert analyst. You make comprehensive reports after visiting websites.
     You will get a url. Your Task is to write a summarization of the Key Points.
-    For each summerisation you write, visit the source url to confirm numbers.
+    For each summerisation you write, confirm the numbers in the relevant sections of the source url.
 
     {task}
     """)
@@ -3,7 +3,9 @@ import re
 from dataclasses import dataclass
 from typing import Optional, Dict, List, Any
 import os
-from smolagents import CodeAgent, GoogleSearchTool, VisitWebpageTool, LiteLLMModel, tool
+from smolagents import CodeAgent, LiteLLMModel, tool
+from tools.visit_webpage import VisitWebpageTool, VisitWebpagesTool
+from tools.web_search import GoogleSearchTool
 
 # Vereinfachte Modellkonfiguration - nur ein Modell behalten
 model = LiteLLMModel(
@@ -73,7 +75,8 @@ class CustomizableGoogleSearchTool(GoogleSearchTool):
         if max_results <= 0:
             max_results = self.default_max_results
 
-        # Rufe die übergeordnete Methode auf, um die Suchergebnisse zu erhalten
+        # Rufe die übergeordnete Methode auf, um die Suchergebnisse zu erhalten - aus dem Such-Cache,
+        # wenn die gleiche Suche (z.B. für einen anderen Datensatz an derselben Adresse) schon lief
         all_results = super().forward(query, filter_year)
 
         # Wenn keine Ergebnisse zurückgegeben wurden, gib die Nachricht unverändert zurück
@@ -391,6 +394,7 @@ def main():
 
             CustomizableGoogleSearchTool(provider="serper", default_max_results=4),
             VisitWebpageTool(),
+            VisitWebpagesTool(),
             write_to_markdown,
             create_summary_report,
 
@@ -14,20 +14,19 @@ agent = CodeAgent(tools=[scrape_website_using_sitemap_url],
                   additional_authorized_imports=["asyncio"]
                   )
 
-test_page = ["https://towardsdatascience.com/post-sitemap.xml",
-             "https://openai.com/sitemap.xml/research/"
-             ]
+if __name__ == "__main__":
+    test_page = ["https://towardsdatascience.com/post-sitemap.xml",
+                 "https://openai.com/sitemap.xml/research/"
+                 ]
 
-agent.run(
-    f"""
-    scrape the following sites one after another using the tools you got at hand.
-    {test_page}
-    The tool will skip urls that where scraped before. So, if nothing is scraped you are up to date
-    and everything went fine.
+    agent.run(
+        f"""
+        scrape the following sites one after another using the tools you got at hand.
+        {test_page}
+        The tool will skip urls that where scraped before. So, if nothing is scraped you are up to date
+        and everything went fine.
      
-    You will get feedback from the tool, explain what the tool returned to the user.
+        You will get feedback from the tool, explain what the tool returned to the user.
     
-    """
-)
-
-
+        """
+    )
@@ -0,0 +1,263 @@
+"""
+Offline throughput benchmark of the sitemap resolver and the crawl engine.
+
+Starts a synthetic local site (see `benchmarks/synthetic_site.py`), resolves
+its sitemap index and crawls it, then reports pages/sec, the latency
+distribution per stage and the memory high-water mark. Nothing goes over the
+network and all crawl output is written to a temporary directory.
+
+Run it from the repository root:
+
+    python -m benchmarks.crawl_benchmark --pages 1000 --latency-ms 5 50 --error-rate 0.02
+    python -m benchmarks.crawl_benchmark --output bench.json
+    python -m benchmarks.crawl_benchmark --baseline bench.json   # fails on a >20% throughput drop
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Optional
+
+from benchmarks.synthetic_site import SyntheticSite
+from tools.batch_crawl import run_batch
+from tools.scrape_website import get_site_urls
+
+# Metrics compared against a baseline, higher is better
+THROUGHPUT_METRICS = ("urls_per_second", "pages_per_second")
+
+
+def max_rss_mb() -> float:
+    """Returns the peak resident memory of the process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class MemoryProbe:
+    """Measures the Python heap peak of a block (with tracemalloc) and the process RSS high-water mark."""
+
+    def __init__(self, trace: bool):
+        self.trace = trace
+        self.result: Dict[str, float] = {}
+
+    def __enter__(self):
+        if self.trace:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.trace:
+            self.result["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            tracemalloc.stop()
+        self.result["max_rss_mb"] = max_rss_mb()
+
+
+def benchmark_sitemap(site: SyntheticSite, trace_memory: bool = False) -> dict:
+    """
+    Measures how fast `get_site_urls` resolves the site's sitemap index.
+
+    Args:
+        site: The running synthetic site
+        trace_memory: Also measure the Python heap peak (slows the run down)
+
+    Returns:
+        dict: URLs found, seconds, URLs/sec and memory
+    """
+    with MemoryProbe(trace_memory) as memory:
+        start = time.perf_counter()
+        urls = get_site_urls(site.index_url)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "sitemaps": site.sitemap_count + 1,
+        "urls_found": len(urls),
+        "seconds": round(elapsed, 3),
+        "urls_per_second": round(len(urls) / elapsed, 1) if elapsed else 0.0,
+        **memory.result,
+    }
+
+
+def benchmark_crawl(site: SyntheticSite, pages: int, concurrency: int, per_host_concurrency: int,
+                    trace_memory: bool = False) -> dict:
+    """
+    Measures the crawl engine on the site: fetch, convert, de-duplicate and save.
+
+    The crawl runs without politeness delay, the site is local.
+
+    Args:
+        site: The running synthetic site
+        pages: Number of posts to crawl
+        concurrency: Number of pages crawling at the same time
+        per_host_concurrency: Maximum number of pages crawling the site at the same time
+        trace_memory: Also measure the Python heap peak (slows the run down)
+
+    Returns:
+        dict: Pages/sec, outcome counts, stage latency percentiles and memory
+    """
+    with MemoryProbe(trace_memory) as memory:
+        summary = asyncio.run(run_batch(
+            [site.index_url],
+            per_site_quota=pages,
+            max_concurrency=concurrency,
+            per_host_concurrency=per_host_concurrency,
+            politeness_delay=(0.0, 0.0),
+            summary_path=None,
+        ))
+
+    stages = summary["metrics"]["stages"]
+    return {
+        "pages_attempted": summary["total_urls_attempted"],
+        "successful_crawls": summary["successful_crawls"],
+        "failed_urls": summary["failed_urls"],
+        "retries": summary["retries"],
+        "seconds": summary["elapsed_seconds"],
+        "pages_per_second": summary["pages_per_second"],
+        "bytes_received": summary["metrics"]["counters"].get("bytes_received", 0),
+        "latency": {
+            stage: {key: stages[stage][key] for key in ("p50", "p95", "p99", "max")}
+            for stage in stages
+        },
+        **memory.result,
+    }
+
+
+def compare_to_baseline(results: dict, baseline: dict, max_regression: float) -> list:
+    """
+    Finds throughput metrics that dropped by more than the allowed share.
+
+    Args:
+        results: The results of this run
+        baseline: The results of a previous run (same options)
+        max_regression: Allowed relative drop, e.g. 0.2 for 20%
+
+    Returns:
+        list: One message per regression, empty if there are none
+    """
+    regressions = []
+    for scenario, metrics in results["scenarios"].items():
+        for metric in THROUGHPUT_METRICS:
+            old = baseline.get("scenarios", {}).get(scenario, {}).get(metric)
+            new = metrics.get(metric)
+            if old and new is not None and new < old * (1 - max_regression):
+                regressions.append(f"{scenario}.{metric}: {new} vs. baseline {old} ({new / old - 1:+.0%})")
+    return regressions
+
+
+def format_memory(metrics: dict) -> str:
+    """Formats the memory measurements of a scenario."""
+    memory = f"max RSS {metrics['max_rss_mb']} MB"
+    if "python_peak_mb" in metrics:
+        memory += f", Python heap peak {metrics['python_peak_mb']} MB"
+    return memory
+
+
+def print_report(results: dict):
+    """Prints the results as a short human readable report."""
+    options = results["options"]
+    print(f"\nSynthetic site: {options['pages']} pages, gzip sitemaps: {options['gzip_sitemaps']}, "
+          f"js ratio: {options['js_ratio']}, latency: {options['latency_ms']} ms, "
+          f"errors: {options['error_rate']}, throttling: {options['throttle_rate']}")
+
+    sitemap = results["scenarios"].get("sitemap")
+    if sitemap:
+        print(f"Sitemap:  {sitemap['urls_found']} URLs from {sitemap['sitemaps']} sitemaps in {sitemap['seconds']}s "
+              f"({sitemap['urls_per_second']} URLs/s), {format_memory(sitemap)}")
+
+    crawl = results["scenarios"].get("crawl")
+    if crawl:
+        print(f"Crawl:    {crawl['successful_crawls']}/{crawl['pages_attempted']} pages in {crawl['seconds']}s "
+              f"({crawl['pages_per_second']} pages/s), {crawl['failed_urls']} failed, {crawl['retries']} retries, "
+              f"{format_memory(crawl)}")
+        for stage, latency in crawl["latency"].items():
+            print(f"  {stage:<9} p50 {latency['p50']:.4f}s  p95 {latency['p95']:.4f}s  "
+                  f"p99 {latency['p99']:.4f}s  max {latency['max']:.4f}s")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark of sitemap resolution and crawling.")
+    parser.add_argument("--scenarios", nargs="+", choices=("sitemap", "crawl"), default=["sitemap", "crawl"])
+    parser.add_argument("--pages", type=int, default=500, help="Posts on the synthetic site")
+    parser.add_argument("--crawl-pages", type=int, help="Posts to crawl (default: all)")
+    parser.add_argument("--urls-per-sitemap", type=int, default=250)
+    parser.add_argument("--no-gzip", action="store_true", help="Serve plain instead of gzip sub-sitemaps")
+    parser.add_argument("--js-ratio", type=float, default=0.0,
+                        help="Share of JavaScript-only pages (they need the crawl4ai browser)")
+    parser.add_argument("--latency-ms", type=float, nargs=2, default=(0.0, 0.0), metavar=("MIN", "MAX"))
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of 500 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of 429 responses")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--per-host-concurrency", type=int, default=8)
+    parser.add_argument("--trace-memory", action="store_true", help="Also measure the Python heap peak")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare throughput with")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed throughput drop vs. baseline")
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    baseline: Optional[dict] = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    options = {
+        "pages": args.pages,
+        "crawl_pages": args.crawl_pages or args.pages,
+        "urls_per_sitemap": args.urls_per_sitemap,
+        "gzip_sitemaps": not args.no_gzip,
+        "js_ratio": args.js_ratio,
+        "latency_ms": list(args.latency_ms),
+        "error_rate": args.error_rate,
+        "throttle_rate": args.throttle_rate,
+        "concurrency": args.concurrency,
+        "per_host_concurrency": args.per_host_concurrency,
+    }
+    results = {"options": options, "scenarios": {}}
+
+    site = SyntheticSite(
+        pages=args.pages,
+        urls_per_sitemap=args.urls_per_sitemap,
+        gzip_sitemaps=not args.no_gzip,
+        js_ratio=args.js_ratio,
+        latency=(args.latency_ms[0] / 1000, args.latency_ms[1] / 1000),
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+    )
+    cwd = os.getcwd()
+    with site, tempfile.TemporaryDirectory(prefix="crawl_benchmark_") as tmp:
+        # The crawler writes to ../DATA relative to the working directory
+        work_dir = Path(tmp) / "work"
+        work_dir.mkdir()
+        os.chdir(work_dir)
+        try:
+            if "sitemap" in args.scenarios:
+                results["scenarios"]["sitemap"] = benchmark_sitemap(site, args.trace_memory)
+            if "crawl" in args.scenarios:
+                results["scenarios"]["crawl"] = benchmark_crawl(
+                    site, options["crawl_pages"], args.concurrency, args.per_host_concurrency, args.trace_memory
+                )
+        finally:
+            os.chdir(cwd)
+
+    print_report(results)
+    if output is not None:
+        output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Results saved to: {output}")
+
+    if baseline is not None:
+        regressions = compare_to_baseline(results, baseline, args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No throughput regression against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
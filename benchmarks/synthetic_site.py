@@ -0,0 +1,216 @@
+import gzip
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+WORDS = (
+    "model data training agent inference token attention layer gradient dataset benchmark "
+    "embedding retrieval transformer evaluation prompt context latency throughput pipeline"
+).split()
+
+
+class SyntheticSite:
+    """
+    A local stand-in for a blog, served from a background thread.
+
+    It generates a sitemap index whose sub-sitemaps (optionally gzip
+    compressed) list `pages` posts. Posts are static HTML articles, or for a
+    share of them JavaScript app shells that force the browser tier.
+    Every request can be slowed down and fail randomly, so the crawler's
+    concurrency, retry and rate control paths are exercised like on a real
+    site. All content is deterministic for a given seed.
+
+    Routes: /sitemap_index.xml, /sitemap-<n>.xml[.gz], /posts/<n>, /robots.txt, /
+    """
+
+    def __init__(
+            self,
+            pages: int = 500,
+            urls_per_sitemap: int = 250,
+            gzip_sitemaps: bool = True,
+            js_ratio: float = 0.0,
+            paragraphs: Tuple[int, int] = (20, 60),
+            latency: Tuple[float, float] = (0.0, 0.0),
+            error_rate: float = 0.0,
+            throttle_rate: float = 0.0,
+            seed: int = 42,
+    ):
+        """
+        Args:
+            pages: Number of posts listed in the sitemaps
+            urls_per_sitemap: Posts per sub-sitemap
+            gzip_sitemaps: Serve the sub-sitemaps as .xml.gz
+            js_ratio: Share of posts that only render with JavaScript
+            paragraphs: (min, max) paragraphs per post
+            latency: (min, max) seconds every response is delayed
+            error_rate: Share of post requests answered with a 500
+            throttle_rate: Share of post requests answered with a 429 and Retry-After: 1
+            seed: Seed for content and failures
+        """
+        self.pages = pages
+        self.urls_per_sitemap = max(1, urls_per_sitemap)
+        self.gzip_sitemaps = gzip_sitemaps
+        self.js_ratio = js_ratio
+        self.paragraphs = paragraphs
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.seed = seed
+
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self.requests = 0
+
+    @property
+    def base_url(self) -> str:
+        """The address of the running site, e.g. http://127.0.0.1:8123"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def index_url(self) -> str:
+        """The sitemap index listing all sub-sitemaps."""
+        return f"{self.base_url}/sitemap_index.xml"
+
+    @property
+    def sitemap_count(self) -> int:
+        """Number of sub-sitemaps."""
+        return (self.pages + self.urls_per_sitemap - 1) // self.urls_per_sitemap
+
+    def start(self) -> "SyntheticSite":
+        """Starts serving on a free local port."""
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                site.handle(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stops the server."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _chance(self) -> float:
+        with self._random_lock:
+            return self._random.random()
+
+    def sitemap_index(self) -> bytes:
+        """Renders the sitemap index."""
+        suffix = ".xml.gz" if self.gzip_sitemaps else ".xml"
+        sitemaps = "".join(
+            f"<sitemap><loc>{self.base_url}/sitemap-{n}{suffix}</loc></sitemap>"
+            for n in range(self.sitemap_count)
+        )
+        return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="{SITEMAP_NS}">{sitemaps}</sitemapindex>'.encode()
+
+    def sitemap(self, n: int) -> bytes:
+        """Renders sub-sitemap n, newest posts first."""
+        first = n * self.urls_per_sitemap
+        urls = "".join(
+            f"<url><loc>{self.base_url}/posts/{page}</loc>"
+            f"<lastmod>2025-{1 + page % 12:02d}-{1 + page % 28:02d}</lastmod></url>"
+            for page in range(first, min(first + self.urls_per_sitemap, self.pages))
+        )
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{SITEMAP_NS}">{urls}</urlset>'.encode()
+
+    def is_js_page(self, page: int) -> bool:
+        """Whether a post is a JavaScript app shell (decided by the seed, stable across requests)."""
+        return random.Random(self.seed * 1_000_003 + page).random() < self.js_ratio
+
+    def post(self, page: int) -> bytes:
+        """Renders a post."""
+        if self.is_js_page(page):
+            return (
+                "<html><head><title>Loading</title></head><body>"
+                '<div id="root"></div><noscript>Please enable JavaScript to view this page.</noscript>'
+                '<script src="/static/app.js"></script></body></html>'
+            ).encode()
+
+        rng = random.Random(self.seed + page)
+        paragraphs = "".join(
+            "<p>" + " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))) + ".</p>"
+            for _ in range(rng.randint(*self.paragraphs))
+        )
+        return (
+            f"<html><head><title>Post {page}</title></head><body>"
+            '<nav><a href="/">Home</a> <a href="/about">About</a> <a href="/blog">Blog</a></nav>'
+            f"<article><h1>Post {page}</h1>{paragraphs}</article>"
+            "<footer>Copyright 2025. Subscribe to our newsletter.</footer></body></html>"
+        ).encode()
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        """Answers one request."""
+        self.requests += 1
+        if self.latency[1] > 0:
+            time.sleep(random.uniform(*self.latency))
+
+        path = request.path.split("?")[0]
+        status, content_type, body, headers = 200, "text/html; charset=utf-8", b"", {}
+
+        if path == "/sitemap_index.xml":
+            content_type, body = "application/xml", self.sitemap_index()
+        elif path.startswith("/sitemap-") and path.endswith((".xml", ".xml.gz")):
+            try:
+                n = int(path[len("/sitemap-"):].split(".")[0])
+            except ValueError:
+                n = self.sitemap_count
+            if n < self.sitemap_count:
+                content_type, body = "application/xml", self.sitemap(n)
+                if path.endswith(".gz"):
+                    content_type, body = "application/x-gzip", gzip.compress(body)
+            else:
+                status = 404
+        elif path.startswith("/posts/"):
+            try:
+                page = int(path[len("/posts/"):].strip("/"))
+            except ValueError:
+                page = self.pages
+            chance = self._chance()
+            if page >= self.pages:
+                status = 404
+            elif chance < self.throttle_rate:
+                status, headers = 429, {"Retry-After": "1"}
+            elif chance < self.throttle_rate + self.error_rate:
+                status = 500
+            else:
+                body = self.post(page)
+                headers = {"ETag": f'"post-{page}"'}
+        elif path == "/robots.txt":
+            content_type = "text/plain"
+            body = f"User-agent: *\nAllow: /\nSitemap: {self.index_url}\n".encode()
+        elif path == "/":
+            body = b"<html><body><h1>Synthetic blog</h1></body></html>"
+        else:
+            status = 404
+
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(body)
@@ -1,29 +1,14 @@
-from smolagents import CodeAgent, DuckDuckGoSearchTool, LiteLLMModel, tool
-from source.ai_blogs import ai_blog_sitemaps
-
-model = LiteLLMModel(
-    model_id="ollama/qwen2.5-coder:14b",
-    api_base="http://localhost:11434",
-    api_key="noone needs an api key",
-    num_ctx=8192
-)
+import asyncio
 
+from source.ai_blogs import ai_blog_sitemaps
+from tools.sitemap_discovery import get_sitemap_discovery
 
+# Finding a sitemap is deterministic: robots.txt, <link rel> hints and the usual
+# locations are checked in one round of concurrent requests, no model needed.
+# Agents can use the same lookup through the `find_sitemap` tool.
+sites = ["https://bair.berkeley.edu"] + ai_blog_sitemaps
 
-agent = CodeAgent(tools=[],
-                  model=model,
-                  additional_authorized_imports=["selenium",
-                                                 "selenium.webdriver.common.by",
-                                                 "selenium.webdriver.common.keys",
-                                                 "requests",
-                                                 "subprocess"]
-                  )
+results = asyncio.run(get_sitemap_discovery().discover_many(sites))
 
-agent.run(
-    """
-    write code to use selenium to look if there is a sitemap on the webpage: https://bair.berkeley.edu
-    try different approaches and names for the sitemap. Think about what is best practice first. 
-    try requests first. If it's not working, use selenium.
-    your task is to return the complete web adress to the sitemap.
-    """
-)
+for site, sitemaps in results.items():
+    print(f"{site}: {sitemaps[0] if sitemaps else 'no sitemap found'}")
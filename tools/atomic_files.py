@@ -0,0 +1,50 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """
+    Writes a file so that readers (and a crashed process) see either the old or the new content.
+
+    The data goes to a temporary file in the same directory, is flushed to
+    disk and then renamed over the target.
+
+    Args:
+        path: The file to write
+        data: The content
+    """
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def atomic_write_text(path: Path, text: str):
+    """
+    Atomically writes a UTF-8 text file.
+
+    Args:
+        path: The file to write
+        text: The content
+    """
+    atomic_write_bytes(path, text.encode("utf-8"))
+
+
+def atomic_write_json(path: Path, data):
+    """
+    Atomically writes a JSON file (indented like the rest of the crawl results).
+
+    Args:
+        path: The file to write
+        data: The JSON-serializable content
+    """
+    atomic_write_text(path, json.dumps(data, indent=2))
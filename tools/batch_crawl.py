@@ -0,0 +1,412 @@
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from tools.atomic_files import atomic_write_json
+from tools.browser_pool import CrawlerPool
+from tools.content_store import ContentStore
+from tools.corpus_index import CorpusIndex
+from tools.crawl_journal import CrawlJournal
+from tools.crawl_manifest import CrawlManifest
+from tools.crawl_metrics import CrawlMetrics
+from tools.crawl_scheduler import get_host
+from tools.markdown_workers import ConversionPool
+from tools.near_duplicates import NearDuplicateIndex
+from tools.rate_control import RetryPolicy
+from tools.scrape_website import SiteCrawl, crawl_sites, get_domain_name, plan_site_crawl, resume_crawl
+from tools.sitemap_discovery import SitemapDiscovery, get_sitemap_discovery
+from tools.sitemap_parser import SitemapEntry
+from tools.sitemap_resolver import SitemapResolver
+from tools.url_frontier import UrlFrontier, UrlRules
+
+
+DEFAULT_BATCH_SUMMARY_PATH = Path("../DATA/crawl_results") / "batch_summary.json"
+
+# Number of pages crawled per site unless a site has its own quota
+DEFAULT_SITE_QUOTA = 11
+
+
+def load_sitemap_list(path: Optional[str] = None) -> List[str]:
+    """
+    Loads the sitemaps to crawl.
+
+    Args:
+        path: Optional text file with one sitemap URL per line (blank lines and
+            lines starting with # are ignored). Without it `source.ai_blogs.ai_blog_sitemaps` is used.
+
+    Returns:
+        List[str]: The sitemap URLs
+    """
+    if path is None:
+        from source.ai_blogs import ai_blog_sitemaps
+        return list(ai_blog_sitemaps)
+
+    with open(path, encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+def is_sitemap_url(url: str) -> bool:
+    """
+    Checks whether a URL points at a sitemap or feed rather than at a site.
+
+    Args:
+        url: The URL to check
+
+    Returns:
+        bool: True for .xml, .xml.gz and .rss files and /feed or /rss paths
+    """
+    path = url.split("?")[0].rstrip("/").lower()
+    return path.endswith((".xml", ".xml.gz", ".rss", "/feed", "/rss"))
+
+
+async def locate_sitemap(url: str, discovery: Optional[SitemapDiscovery] = None) -> str:
+    """
+    Returns the sitemap to crawl for a sitemap URL or a site address.
+
+    Site addresses are looked up with the sitemap discovery (robots.txt, link
+    hints, common locations); only if that finds nothing `<site>/sitemap.xml`
+    is guessed.
+
+    Args:
+        url: A sitemap URL or the address of the site
+        discovery: Optional discovery to use, the process-wide one otherwise
+
+    Returns:
+        str: The sitemap URL
+    """
+    if is_sitemap_url(url):
+        return url
+    sitemaps = await (discovery or get_sitemap_discovery()).discover(url)
+    if sitemaps:
+        print(f"Using sitemap {sitemaps[0]} for {url}")
+        return sitemaps[0]
+
+    # Nothing found, fall back to the usual location
+    sitemap_url = url if url.endswith('/') else url + '/'
+    sitemap_url += 'sitemap.xml'
+    print(f"Adjusted URL to: {sitemap_url}")
+    return sitemap_url
+
+
+async def resolve_sitemap(sitemap_url: str, metrics: Optional[CrawlMetrics] = None) -> List[SitemapEntry]:
+    """
+    Fetches all entries of a sitemap, without failing the whole batch on errors.
+
+    Args:
+        sitemap_url: The sitemap or sitemap index to read
+        metrics: Optional collector for the time and bytes spent on the sitemap
+
+    Returns:
+        List[SitemapEntry]: The entries, empty if the sitemap could not be read
+    """
+    print(f"Fetching URLs from sitemap: {sitemap_url}")
+    resolver = SitemapResolver()
+    start = time.perf_counter()
+    try:
+        entries = await resolver.resolve_entries(sitemap_url)
+    except Exception as e:
+        print(f"Error fetching sitemap {sitemap_url}: {e}")
+        entries = []
+    if metrics is not None:
+        host = get_host(sitemap_url)
+        metrics.observe(host, "sitemap", time.perf_counter() - start)
+        metrics.count(host, "sitemaps_fetched", resolver.sitemaps_fetched)
+        metrics.count(host, "sitemap_bytes", resolver.bytes_received)
+    print(f"Found {len(entries)} URLs in {sitemap_url}")
+    return entries
+
+
+def site_summary(sitemap_url: str, urls_found: int, site: Optional[SiteCrawl], recrawl: bool = False) -> dict:
+    """
+    Builds the entry of one site in the batch summary.
+
+    Args:
+        sitemap_url: The sitemap of the site
+        urls_found: Number of URLs listed in the sitemap
+        site: The site's crawl, None if nothing could be planned
+        recrawl: Whether the batch refreshed previously crawled pages
+
+    Returns:
+        dict: The site's counters and result message
+    """
+    if site is None:
+        return {
+            "sitemap_url": sitemap_url,
+            "domain": get_domain_name(sitemap_url),
+            "urls_found": urls_found,
+            "message": "No URLs found to crawl. The site may be blocking access or using a non-standard format.",
+        }
+    return {
+        "sitemap_url": sitemap_url,
+        "domain": site.domain,
+        "urls_found": urls_found,
+        "urls_attempted": len(site.urls_to_crawl),
+        "successful_crawls": site.successful_crawls,
+        "unchanged_urls": site.unchanged_urls,
+        "failed_urls": site.failed_urls,
+        "retries": site.retries,
+        "skipped_urls": site.skipped_urls,
+        "results_directory": str(site.results_dir),
+        "message": site.message(recrawl),
+    }
+
+
+async def run_batch(
+        sitemaps: List[str],
+        per_site_quota: int = DEFAULT_SITE_QUOTA,
+        quotas: Optional[Dict[str, int]] = None,
+        max_concurrency: int = 8,
+        per_host_concurrency: int = 1,
+        politeness_delay: Tuple[float, float] = (2.0, 4.0),
+        recrawl: bool = False,
+        pool: Optional[CrawlerPool] = None,
+        use_http_tier: bool = True,
+        manifest: Optional[CrawlManifest] = None,
+        content_store: Optional[ContentStore] = None,
+        journal: Optional[CrawlJournal] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        frontier: Optional[UrlFrontier] = None,
+        summary_path: Optional[Path] = DEFAULT_BATCH_SUMMARY_PATH,
+        prometheus_path: Optional[Path] = None,
+        corpus_index: Optional[CorpusIndex] = None,
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+        converter: Optional[ConversionPool] = None,
+) -> dict:
+    """
+    Crawls several sites at once under one global scheduler.
+
+    All sitemaps are resolved concurrently. The URL frontier drops non-article
+    pages (tags, authors, categories, ...) and every site gets its newest
+    entries up to its quota. These are filtered against the crawl manifest,
+    and the remaining pages of all sites
+    share one pool of workers. Politeness still applies per host, so the batch
+    takes about as long as its largest site instead of the sum of all sites.
+
+    Args:
+        sitemaps: The sitemap URLs (or site addresses, their sitemap is discovered) to crawl
+        per_site_quota: Number of newest pages taken from each sitemap
+        quotas: Optional quota per sitemap URL, overriding `per_site_quota`
+        max_concurrency: Number of pages crawling at the same time, over all sites
+        per_host_concurrency: Maximum number of pages crawling the same host at the same time
+        politeness_delay: (min, max) seconds to wait between two requests to the same host
+        recrawl: Refresh previously crawled pages instead of skipping them
+        pool: Optional warm crawler pool to borrow the browser from. The coroutine
+            must then run on the pool's loop (`pool.run(...)`).
+        use_http_tier: Try the plain HTTP fetch before the browser
+        manifest: Optional crawl manifest to use, the default one under ../DATA/crawl_results otherwise
+        content_store: Optional content store to save markdown compressed and de-duplicated by hash
+        journal: Optional crawl journal, the batch is then logged as one run that `resume_crawl` can continue
+        retry_policy: Optional retry policy; its retry budget is shared by all sites of the batch
+        frontier: Optional URL frontier with the include/exclude rules per domain, the default one otherwise
+        summary_path: Where to write the consolidated summary, None to skip it
+        prometheus_path: Optional file to export the batch metrics to in the Prometheus text format
+        corpus_index: Optional full-text index to add saved pages to, the default one under
+            ../DATA/crawl_results otherwise
+        near_duplicates: Optional near-duplicate index to fingerprint saved pages in, the default
+            one under ../DATA/crawl_results otherwise
+        converter: Optional pool converting the pages to markdown, the process-wide one otherwise
+
+    Returns:
+        dict: The consolidated summary with totals, one entry per site and the
+            stage timing percentiles per host (for capacity planning)
+    """
+    start = time.perf_counter()
+    frontier = frontier or UrlFrontier()
+    located = await asyncio.gather(*(locate_sitemap(sitemap_url) for sitemap_url in sitemaps))
+    # Quotas may be given for the input or for the located sitemap
+    quotas = dict(quotas or {})
+    for original, sitemap_url in zip(sitemaps, located):
+        if original in quotas:
+            quotas.setdefault(sitemap_url, quotas[original])
+    sitemaps = list(dict.fromkeys(located))
+
+    run_id = None
+    if journal is not None:
+        run_id = journal.start_run(sitemaps, max_urls=per_site_quota, quotas=quotas, recrawl=recrawl,
+                                   content_store=content_store is not None)
+
+    metrics = CrawlMetrics()
+    all_entries = await asyncio.gather(*(resolve_sitemap(sitemap_url, metrics) for sitemap_url in sitemaps))
+
+    own_manifest = manifest is None
+    if own_manifest:
+        manifest = CrawlManifest()
+    own_index = corpus_index is None
+    if own_index:
+        corpus_index = CorpusIndex()
+    own_near_duplicates = near_duplicates is None
+    if own_near_duplicates:
+        near_duplicates = NearDuplicateIndex()
+    planned: Dict[str, Optional[SiteCrawl]] = {}
+    try:
+        for sitemap_url, entries in zip(sitemaps, all_entries):
+            entries = frontier.select(entries, quotas.get(sitemap_url, per_site_quota))
+            if not entries:
+                planned[sitemap_url] = None
+                continue
+            lastmods = {entry.loc: entry.lastmod for entry in entries if entry.lastmod}
+            planned[sitemap_url] = plan_site_crawl(
+                [entry.loc for entry in entries], sitemap_url, manifest, lastmods, recrawl
+            )
+
+        # A page listed by several sitemaps of the batch (e.g. an index and its posts sitemap) belongs to the first
+        planned_urls = set()
+        for site in planned.values():
+            if site is None:
+                continue
+            listed_before = [url for url in site.urls_to_crawl if url in planned_urls]
+            if listed_before:
+                site.urls_to_crawl = [url for url in site.urls_to_crawl if url not in planned_urls]
+                site.skipped_urls += len(listed_before)
+            planned_urls.update(site.urls_to_crawl)
+
+        sites = [site for site in planned.values() if site is not None]
+        if sites:
+            await crawl_sites(
+                sites, manifest,
+                max_concurrency=max_concurrency,
+                per_host_concurrency=per_host_concurrency,
+                politeness_delay=politeness_delay,
+                pool=pool,
+                use_http_tier=use_http_tier,
+                content_store=content_store,
+                journal=journal,
+                run_id=run_id,
+                retry_policy=retry_policy,
+                metrics=metrics,
+                corpus_index=corpus_index,
+                near_duplicates=near_duplicates,
+                converter=converter,
+            )
+    finally:
+        if own_manifest:
+            manifest.close()
+        if own_index:
+            corpus_index.close()
+        if own_near_duplicates:
+            near_duplicates.close()
+        if prometheus_path is not None:
+            metrics.write_prometheus(prometheus_path)
+
+    if journal is not None:
+        journal.end_run(run_id)
+
+    site_summaries = [
+        site_summary(sitemap_url, len(entries), planned.get(sitemap_url), recrawl)
+        for sitemap_url, entries in zip(sitemaps, all_entries)
+    ]
+    elapsed = time.perf_counter() - start
+    successful_crawls = sum(site.get("successful_crawls", 0) for site in site_summaries)
+    summary = {
+        "crawl_time": datetime.now().isoformat(),
+        "elapsed_seconds": round(elapsed, 3),
+        "pages_per_second": round(successful_crawls / elapsed, 3) if elapsed else 0.0,
+        "sitemaps": len(sitemaps),
+        "total_urls_attempted": sum(site.get("urls_attempted", 0) for site in site_summaries),
+        "successful_crawls": successful_crawls,
+        "unchanged_urls": sum(site.get("unchanged_urls", 0) for site in site_summaries),
+        "failed_urls": sum(site.get("failed_urls", 0) for site in site_summaries),
+        "retries": sum(site.get("retries", 0) for site in site_summaries),
+        "skipped_urls": sum(site.get("skipped_urls", 0) for site in site_summaries),
+        "sites": site_summaries,
+        "metrics": metrics.summary(),
+    }
+    if summary_path is not None:
+        summary_path = Path(summary_path)
+        summary_path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(summary_path, summary)
+        print(f"Batch summary saved to: {summary_path}")
+
+    return summary
+
+
+def parse_site_quotas(values: List[str]) -> Dict[str, int]:
+    """
+    Parses `--site-quota SITEMAP=N` arguments.
+
+    Args:
+        values: The raw arguments
+
+    Returns:
+        Dict[str, int]: Quota per sitemap URL
+    """
+    quotas = {}
+    for value in values:
+        sitemap_url, _, quota = value.rpartition("=")
+        if not sitemap_url or not quota.isdigit():
+            raise argparse.ArgumentTypeError(f"Expected SITEMAP=N, got {value}")
+        quotas[sitemap_url] = int(quota)
+    return quotas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl many sitemaps in one batch without an agent.")
+    parser.add_argument("--sitemaps-file", help="File with one sitemap URL per line (default: source/ai_blogs.py)")
+    parser.add_argument("--quota", type=int, default=DEFAULT_SITE_QUOTA, help="Pages per site")
+    parser.add_argument("--site-quota", action="append", default=[], metavar="SITEMAP=N",
+                        help="Quota for a single sitemap, can be repeated")
+    parser.add_argument("--concurrency", type=int, default=8, help="Pages crawled at the same time")
+    parser.add_argument("--per-host-concurrency", type=int, default=1, help="Pages per host at the same time")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per page, including the first")
+    parser.add_argument("--retry-budget", type=int, default=50, help="Retries allowed over the whole batch")
+    parser.add_argument("--all-urls", action="store_true", help="Do not filter out non-article URLs")
+    parser.add_argument("--recrawl", action="store_true", help="Refresh previously crawled pages")
+    parser.add_argument("--no-http-tier", action="store_true", help="Always use the browser")
+    parser.add_argument("--content-store", action="store_true",
+                        help="Save markdown compressed and de-duplicated by hash instead of as plain .md files")
+    parser.add_argument("--conversion-workers", type=int,
+                        help="Processes converting pages to markdown (default: one per core except one, 0: inline)")
+    parser.add_argument("--prometheus-file", help="Also export the metrics in the Prometheus text format")
+    parser.add_argument("--resume", action="store_true", help="Continue interrupted runs from the crawl journal")
+    args = parser.parse_args()
+
+    frontier = None
+    if args.all_urls:
+        frontier = UrlFrontier(domain_rules={}, default_rules=UrlRules(exclude=(), min_depth=0))
+
+    journal = CrawlJournal()
+    converter = ConversionPool(args.conversion_workers) if args.conversion_workers is not None else None
+    if args.resume:
+        # The crawl options of this call apply to the resumed runs as well
+        messages = asyncio.run(resume_crawl(
+            journal,
+            frontier=frontier,
+            max_concurrency=args.concurrency,
+            per_host_concurrency=args.per_host_concurrency,
+            use_http_tier=not args.no_http_tier,
+            retry_policy=RetryPolicy(max_attempts=args.max_attempts, retry_budget=args.retry_budget),
+            converter=converter,
+        ))
+        for message in messages:
+            print(message)
+        return
+
+    summary = asyncio.run(run_batch(
+        load_sitemap_list(args.sitemaps_file),
+        per_site_quota=args.quota,
+        quotas=parse_site_quotas(args.site_quota),
+        max_concurrency=args.concurrency,
+        per_host_concurrency=args.per_host_concurrency,
+        recrawl=args.recrawl,
+        use_http_tier=not args.no_http_tier,
+        journal=journal,
+        retry_policy=RetryPolicy(max_attempts=args.max_attempts, retry_budget=args.retry_budget),
+        prometheus_path=args.prometheus_file,
+        frontier=frontier,
+        converter=converter,
+        content_store=ContentStore() if args.content_store else None,
+    ))
+    journal.compact()
+
+    for site in summary["sites"]:
+        print(f"{site['domain']}: {site['message']}")
+    print(f"Crawled {summary['successful_crawls']} of {summary['total_urls_attempted']} pages "
+          f"on {summary['sitemaps']} sites in {summary['elapsed_seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import asyncio
+import atexit
+import heapq
+import threading
+import time
+from typing import Dict, List, Optional
+
+from crawl4ai import AsyncWebCrawler, BrowserConfig
+
+
+def create_browser_config() -> BrowserConfig:
+    """
+    Creates the headless browser configuration used for all crawls.
+
+    Returns:
+        BrowserConfig: The crawl4ai browser configuration
+    """
+    return BrowserConfig(
+        headless=True,
+        extra_args=[
+            "--disable-gpu",
+            "--disable-dev-shm-usage",
+            "--no-sandbox",
+            "--disable-setuid-sandbox",
+            "--disable-web-security",
+            "--disable-features=IsolateOrigins,site-per-process"
+        ],
+    )
+
+
+class CrawlerPool:
+    """
+    A long-lived, lazily started headless browser shared by all tool calls.
+
+    The browser lives on its own event loop in a background thread, so
+    synchronous callers (like smolagents tools) can submit coroutines with
+    `run()` without starting a new browser each time. The browser is closed
+    after `idle_timeout` seconds without work and restarted on the next call.
+    Every crawl worker holds a slot of its own (`acquire_slot()`), so runs
+    submitted from different threads never drive the same browser page.
+    Browser pages (crawl4ai sessions) are recycled after
+    `max_navigations_per_page` navigations to keep memory bounded.
+    """
+
+    def __init__(self, idle_timeout: float = 300.0, max_navigations_per_page: int = 50):
+        """
+        Args:
+            idle_timeout: Seconds without work after which the browser is closed
+            max_navigations_per_page: Navigations after which a page is closed and replaced
+        """
+        self.idle_timeout = idle_timeout
+        self.max_navigations_per_page = max_navigations_per_page
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+        self._crawler: Optional[AsyncWebCrawler] = None
+        self._crawler_lock: Optional[asyncio.Lock] = None
+        self._active_runs = 0
+        self._last_used = time.monotonic()
+
+        # slot -> (generation, navigations on the current page)
+        self._sessions: Dict[int, list] = {}
+        # Slots given back by finished workers, reused lowest first so pages are reused too
+        self._free_slots: List[int] = []
+        self._slot_count = 0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Starts the background event loop thread if it is not running yet."""
+        with self._thread_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="crawler-pool",
+                    daemon=True,
+                )
+                self._thread.start()
+        return self._loop
+
+    def run(self, coro):
+        """
+        Runs a coroutine on the pool's event loop and waits for its result.
+
+        Args:
+            coro: The coroutine to run, typically a crawl using `get_crawler()`
+
+        Returns:
+            The result of the coroutine
+        """
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._tracked(coro), loop)
+        return future.result()
+
+    async def _tracked(self, coro):
+        """Keeps track of running work so the idle timer does not close a busy browser."""
+        self._active_runs += 1
+        try:
+            return await coro
+        finally:
+            self._active_runs -= 1
+            self._last_used = time.monotonic()
+            asyncio.get_running_loop().call_later(
+                self.idle_timeout,
+                lambda: asyncio.ensure_future(self._close_if_idle()),
+            )
+
+    async def get_crawler(self) -> AsyncWebCrawler:
+        """
+        Returns the shared crawler, starting the browser if necessary.
+
+        Must be awaited on the pool's event loop (i.e. inside `run()`).
+
+        Returns:
+            AsyncWebCrawler: The started crawler
+        """
+        if self._crawler_lock is None:
+            self._crawler_lock = asyncio.Lock()
+
+        async with self._crawler_lock:
+            if self._crawler is None:
+                print("Starting shared browser...")
+                crawler = AsyncWebCrawler(config=create_browser_config())
+                await crawler.start()
+                self._crawler = crawler
+                self._sessions.clear()
+            return self._crawler
+
+    def acquire_slot(self) -> int:
+        """
+        Hands out a worker slot that no other running crawl holds.
+
+        Must be called on the pool's event loop (i.e. inside `run()`); give the
+        slot back with `release_slot()` when the worker is done.
+
+        Returns:
+            int: The slot to pass to `lease_session()`
+        """
+        if self._free_slots:
+            return heapq.heappop(self._free_slots)
+        self._slot_count += 1
+        return self._slot_count
+
+    def release_slot(self, slot: int):
+        """
+        Gives a slot back, its browser page stays open for the next worker.
+
+        Args:
+            slot: A slot from `acquire_slot()`
+        """
+        heapq.heappush(self._free_slots, slot)
+
+    async def lease_session(self, slot: int) -> str:
+        """
+        Returns the session id (browser page) a worker should use for its next navigation.
+
+        Pages that reached `max_navigations_per_page` are closed and replaced
+        by a fresh one.
+
+        Args:
+            slot: The worker slot asking for a page, from `acquire_slot()`
+
+        Returns:
+            str: The crawl4ai session id to pass to `arun()`
+        """
+        generation, navigations = self._sessions.setdefault(slot, [0, 0])
+        if navigations >= self.max_navigations_per_page:
+            await self._kill_session(f"pool{slot}_{generation}")
+            generation, navigations = generation + 1, 0
+
+        self._sessions[slot] = [generation, navigations + 1]
+        return f"pool{slot}_{generation}"
+
+    async def _kill_session(self, session_id: str):
+        """Closes the browser page behind a session id."""
+        if self._crawler is None:
+            return
+        try:
+            await self._crawler.crawler_strategy.kill_session(session_id)
+        except Exception as e:
+            print(f"Could not close browser page {session_id}: {e}")
+
+    async def _close_if_idle(self):
+        """Closes the browser once the pool has been idle for `idle_timeout` seconds."""
+        idle_for = time.monotonic() - self._last_used
+        if self._crawler is None or self._active_runs or idle_for < self.idle_timeout:
+            return
+        await self._close_crawler()
+
+    async def _close_crawler(self):
+        """Closes the browser if it is running."""
+        if self._crawler is None:
+            return
+        crawler, self._crawler = self._crawler, None
+        # Slots stay with their workers, their pages are opened again on the next browser
+        self._sessions.clear()
+        print("Closing shared browser...")
+        await crawler.close()
+
+    def shutdown(self):
+        """Closes the browser and stops the background event loop."""
+        with self._thread_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_crawler(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._crawler_lock = None
+
+
+_crawler_pool: Optional[CrawlerPool] = None
+_crawler_pool_lock = threading.Lock()
+
+
+def get_crawler_pool() -> CrawlerPool:
+    """
+    Returns the process-wide crawler pool, creating it on first use.
+
+    Returns:
+        CrawlerPool: The shared pool
+    """
+    global _crawler_pool
+    with _crawler_pool_lock:
+        if _crawler_pool is None:
+            _crawler_pool = CrawlerPool()
+            atexit.register(_crawler_pool.shutdown)
+        return _crawler_pool
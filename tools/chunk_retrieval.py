@@ -0,0 +1,253 @@
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from tools.text_tokens import CHARS_PER_TOKEN, QUERY_TERM_PATTERN, STOPWORDS, estimate_tokens
+
+
+# Okapi BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+ATX_HEADING_PATTERN = re.compile(r"^\s{0,3}(#{1,6})\s+(.+?)\s*#*\s*$")
+SETEXT_UNDERLINE_PATTERN = re.compile(r"^\s{0,3}(=+|-+)\s*$")
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lower-cased search terms without stopwords and single letters.
+
+    Args:
+        text: The text
+
+    Returns:
+        List[str]: The terms
+    """
+    return [term for term in (t.lower() for t in QUERY_TERM_PATTERN.findall(text))
+            if term not in STOPWORDS and (len(term) > 1 or term.isdigit())]
+
+
+@dataclass
+class Chunk:
+    """A section of an article, small enough to be ranked and sent to the model on its own."""
+    index: int
+    heading: str
+    text: str
+    tokens: int = 0
+    terms: Counter = field(default_factory=Counter, repr=False)
+
+    def __post_init__(self):
+        self.tokens = estimate_tokens(self.text)
+        self.terms = Counter(tokenize(f"{self.heading} {self.text}"))
+
+
+def _split_long(text: str, max_tokens: int) -> List[str]:
+    """Splits text into pieces of at most `max_tokens`, at paragraphs, then sentences, then hard cuts."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    # Aim for pieces of even size instead of full ones and a small remainder
+    target_chars = min(max_chars, int(len(text) / math.ceil(len(text) / max_chars) * 1.1) + 1)
+    # (text, separator before it): sentences of a long paragraph are rejoined with a space
+    units = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        sentences = [paragraph] if len(paragraph) <= max_chars else SENTENCE_END_PATTERN.split(paragraph)
+        units.extend((sentence, "\n\n" if number == 0 else " ") for number, sentence in enumerate(sentences))
+
+    pieces, current = [], ""
+    for unit, separator in units:
+        if len(unit) > max_chars:
+            # A sentence longer than a chunk, cut it
+            if current:
+                pieces.append(current)
+            pieces.extend(unit[start:start + max_chars] for start in range(0, len(unit), max_chars))
+            current = ""
+            continue
+        if current and len(current) + len(unit) + 2 > target_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current}{separator}{unit}" if current else unit
+    if current.strip():
+        pieces.append(current)
+    return [piece.strip() for piece in pieces if piece.strip()]
+
+
+def split_markdown(markdown: str, max_tokens: int = 400) -> List[Chunk]:
+    """
+    Splits markdown into chunks along its heading structure.
+
+    Every section (heading plus body) becomes one chunk; sections longer than
+    `max_tokens` are split at paragraph and sentence boundaries. Each chunk
+    remembers its heading path (e.g. "Title > Results"), which is also
+    used for ranking.
+
+    Args:
+        markdown: The article as markdown
+        max_tokens: Maximum estimated tokens per chunk
+
+    Returns:
+        List[Chunk]: The chunks in document order
+    """
+    sections = []
+    headings: List[tuple] = []
+    lines: List[str] = []
+
+    def flush():
+        body = "\n".join(lines).strip()
+        if body:
+            sections.append((" > ".join(title for _, title in headings), body))
+        lines.clear()
+
+    raw_lines = markdown.splitlines()
+    skip_underline = False
+    for number, line in enumerate(raw_lines):
+        if skip_underline:
+            skip_underline = False
+            continue
+        match = ATX_HEADING_PATTERN.match(line)
+        level, title = (len(match.group(1)), match.group(2)) if match else (None, None)
+        following = raw_lines[number + 1] if number + 1 < len(raw_lines) else ""
+        if level is None and line.strip() and SETEXT_UNDERLINE_PATTERN.match(following) and len(following.strip()) >= 3:
+            level, title = (1 if following.strip()[0] == "=" else 2), line.strip()
+            skip_underline = True
+        if level is not None:
+            flush()
+            headings = [(lvl, t) for lvl, t in headings if lvl < level] + [(level, title.strip())]
+            continue
+        lines.append(line)
+    flush()
+
+    chunks = []
+    for heading, body in sections:
+        for piece in _split_long(body, max_tokens):
+            chunks.append(Chunk(len(chunks), heading, piece))
+    return chunks
+
+
+class BM25:
+    """Okapi BM25 ranking over a fixed list of chunks, pure Python."""
+
+    def __init__(self, chunks: List[Chunk], k1: float = BM25_K1, b: float = BM25_B):
+        """
+        Args:
+            chunks: The chunks to rank
+            k1: Term frequency saturation
+            b: Length normalization
+        """
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.lengths = [sum(chunk.terms.values()) for chunk in chunks]
+        self.average_length = (sum(self.lengths) / len(chunks)) if chunks else 0.0
+        document_frequency = Counter(term for chunk in chunks for term in chunk.terms)
+        count = len(chunks)
+        self.idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+    def scores(self, query: str) -> List[float]:
+        """
+        Scores every chunk against a query.
+
+        Args:
+            query: Free text
+
+        Returns:
+            List[float]: One score per chunk (0.0 if no query term occurs in it)
+        """
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term in self.idf]
+        scores = []
+        for chunk, length in zip(self.chunks, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.average_length or 1))
+            for term in terms:
+                frequency = chunk.terms.get(term, 0)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            scores.append(score)
+        return scores
+
+
+def select_chunks(chunks: List[Chunk], query: Optional[str], token_budget: int = 2500,
+                  keep_intro: bool = True) -> List[Chunk]:
+    """
+    Picks the chunks most relevant to a query that fit into a token budget.
+
+    Args:
+        chunks: The chunks of an article
+        query: What the reader is looking for; without a query (or without any
+            matching chunk) the article is read from the start
+        token_budget: Maximum estimated tokens of the selected chunks
+        keep_intro: Always include the first chunk (title and lead) if it fits
+
+    Returns:
+        List[Chunk]: The selected chunks in document order
+    """
+    if not chunks:
+        return []
+    scores = BM25(chunks).scores(query) if query else [0.0] * len(chunks)
+    ranked = sorted((chunk for chunk, score in zip(chunks, scores) if score > 0),
+                    key=lambda chunk: -scores[chunk.index])
+    if not ranked:
+        ranked = chunks
+    elif keep_intro and ranked[0].index != 0:
+        ranked = [chunks[0]] + [chunk for chunk in ranked if chunk.index != 0]
+
+    selected, used = [], 0
+    for chunk in ranked:
+        if used + chunk.tokens > token_budget:
+            continue
+        selected.append(chunk)
+        used += chunk.tokens
+    return sorted(selected, key=lambda chunk: chunk.index)
+
+
+def format_chunks(selected: List[Chunk], chunks: List[Chunk]) -> str:
+    """
+    Joins selected chunks into one text, marking the sections left out.
+
+    Args:
+        selected: The selected chunks in document order
+        chunks: All chunks of the article
+
+    Returns:
+        str: The chunks with their headings and "[... N sections omitted ...]" markers
+    """
+    parts = []
+    previous = -1
+    last_heading = None
+    for chunk in selected:
+        if chunk.index > previous + 1:
+            parts.append(f"[... {chunk.index - previous - 1} sections omitted ...]")
+        if chunk.heading and chunk.heading != last_heading:
+            parts.append(f"## {chunk.heading}")
+        parts.append(chunk.text)
+        previous, last_heading = chunk.index, chunk.heading
+    if chunks and previous < len(chunks) - 1:
+        parts.append(f"[... {len(chunks) - previous - 1} sections omitted ...]")
+    return "\n\n".join(parts)
+
+
+def pack_chunks(chunks: List[Chunk], token_budget: int) -> List[List[Chunk]]:
+    """
+    Groups consecutive chunks into batches that each fit into a token budget.
+
+    Args:
+        chunks: The chunks in document order
+        token_budget: Maximum estimated tokens per batch
+
+    Returns:
+        List[List[Chunk]]: The batches, in document order
+    """
+    batches, current, used = [], [], 0
+    for chunk in chunks:
+        if current and used + chunk.tokens > token_budget:
+            batches.append(current)
+            current, used = [], 0
+        current.append(chunk)
+        used += chunk.tokens
+    if current:
+        batches.append(current)
+    return batches
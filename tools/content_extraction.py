@@ -0,0 +1,220 @@
+import re
+from typing import List, Optional, Tuple
+
+from bs4 import BeautifulSoup, Tag
+from markdownify import MarkdownConverter, markdownify
+
+from tools.text_tokens import estimate_tokens
+
+
+# Elements that never hold text
+NON_TEXT_TAGS = {"script", "style", "noscript", "template", "iframe", "svg", "canvas", "button", "input",
+                 "select", "textarea"}
+
+# Elements that usually hold page chrome (removed unless they wrap the article)
+CHROME_TAGS = {"nav", "aside", "footer", "form", "dialog"}
+
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+
+# Landmark roles of page chrome
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "dialog", "alertdialog"}
+
+# id/class fragments of navigation, consent banners, share bars, related posts, comments, ads, ...
+BOILERPLATE_PATTERN = re.compile(
+    r"(^|[-_\s])("
+    r"nav|navbar|navigation|menu|breadcrumbs?|header|masthead|footer|colophon|sidebar|widget|"
+    r"cookies?|consent|gdpr|banner|popup|modal|overlay|newsletter|subscribe|subscription|signup|paywall|"
+    r"share|sharing|social|follow|related|recommended|recommendations|more-stories|read-next|"
+    r"comments?|disqus|respond|promo|sponsor|advert|ads?|adsbygoogle|author-bio|tags?|tag-list|pagination"
+    r")([-_\s]|$)",
+    re.IGNORECASE,
+)
+
+# id/class fragments of the element holding the article
+CONTENT_PATTERN = re.compile(
+    r"(^|[-_\s])(article|post|entry|story|content|main|body|text|prose|markdown)([-_\s]|$)", re.IGNORECASE
+)
+
+# Lists of links (tag clouds, "more posts", share bars) are dropped above this share of link text
+MAX_LINK_DENSITY = 0.6
+
+# A content candidate has to hold this share of the page's text to be trusted
+MIN_CONTENT_SHARE = 0.4
+
+
+def _attribute_text(element: Tag) -> str:
+    """The id and classes of an element, as one string."""
+    attrs = element.attrs or {}
+    classes = attrs.get("class") or []
+    if isinstance(classes, str):
+        classes = [classes]
+    return " ".join([attrs.get("id") or ""] + list(classes))
+
+
+def _text_length(element: Tag) -> int:
+    return len(element.get_text(" ", strip=True))
+
+
+def _link_text_length(element: Tag) -> int:
+    return sum(len(link.get_text(" ", strip=True)) for link in element.find_all("a"))
+
+
+def _removed_tokens(element: Tag) -> int:
+    """Estimates the markdown tokens an element would have produced (text plus link targets)."""
+    hrefs = " ".join(link.get("href") or "" for link in element.find_all("a"))
+    return estimate_tokens(element.get_text(" ", strip=True)) + estimate_tokens(hrefs)
+
+
+def _holds_content(element: Tag, total_length: int) -> bool:
+    """Whether an element wraps the article (or most of the page's text) and must not be removed as a whole."""
+    if element.name in ("html", "body", "main", "article") or element.get("itemprop") == "articleBody":
+        return True
+    if element.find(["article", "main", "h1"]) is not None:
+        return True
+    return _text_length(element) > total_length / 2
+
+
+def _prune(root: Tag, should_remove) -> List[Tag]:
+    """Removes the elements matching a predicate, top-down; children of removed elements are not visited."""
+    removed = []
+    stack = [root]
+    while stack:
+        element = stack.pop()
+        for child in list(element.children):
+            if not isinstance(child, Tag):
+                continue
+            if should_remove(child):
+                removed.append(child)
+                child.extract()
+            else:
+                stack.append(child)
+    return removed
+
+
+def find_main_content(soup: BeautifulSoup) -> Tag:
+    """
+    Finds the element holding the article.
+
+    Candidates are `<article>`, `<main>`, `role="main"`, `itemprop="articleBody"`
+    and elements whose id or class names them as content; the one with the
+    most text that is not link text wins, if it holds a good share of the
+    page's text. Otherwise the whole body is used.
+
+    Args:
+        soup: The parsed page, boilerplate already removed
+
+    Returns:
+        Tag: The main content element
+    """
+    root = soup.body or soup
+    total = _text_length(root) - _link_text_length(root)
+    if total <= 0:
+        return root
+
+    candidates = soup.find_all(["article", "main"])
+    candidates += soup.find_all(attrs={"role": "main"})
+    candidates += soup.find_all(attrs={"itemprop": "articleBody"})
+    candidates += [element for element in soup.find_all(["div", "section"])
+                   if CONTENT_PATTERN.search(_attribute_text(element))]
+
+    best, best_length = root, 0
+    for candidate in candidates:
+        length = _text_length(candidate) - _link_text_length(candidate)
+        # Prefer the innermost candidate holding (nearly) all of the text
+        if length > best_length * 1.1 or (length >= best_length * 0.9 and best in candidate.parents):
+            best, best_length = candidate, length
+    if best_length < total * MIN_CONTENT_SHARE:
+        return root
+    return best
+
+
+def strip_boilerplate(soup: BeautifulSoup) -> Tuple[Tag, dict]:
+    """
+    Removes navigation, banners, footers, share bars, related posts and
+    other page chrome from a parsed page and finds the main article.
+
+    Three passes: scripts and page chrome (nav, aside, footer, forms,
+    landmark roles, ids/classes like "cookie-banner" or "related-posts")
+    are removed unless they wrap the article, the main content element is
+    picked, and link-dense blocks inside it are dropped (lists directly
+    under a heading, like references, are kept).
+
+    Args:
+        soup: The parsed page, modified in place
+
+    Returns:
+        Tuple[Tag, dict]: The main content element and stats (blocks_removed, tokens_removed)
+    """
+    removed = _prune(soup, lambda element: element.name in NON_TEXT_TAGS)
+    total_length = _text_length(soup)
+
+    def is_chrome(element: Tag) -> bool:
+        role = (element.get("role") or "").lower()
+        looks_like_chrome = (
+            element.name in CHROME_TAGS
+            or role in BOILERPLATE_ROLES
+            or element.get("aria-hidden") == "true"
+            or (element.name == "header" and not element.find_parent(["article", "main"]))
+            or BOILERPLATE_PATTERN.search(_attribute_text(element)) is not None
+        )
+        return looks_like_chrome and not _holds_content(element, total_length)
+
+    removed += _prune(soup, is_chrome)
+
+    def is_link_block(element: Tag) -> bool:
+        if element.name not in ("ul", "ol", "div", "section", "table", "p"):
+            return False
+        text_length = _text_length(element)
+        if not text_length or len(element.find_all("a")) < 3:
+            return False
+        if _link_text_length(element) / text_length <= MAX_LINK_DENSITY:
+            return False
+        previous = element.find_previous_sibling()
+        if element.name in ("ul", "ol") and previous is not None and previous.name in HEADING_TAGS:
+            return False
+        return not _holds_content(element, total_length)
+
+    main = find_main_content(soup)
+    removed += _prune(main, is_link_block)
+
+    # Keep the page title, some sites only have it in <head>
+    if soup.title and soup.title.get_text(strip=True) and main.find("h1") is None:
+        heading = soup.new_tag("h1")
+        heading.string = soup.title.get_text(strip=True)
+        main.insert(0, heading)
+
+    stats = {
+        "blocks_removed": len(removed),
+        "tokens_removed": sum(_removed_tokens(element) for element in removed),
+    }
+    return main, stats
+
+
+def extract_article_markdown(html: str, strip: bool = True) -> Tuple[str, Optional[dict]]:
+    """
+    Converts a page to markdown, keeping only the main article.
+
+    Shared by the crawler, the webpage tool and the article reader, so every
+    consumer sends the same boilerplate-free text to the model. The page is
+    parsed once for both stripping and conversion.
+
+    Args:
+        html: The page HTML
+        strip: Remove the boilerplate first; without it the whole page is converted
+
+    Returns:
+        Tuple[str, Optional[dict]]: The markdown and, when stripping, the extraction stats
+            (blocks_removed, tokens_removed, tokens_kept, tokens_saved_share)
+    """
+    if not strip:
+        return re.sub(r"\n{3,}", "\n\n", markdownify(html).strip()), None
+
+    soup = BeautifulSoup(html, "html.parser")
+    main, stats = strip_boilerplate(soup)
+    markdown = MarkdownConverter().convert_soup(main).strip()
+    markdown = re.sub(r"\n{3,}", "\n\n", markdown)
+
+    stats["tokens_kept"] = estimate_tokens(markdown)
+    total = stats["tokens_kept"] + stats["tokens_removed"]
+    stats["tokens_saved_share"] = round(stats["tokens_removed"] / total, 3) if total else 0.0
+    return markdown, stats
@@ -0,0 +1,149 @@
+import gzip
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+from tools.atomic_files import atomic_write_bytes
+from tools.crawl_manifest import CrawlManifest
+
+
+DEFAULT_STORE_DIR = Path("../DATA/crawl_results") / "_objects"
+OBJECT_SUFFIX = ".md.gz"
+
+
+class ContentStore:
+    """
+    Content-addressed, gzip-compressed storage for page bodies.
+
+    Every body is stored once under its SHA-256, so pages that are mirrored
+    on several sites (or unchanged between crawls) take no extra space, and
+    repeated content can be recognized by its hash without reading files.
+    Objects live in two-level fan-out directories: `ab/cdef....md.gz`.
+    """
+
+    def __init__(self, root: Path = DEFAULT_STORE_DIR, compression_level: int = 6):
+        """
+        Args:
+            root: Directory holding the objects
+            compression_level: gzip level, 1 (fast) to 9 (small)
+        """
+        self.root = Path(root)
+        self.compression_level = compression_level
+
+    @staticmethod
+    def digest(text: str) -> str:
+        """
+        Computes the address of a body.
+
+        Args:
+            text: The body
+
+        Returns:
+            str: The hex SHA-256 of the UTF-8 encoded body
+        """
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def path_for(self, digest: str) -> Path:
+        """
+        Returns where the object with the given digest is stored.
+
+        Args:
+            digest: The content hash
+
+        Returns:
+            Path: The object path
+        """
+        return self.root / digest[:2] / f"{digest[2:]}{OBJECT_SUFFIX}"
+
+    def exists(self, digest: str) -> bool:
+        """
+        Checks whether a body is already stored.
+
+        Args:
+            digest: The content hash
+
+        Returns:
+            bool: True if the object exists
+        """
+        return self.path_for(digest).exists()
+
+    def put(self, text: str) -> str:
+        """
+        Stores a body, unless the same content is stored already.
+
+        Args:
+            text: The body to store
+
+        Returns:
+            str: The content hash to read it back with `get()`
+        """
+        digest = self.digest(text)
+        path = self.path_for(digest)
+        if path.exists():
+            return digest
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A crash must never leave a truncated object behind
+        atomic_write_bytes(path, gzip.compress(text.encode("utf-8"), compresslevel=self.compression_level))
+        return digest
+
+    def get(self, digest: str) -> str:
+        """
+        Reads and decompresses a stored body.
+
+        Args:
+            digest: The content hash returned by `put()`
+
+        Returns:
+            str: The body
+
+        Raises:
+            FileNotFoundError: If no object with this hash exists
+        """
+        with gzip.open(self.path_for(digest), "rb") as f:
+            return f.read().decode("utf-8")
+
+
+def read_markdown_file(path: str) -> str:
+    """
+    Reads saved markdown, decompressing content-store objects on the fly.
+
+    Args:
+        path: A plain `.md` file or a `.md.gz` object
+
+    Returns:
+        str: The markdown content
+    """
+    if str(path).endswith(OBJECT_SUFFIX):
+        with gzip.open(path, "rb") as f:
+            return f.read().decode("utf-8")
+    return Path(path).read_text(encoding="utf-8")
+
+
+def read_page_markdown(url: str, manifest: Optional[CrawlManifest] = None) -> Optional[str]:
+    """
+    Reads the saved markdown of a crawled URL, wherever and however it is stored.
+
+    Args:
+        url: The crawled URL
+        manifest: Optional manifest to look the URL up in, the default one otherwise
+
+    Returns:
+        Optional[str]: The markdown, or None if the URL was never crawled successfully
+    """
+    own_manifest = manifest is None
+    if own_manifest:
+        manifest = CrawlManifest()
+    try:
+        entry = manifest.get(url)
+    finally:
+        if own_manifest:
+            manifest.close()
+
+    if not entry or entry["status"] != "success" or not entry["markdown_path"]:
+        return None
+    try:
+        return read_markdown_file(entry["markdown_path"])
+    except OSError as e:
+        print(f"Could not read saved markdown of {url}: {e}")
+        return None
@@ -0,0 +1,361 @@
+import argparse
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from smolagents import tool
+
+from tools.content_store import read_markdown_file
+from tools.crawl_manifest import CrawlManifest, canonicalize_url
+from tools.text_tokens import QUERY_TERM_PATTERN, STOPWORDS
+
+
+DEFAULT_INDEX_PATH = Path("../DATA/crawl_results") / "corpus_index.sqlite"
+
+# Title matches count five times as much as body matches in the BM25 ranking
+TITLE_WEIGHT = 5.0
+BODY_WEIGHT = 1.0
+
+# Words around a match shown in a snippet
+SNIPPET_TOKENS = 24
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    original_url TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    title TEXT,
+    content_hash TEXT,
+    crawl_time TEXT,
+    indexed_time TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_domain ON documents (domain);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, body, tokenize = 'porter unicode61 remove_diacritics 2'
+);
+INSERT OR REPLACE INTO documents_fts (documents_fts, rank) VALUES ('rank', 'bm25({TITLE_WEIGHT}, {BODY_WEIGHT})');
+"""
+
+MARKDOWN_IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+MARKDOWN_LINK_PATTERN = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+MARKDOWN_SYNTAX_PATTERN = re.compile(r"[#*_`>|~]+|^\s*[=-]{3,}\s*$", re.MULTILINE)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+# "# Title" or "Title" underlined with "===" / "---"
+HEADING_PATTERN = re.compile(r"^\s{0,3}#{1,3}\s+(.+?)\s*#*\s*$|^([^\n]+)\n\s*[=-]{3,}\s*$", re.MULTILINE)
+
+
+def markdown_to_text(markdown: str) -> str:
+    """
+    Reduces markdown to the text worth indexing.
+
+    Images and link targets are dropped (their URLs would only add noise
+    terms), link texts and everything else are kept without the markup and
+    with whitespace collapsed, which also keeps snippets on one line.
+
+    Args:
+        markdown: The markdown of a page
+
+    Returns:
+        str: The plain text
+    """
+    text = MARKDOWN_IMAGE_PATTERN.sub(" ", markdown)
+    text = MARKDOWN_LINK_PATTERN.sub(r"\1", text)
+    text = MARKDOWN_SYNTAX_PATTERN.sub(" ", text)
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+def markdown_title(markdown: str) -> Optional[str]:
+    """
+    Finds the title of a page, its first heading.
+
+    Args:
+        markdown: The markdown of a page
+
+    Returns:
+        Optional[str]: The title, None if the page has no heading
+    """
+    match = HEADING_PATTERN.search(markdown)
+    if not match:
+        return None
+    return markdown_to_text(match.group(1) or match.group(2)) or None
+
+
+def build_match_query(query: str, any_term: bool = False) -> Optional[str]:
+    """
+    Turns free text into an FTS5 query.
+
+    Every word is quoted, so punctuation and FTS5 keywords in questions
+    ("what's", "AND", "NEAR") cannot break the query syntax. Stopwords
+    and single letters are dropped unless the query consists of nothing else.
+
+    Args:
+        query: The search text
+        any_term: Match pages with any of the words instead of all of them
+
+    Returns:
+        Optional[str]: The FTS5 MATCH expression, None if the text has no words
+    """
+    terms = list(dict.fromkeys(term.lower() for term in QUERY_TERM_PATTERN.findall(query)))
+    if not terms:
+        return None
+    terms = [term for term in terms if term not in STOPWORDS and (len(term) > 1 or term.isdigit())] or terms
+    return (" OR " if any_term else " ").join(f'"{term}"' for term in terms)
+
+
+class CorpusIndex:
+    """
+    An incremental full-text index (SQLite FTS5) over the crawled pages.
+
+    Pages are added as the crawler saves them, keyed by canonical URL, and
+    only re-indexed when their content hash changes. Searches rank with BM25
+    (titles weigh more than bodies) and return highlighted snippets, so
+    agents can answer from content we already crawled instead of going to
+    the web again.
+    """
+
+    def __init__(self, path: Path = DEFAULT_INDEX_PATH):
+        """
+        Args:
+            path: Location of the SQLite database file
+
+        Raises:
+            RuntimeError: If the SQLite library was built without FTS5
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        try:
+            with self._connection:
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            self._connection.close()
+            raise RuntimeError(f"The SQLite library ({sqlite3.sqlite_version}) does not support FTS5: {e}") from e
+
+    def close(self):
+        """Closes the database connection."""
+        self._connection.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def add(self, url: str, domain: str, markdown: str, content_hash: Optional[str] = None,
+            crawl_time: Optional[str] = None) -> bool:
+        """
+        Adds a page to the index, or replaces its previous version.
+
+        Args:
+            url: The crawled URL
+            domain: The domain name of the page (as used for the results directory)
+            markdown: The markdown of the page
+            content_hash: Optional content hash; a page with an unchanged hash is not indexed again
+            crawl_time: Optional crawl time (ISO 8601), now otherwise
+
+        Returns:
+            bool: True if the page was (re-)indexed, False if it was unchanged
+        """
+        canonical = canonicalize_url(url)
+        title = markdown_title(markdown)
+        body = markdown_to_text(markdown)
+        now = datetime.now().isoformat()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT id, content_hash FROM documents WHERE url = ?", (canonical,)
+            ).fetchone()
+            if row and content_hash and row["content_hash"] == content_hash:
+                return False
+
+            values = (url, domain, title, content_hash, crawl_time or now, now)
+            if row:
+                doc_id = row["id"]
+                self._connection.execute(
+                    "UPDATE documents SET original_url = ?, domain = ?, title = ?, content_hash = ?, "
+                    "crawl_time = ?, indexed_time = ? WHERE id = ?",
+                    values + (doc_id,),
+                )
+                self._connection.execute("DELETE FROM documents_fts WHERE rowid = ?", (doc_id,))
+            else:
+                doc_id = self._connection.execute(
+                    "INSERT INTO documents (url, original_url, domain, title, content_hash, crawl_time, "
+                    "indexed_time) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (canonical,) + values,
+                ).lastrowid
+            self._connection.execute(
+                "INSERT INTO documents_fts (rowid, title, body) VALUES (?, ?, ?)", (doc_id, title or "", body)
+            )
+        return True
+
+    def remove(self, url: str) -> bool:
+        """
+        Removes a page from the index.
+
+        Args:
+            url: The URL (any spelling)
+
+        Returns:
+            bool: True if the page was indexed
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT id FROM documents WHERE url = ?", (canonicalize_url(url),)
+            ).fetchone()
+            if not row:
+                return False
+            self._connection.execute("DELETE FROM documents_fts WHERE rowid = ?", (row["id"],))
+            self._connection.execute("DELETE FROM documents WHERE id = ?", (row["id"],))
+        return True
+
+    def _search(self, match: str, limit: int, domain: Optional[str]) -> List[dict]:
+        sql = (
+            f"SELECT d.original_url AS url, d.domain, d.title, d.crawl_time, "
+            f"snippet(documents_fts, 1, '**', '**', ' ... ', {SNIPPET_TOKENS}) AS snippet, "
+            f"documents_fts.rank AS score "
+            f"FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+            f"WHERE documents_fts MATCH ?"
+        )
+        params = [match]
+        if domain:
+            sql += " AND d.domain = ?"
+            params.append(domain)
+        sql += " ORDER BY documents_fts.rank LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._connection.execute(sql, params).fetchall()
+        # BM25 scores are negative in SQLite, lower is better
+        return [dict(row, score=round(-row["score"], 3)) for row in rows]
+
+    def search(self, query: str, limit: int = 5, domain: Optional[str] = None) -> List[dict]:
+        """
+        Searches the indexed pages.
+
+        Pages containing all words of the query are returned first; if there
+        are none, pages containing any of them.
+
+        Args:
+            query: Free search text
+            limit: Maximum number of results
+            domain: Optional domain name to restrict the search to
+
+        Returns:
+            List[dict]: Results, best first, each with url, domain, title, crawl_time, snippet
+                (matches in **bold**) and score (higher is better)
+        """
+        match = build_match_query(query)
+        if match is None:
+            return []
+        results = self._search(match, limit, domain)
+        if not results and " " in match:
+            results = self._search(build_match_query(query, any_term=True), limit, domain)
+        return results
+
+    def index_manifest(self, manifest: CrawlManifest) -> int:
+        """
+        Indexes every successfully crawled page of the manifest that is missing or outdated.
+
+        Used to build the index for pages crawled before it existed.
+
+        Args:
+            manifest: The crawl manifest
+
+        Returns:
+            int: Number of pages (re-)indexed
+        """
+        entries = manifest.successful_entries()
+        with self._lock:
+            indexed = {row["url"]: row["content_hash"] for row in self._connection.execute(
+                "SELECT url, content_hash FROM documents"
+            )}
+
+        count = 0
+        for entry in entries:
+            stored_hash = indexed.get(canonicalize_url(entry["original_url"]), "")
+            if entry["content_hash"] and stored_hash == entry["content_hash"]:
+                continue
+            try:
+                markdown = read_markdown_file(entry["markdown_path"])
+            except OSError as e:
+                print(f"Could not read saved markdown of {entry['original_url']}: {e}")
+                continue
+            if self.add(entry["original_url"], entry["domain"], markdown, entry["content_hash"], entry["crawl_time"]):
+                count += 1
+        print(f"Indexed {count} pages from the crawl manifest ({len(entries)} crawled pages)")
+        return count
+
+
+_index: Optional[CorpusIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_corpus_index() -> CorpusIndex:
+    """Returns the process-wide corpus index at the default location."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = CorpusIndex()
+        return _index
+
+
+def format_results(results: List[dict]) -> str:
+    """Formats search results as markdown for an agent."""
+    lines = []
+    for number, result in enumerate(results, 1):
+        lines.append(f"{number}. [{result['title'] or result['url']}]({result['url']})")
+        lines.append(f"   {result['snippet'].strip()}")
+    return "\n".join(lines)
+
+
+@tool
+def search_local_corpus(query: str, max_results: Optional[int] = 5) -> str:
+    """
+    A tool that searches the blog posts we already crawled, without going to the web.
+    Use it before searching online: it is instant and returns ranked snippets with their source URLs.
+
+    Args:
+        query: The search terms, e.g. "reinforcement learning from human feedback"
+        max_results: Optional maximum number of results (defaults to 5)
+
+    Returns:
+        str: The matching pages as a numbered markdown list of titles, URLs and snippets
+    """
+    results = get_corpus_index().search(query, limit=max_results or 5)
+    if not results:
+        return f"No crawled page matches '{query}'. Try other words or search the web."
+    return f"Crawled pages matching '{query}':\n" + format_results(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the full-text index of the crawled pages.")
+    parser.add_argument("query", nargs="*", help="Search text")
+    parser.add_argument("--rebuild", action="store_true", help="Index all crawled pages of the manifest first")
+    parser.add_argument("--domain", help="Only search pages of this domain")
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    index = CorpusIndex()
+    try:
+        if args.rebuild:
+            manifest = CrawlManifest()
+            try:
+                index.index_manifest(manifest)
+            finally:
+                manifest.close()
+        if args.query:
+            start = time.perf_counter()
+            results = index.search(" ".join(args.query), limit=args.limit, domain=args.domain)
+            elapsed = time.perf_counter() - start
+            print(format_results(results) or "No results")
+            print(f"\n{len(results)} results from {len(index)} pages in {elapsed * 1000:.1f} ms")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import fcntl
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from tools.atomic_files import atomic_write_text
+
+
+DEFAULT_JOURNAL_PATH = Path("../DATA/crawl_results") / "crawl_journal.jsonl"
+
+
+class CrawlJournal:
+    """
+    Append-only log of crawl intents and completions.
+
+    Before a URL is crawled an "intent" record is appended, after its results
+    are written a "done" record follows. Every record is flushed to disk, so
+    after a crash `unfinished_runs()` tells exactly which URLs still have to be
+    crawled and which runs never finished. A torn line (the process died
+    mid-write) is ignored.
+
+    Appends and compaction hold an exclusive lock on a lock file next to the
+    journal, so several processes (a batch crawl and the agent tool) can share
+    one journal without compaction dropping records appended meanwhile.
+
+    Record types: run_start, intent, done, run_end.
+    """
+
+    def __init__(self, path: Path = DEFAULT_JOURNAL_PATH):
+        """
+        Args:
+            path: Location of the JSON-lines journal
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _exclusive(self):
+        """Locks the journal against other threads and processes."""
+        # The journal itself is replaced by compaction, so the lock lives in a file of its own
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _append(self, records: Iterable[dict]):
+        """Appends records and forces them to disk."""
+        data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        if not data:
+            return
+        with self._exclusive():
+            with open(self.path, "a+b") as f:
+                # Start on a fresh line if the previous process died mid-write
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        data = b"\n" + data
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def read(self) -> List[dict]:
+        """
+        Reads all intact records.
+
+        Returns:
+            List[dict]: The records in the order they were written
+        """
+        records = []
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # Torn write from a crash
+                        continue
+        except FileNotFoundError:
+            pass
+        return records
+
+    def start_run(self, sitemaps: List[str], run_id: Optional[str] = None, **options) -> str:
+        """
+        Records the start of a (multi-sitemap) run.
+
+        Args:
+            sitemaps: The sitemap URLs the run is going to crawl
+            run_id: Optional id, a new one is generated otherwise
+            **options: Run options needed to resume it (quotas, flags, ...)
+
+        Returns:
+            str: The run id to pass to the other methods
+        """
+        run_id = run_id or uuid.uuid4().hex[:12]
+        self._append([{
+            "event": "run_start",
+            "run_id": run_id,
+            "time": datetime.now().isoformat(),
+            "sitemaps": sitemaps,
+            "options": options,
+        }])
+        return run_id
+
+    def intents(self, run_id: str, sitemap_url: str, urls: Iterable[str]):
+        """
+        Records that URLs of a sitemap are about to be crawled.
+
+        Args:
+            run_id: The run the URLs belong to
+            sitemap_url: The sitemap the URLs came from
+            urls: The URLs
+        """
+        self._append(
+            {"event": "intent", "run_id": run_id, "sitemap": sitemap_url, "url": url}
+            for url in urls
+        )
+
+    def done(self, run_id: str, url: str, status: str):
+        """
+        Records that a URL was crawled and its results are safely on disk.
+
+        Args:
+            run_id: The run the URL belongs to
+            url: The URL
+            status: "success", "error" or "unchanged"
+        """
+        self._append([{"event": "done", "run_id": run_id, "url": url, "status": status}])
+
+    def end_run(self, run_id: str):
+        """
+        Records that a run finished (all its sitemaps were processed).
+
+        Args:
+            run_id: The run that finished
+        """
+        self._append([{"event": "run_end", "run_id": run_id, "time": datetime.now().isoformat()}])
+
+    def unfinished_runs(self) -> Dict[str, dict]:
+        """
+        Collects runs that were started but never ended, with their open work.
+
+        Returns:
+            Dict[str, dict]: run_id -> {"sitemaps", "options", "pending": {sitemap: [urls]}, "started": {sitemaps}}
+        """
+        runs: Dict[str, dict] = {}
+        for record in self.read():
+            run_id = record.get("run_id")
+            event = record.get("event")
+            if event == "run_start":
+                runs[run_id] = {
+                    "sitemaps": record.get("sitemaps", []),
+                    "options": record.get("options", {}),
+                    "pending": {},
+                    "started": set(),
+                }
+            elif run_id not in runs:
+                continue
+            elif event == "intent":
+                runs[run_id]["started"].add(record["sitemap"])
+                runs[run_id]["pending"].setdefault(record["sitemap"], {})[record["url"]] = None
+            elif event == "done":
+                for urls in runs[run_id]["pending"].values():
+                    urls.pop(record["url"], None)
+            elif event == "run_end":
+                del runs[run_id]
+
+        for run in runs.values():
+            run["pending"] = {sitemap: list(urls) for sitemap, urls in run["pending"].items() if urls}
+        return runs
+
+    def compact(self):
+        """
+        Rewrites the journal keeping only the records of unfinished runs.
+
+        Finished runs are dropped so the journal does not grow forever. The
+        rewrite is atomic: a crash leaves either the old or the new journal.
+        Other processes cannot append between the read and the rewrite.
+        """
+        with self._exclusive():
+            records = self.read()
+            open_runs = set(self.unfinished_runs())
+            kept = [record for record in records if record.get("run_id") in open_runs]
+            atomic_write_text(self.path, "".join(json.dumps(record) + "\n" for record in kept))
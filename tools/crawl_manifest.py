@@ -0,0 +1,318 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+DEFAULT_MANIFEST_PATH = Path("../DATA/crawl_results") / "crawl_manifest.sqlite"
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAM_PREFIX = "utm_"
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref"}
+
+# SQLite limits the number of parameters per statement
+BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    original_url TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    status TEXT NOT NULL,
+    content_hash TEXT,
+    markdown_path TEXT,
+    meta_path TEXT,
+    markdown_length INTEGER,
+    crawl_time TEXT,
+    checked_time TEXT,
+    fetch_tier TEXT,
+    fetch_seconds REAL,
+    etag TEXT,
+    last_modified TEXT,
+    sitemap_lastmod TEXT,
+    error_message TEXT
+);
+CREATE INDEX IF NOT EXISTS pages_domain ON pages (domain, status);
+CREATE INDEX IF NOT EXISTS pages_content_hash ON pages (content_hash);
+CREATE TABLE IF NOT EXISTS migrated_directories (
+    directory TEXT PRIMARY KEY,
+    migrated_at TEXT NOT NULL
+);
+"""
+
+COLUMNS = (
+    "content_hash", "markdown_path", "meta_path", "markdown_length", "crawl_time", "checked_time",
+    "fetch_tier", "fetch_seconds", "etag", "last_modified", "sitemap_lastmod", "error_message",
+)
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalizes a URL so that trivially different spellings share one manifest entry.
+
+    Lower-cases scheme and host, drops default ports, fragments, tracking
+    parameters and trailing slashes, and sorts the query string.
+
+    Args:
+        url: The URL to normalize
+
+    Returns:
+        str: The canonical URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAM_PREFIX) and key.lower() not in TRACKING_PARAMS
+    ]
+    return urlunsplit((scheme, host, path, urlencode(sorted(query)), ""))
+
+
+class CrawlManifest:
+    """
+    A single SQLite index of every crawled URL, keyed by canonical URL.
+
+    It replaces per-URL file existence checks: it answers "which of these URLs
+    are new?" in one batched query and keeps status, content hash, timings,
+    HTTP validators and the location of the saved files for every page.
+    """
+
+    def __init__(self, path: Path = DEFAULT_MANIFEST_PATH):
+        """
+        Args:
+            path: Location of the SQLite database file
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        """Closes the database connection."""
+        self._connection.close()
+
+    def get(self, url: str) -> Optional[dict]:
+        """
+        Returns the manifest entry of a URL.
+
+        Args:
+            url: The URL to look up (any spelling)
+
+        Returns:
+            Optional[dict]: The entry, or None if the URL was never crawled
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM pages WHERE url = ?", (canonicalize_url(url),)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def get_many(self, urls: Iterable[str]) -> Dict[str, dict]:
+        """
+        Returns the manifest entries of many URLs in batched queries.
+
+        Args:
+            urls: The URLs to look up
+
+        Returns:
+            Dict[str, dict]: Entries keyed by the URL as given, unknown URLs are left out
+        """
+        by_canonical = {}
+        for url in urls:
+            by_canonical.setdefault(canonicalize_url(url), []).append(url)
+
+        entries = {}
+        keys = list(by_canonical)
+        with self._lock:
+            for start in range(0, len(keys), BATCH_SIZE):
+                batch = keys[start:start + BATCH_SIZE]
+                rows = self._connection.execute(
+                    f"SELECT * FROM pages WHERE url IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for row in rows:
+                    for url in by_canonical[row["url"]]:
+                        entries[url] = dict(row)
+        return entries
+
+    def find_new_urls(self, urls: Iterable[str]) -> List[str]:
+        """
+        Filters a list of URLs down to the ones that were never crawled successfully.
+
+        Args:
+            urls: The candidate URLs
+
+        Returns:
+            List[str]: The new URLs, in input order and without duplicates
+        """
+        urls = list(dict.fromkeys(urls))
+        known = self.get_many(urls)
+        seen = set()
+        new_urls = []
+        for url in urls:
+            canonical = canonicalize_url(url)
+            entry = known.get(url)
+            if canonical in seen or (entry and entry["status"] == "success"):
+                continue
+            seen.add(canonical)
+            new_urls.append(url)
+        return new_urls
+
+    def successful_entries(self, domain: Optional[str] = None) -> List[dict]:
+        """
+        Returns the entries of all successfully crawled pages that have saved markdown.
+
+        Args:
+            domain: Optional domain name to restrict the entries to
+
+        Returns:
+            List[dict]: The entries, oldest crawl first
+        """
+        sql = "SELECT * FROM pages WHERE status = 'success' AND markdown_path IS NOT NULL"
+        params = []
+        if domain:
+            sql += " AND domain = ?"
+            params.append(domain)
+        with self._lock:
+            rows = self._connection.execute(sql + " ORDER BY crawl_time", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def find_by_content_hash(self, content_hash: str, exclude_url: Optional[str] = None) -> Optional[str]:
+        """
+        Finds another successfully crawled URL with exactly the same content.
+
+        Args:
+            content_hash: The content hash to look for
+            exclude_url: Optional URL to ignore (usually the page itself)
+
+        Returns:
+            Optional[str]: The first URL with this content, or None
+        """
+        exclude = canonicalize_url(exclude_url) if exclude_url else ""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT original_url FROM pages WHERE content_hash = ? AND status = 'success' AND url != ? "
+                "ORDER BY crawl_time LIMIT 1",
+                (content_hash, exclude),
+            ).fetchone()
+        return row["original_url"] if row else None
+
+    def record(self, url: str, domain: str, status: str, **fields):
+        """
+        Inserts or updates the entry of a URL.
+
+        A failed refresh of a page that was crawled successfully before keeps
+        the "success" status (its files are still valid) and only records the error.
+
+        Args:
+            url: The crawled URL
+            domain: The domain directory the page belongs to
+            status: "success" or "error"
+            **fields: Any of the manifest columns (content_hash, markdown_path, etag, ...)
+        """
+        values = {column: fields.get(column) for column in COLUMNS}
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"""
+                INSERT INTO pages (url, original_url, domain, status, {', '.join(COLUMNS)})
+                VALUES (?, ?, ?, ?, {', '.join('?' * len(COLUMNS))})
+                ON CONFLICT(url) DO UPDATE SET
+                    original_url = excluded.original_url,
+                    domain = excluded.domain,
+                    status = CASE WHEN excluded.status = 'error' AND status = 'success'
+                        THEN status ELSE excluded.status END,
+                    error_message = excluded.error_message,
+                    {', '.join(f'{column} = COALESCE(excluded.{column}, {column})' for column in COLUMNS if column != 'error_message')}
+                """,
+                (canonicalize_url(url), url, domain, status, *values.values()),
+            )
+
+    def update(self, url: str, **fields):
+        """
+        Updates some columns of an existing entry.
+
+        Args:
+            url: The crawled URL
+            **fields: Columns to overwrite
+        """
+        fields = {column: value for column, value in fields.items() if column in COLUMNS}
+        if not fields:
+            return
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"UPDATE pages SET {', '.join(f'{column} = ?' for column in fields)} WHERE url = ?",
+                (*fields.values(), canonicalize_url(url)),
+            )
+
+    def migrate_directory(self, results_dir: Path, domain: str, force: bool = False) -> int:
+        """
+        Imports an existing domain directory (written before the manifest existed).
+
+        Every `<safe_filename>_meta.json` and `<safe_filename>_error.json` is
+        read and recorded with the location of its files. Directories are only
+        migrated once unless `force` is set.
+
+        Args:
+            results_dir: The domain directory to import
+            domain: The domain name used for the entries
+            force: Import again even if the directory was migrated before
+
+        Returns:
+            int: Number of imported entries
+        """
+        results_dir = Path(results_dir)
+        with self._lock:
+            done = self._connection.execute(
+                "SELECT 1 FROM migrated_directories WHERE directory = ?", (str(results_dir),)
+            ).fetchone()
+        if (done and not force) or not results_dir.is_dir():
+            return 0
+
+        imported = 0
+        # Errors first, so a later success for the same URL wins
+        for suffix, status in (("_error.json", "error"), ("_meta.json", "success")):
+            for path in results_dir.glob(f"*{suffix}"):
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        metadata = json.load(f)
+                except (OSError, ValueError):
+                    print(f"Could not read {path}, skipping it")
+                    continue
+                if not metadata.get("url"):
+                    continue
+
+                fields = {column: metadata.get(column) for column in COLUMNS}
+                fields["crawl_time"] = metadata.get("crawl_time")
+                if status == "success":
+                    markdown_path = path.with_name(path.name[:-len(suffix)] + ".md")
+                    if not markdown_path.exists():
+                        continue
+                    fields["markdown_path"] = str(markdown_path)
+                    fields["meta_path"] = str(path)
+                else:
+                    fields["meta_path"] = str(path)
+                self.record(metadata["url"], domain, status, **fields)
+                imported += 1
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO migrated_directories (directory, migrated_at) VALUES (?, ?)",
+                (str(results_dir), datetime.now().isoformat()),
+            )
+        if imported:
+            print(f"Imported {imported} entries from {results_dir} into the crawl manifest")
+        return imported
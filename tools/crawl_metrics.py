@@ -0,0 +1,177 @@
+import math
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tools.atomic_files import atomic_write_text
+
+
+# Percentiles reported for every stage
+PERCENTILES = (50, 95, 99)
+
+# Stages timed per page, in the order they happen
+#   sitemap:  resolving the sitemap (per sitemap, not per page)
+#   http:     plain HTTP request incl. body download
+#   markdown: HTML to markdown conversion of the HTTP tier
+#   browser:  browser navigation, rendering and markdown generation
+#   dedupe:   content hash and manifest lookup
+#   write:    writing markdown and metadata to disk
+#   manifest: recording the page in the crawl manifest
+#   index:    adding the page to the full-text corpus index
+#   total:    everything above for one page
+STAGES = ("sitemap", "http", "markdown", "browser", "dedupe", "write", "manifest", "index", "total")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Computes a percentile with the nearest-rank method.
+
+    Args:
+        values: The samples
+        pct: The percentile, 0 to 100
+
+    Returns:
+        float: The percentile, 0.0 without samples
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _escape_label(value: str) -> str:
+    """Escapes a Prometheus label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    """Formats Prometheus labels, e.g. {host="a",stage="http"}."""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+class CrawlMetrics:
+    """
+    Collects stage timings and counters of a crawl, per host.
+
+    Timings are kept as raw samples, which is fine for crawls of a few
+    thousand pages, and summarized as count/mean/p50/p95/p99/max per host and
+    stage. The same data can be exported in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._timings: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+        self._counters: Dict[Tuple[str, str, Tuple[Tuple[str, str], ...]], float] = defaultdict(float)
+
+    def observe(self, host: str, stage: str, seconds: float):
+        """
+        Records how long a stage took.
+
+        Args:
+            host: The host the work was for
+            stage: The stage, one of `STAGES`
+            seconds: The duration
+        """
+        self._timings[(host, stage)].append(seconds)
+
+    def count(self, host: str, name: str, value: float = 1, **labels):
+        """
+        Increments a counter.
+
+        Args:
+            host: The host the counter belongs to
+            name: The counter name, e.g. "pages" or "bytes_received"
+            value: The increment
+            **labels: Extra labels, e.g. tier="http", status="success"
+        """
+        key = (host, name, tuple(sorted((label, str(v)) for label, v in labels.items())))
+        self._counters[key] += value
+
+    @property
+    def hosts(self) -> List[str]:
+        """All hosts something was recorded for."""
+        return sorted({host for host, _ in self._timings} | {host for host, _, _ in self._counters})
+
+    @staticmethod
+    def _stage_summary(samples: List[float]) -> dict:
+        summary = {"count": len(samples), "mean": round(sum(samples) / len(samples), 4)}
+        for pct in PERCENTILES:
+            summary[f"p{pct}"] = round(percentile(samples, pct), 4)
+        summary["max"] = round(max(samples), 4)
+        return summary
+
+    def summary(self, hosts: Optional[Iterable[str]] = None) -> dict:
+        """
+        Summarizes timings and counters, per host and over all given hosts.
+
+        Args:
+            hosts: Optional hosts to restrict the summary to, all hosts otherwise
+
+        Returns:
+            dict: {"stages": {stage: stats}, "counters": {...}, "hosts": {host: {"stages", "counters"}}}
+        """
+        hosts = set(self.hosts if hosts is None else hosts)
+
+        def counters_of(selected) -> dict:
+            counters = defaultdict(float)
+            for (host, name, labels), value in self._counters.items():
+                if host in selected:
+                    key = name + "".join(f"[{label}={v}]" for label, v in labels)
+                    counters[key] += value
+            return {key: int(value) if value == int(value) else value for key, value in sorted(counters.items())}
+
+        def stages_of(selected) -> dict:
+            stages = {}
+            for stage in STAGES:
+                samples = [s for (host, name), values in self._timings.items()
+                           if name == stage and host in selected for s in values]
+                if samples:
+                    stages[stage] = self._stage_summary(samples)
+            return stages
+
+        return {
+            "stages": stages_of(hosts),
+            "counters": counters_of(hosts),
+            "hosts": {
+                host: {"stages": stages_of({host}), "counters": counters_of({host})}
+                for host in sorted(hosts)
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Renders all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics, stage timings as summaries and counters as `crawl_<name>_total`
+        """
+        lines = [
+            "# HELP crawl_stage_seconds Time spent per crawl stage and host.",
+            "# TYPE crawl_stage_seconds summary",
+        ]
+        for (host, stage), samples in sorted(self._timings.items()):
+            for pct in PERCENTILES:
+                lines.append(f"crawl_stage_seconds{_labels(host=host, stage=stage, quantile=pct / 100)} "
+                             f"{percentile(samples, pct):.6f}")
+            lines.append(f"crawl_stage_seconds_sum{_labels(host=host, stage=stage)} {sum(samples):.6f}")
+            lines.append(f"crawl_stage_seconds_count{_labels(host=host, stage=stage)} {len(samples)}")
+
+        by_name = defaultdict(list)
+        for (host, name, labels), value in sorted(self._counters.items()):
+            by_name[name].append((host, labels, value))
+        for name, values in by_name.items():
+            lines.append(f"# TYPE crawl_{name}_total counter")
+            for host, labels, value in values:
+                lines.append(f"crawl_{name}_total{_labels(host=host, **dict(labels))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path):
+        """
+        Writes the metrics to a Prometheus text file (e.g. for the node exporter's textfile collector).
+
+        Args:
+            path: The .prom file to write
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(path, self.to_prometheus())
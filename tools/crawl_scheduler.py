@@ -0,0 +1,164 @@
+import asyncio
+import random
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+from tools.rate_control import HostRateController
+
+
+def get_host(url: str) -> str:
+    """
+    Returns the host part of a URL, used as the politeness key.
+
+    Args:
+        url: The URL to extract the host from
+
+    Returns:
+        str: The lower-cased host (without port)
+    """
+    return (urlsplit(url).hostname or "unknown-host").lower()
+
+
+class HostScheduler:
+    """
+    Hands out URLs to crawl workers so that every host is crawled politely
+    while different hosts are crawled in parallel.
+
+    Each host has its own queue, a limit on how many of its URLs may be in
+    flight at the same time and a randomized delay that has to pass between
+    two requests to it. Workers call `acquire()` to get the next URL that may
+    be fetched right now and `release()` once they are done with it.
+
+    With a rate controller, the delay of each host adapts to how the host
+    responds instead of being drawn from the fixed politeness range.
+    """
+
+    def __init__(
+            self,
+            urls: Optional[Iterable[str]] = None,
+            per_host_concurrency: int = 1,
+            politeness_delay: Tuple[float, float] = (2.0, 4.0),
+            rate_controller: Optional[HostRateController] = None,
+    ):
+        """
+        Args:
+            urls: Optional initial URLs to schedule
+            per_host_concurrency: Maximum number of in-flight requests per host
+            politeness_delay: (min, max) seconds to wait between two requests to the same host
+            rate_controller: Optional adaptive controller deciding the delay per host instead
+        """
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self.politeness_delay = politeness_delay
+        self.rate_controller = rate_controller
+
+        self._queues: Dict[str, Deque[str]] = {}
+        self._active: Dict[str, int] = {}
+        self._next_allowed: Dict[str, float] = {}
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+
+        for url in urls or []:
+            self.add(url)
+
+    def add(self, url: str, not_before: float = 0.0):
+        """
+        Queues a URL for crawling.
+
+        Args:
+            url: The URL to queue
+            not_before: Optional event-loop time before which the host must not be contacted again
+        """
+        host = get_host(url)
+        self._queues.setdefault(host, deque()).append(url)
+        self._active.setdefault(host, 0)
+        if not_before:
+            self._next_allowed[host] = max(self._next_allowed.get(host, 0.0), not_before)
+
+    @property
+    def pending(self) -> int:
+        """Number of URLs that are queued but not yet handed out."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def hosts(self) -> int:
+        """Number of distinct hosts the scheduler has seen."""
+        return len(self._queues)
+
+    def _pick_ready_url(self, now: float) -> Tuple[Optional[str], Optional[float]]:
+        """
+        Finds a URL whose host may be contacted now.
+
+        Returns:
+            Tuple: (url, None) if one is ready, otherwise (None, seconds until the next host becomes ready)
+        """
+        wait = None
+        for host, queue in self._queues.items():
+            if not queue or self._active[host] >= self.per_host_concurrency:
+                continue
+            host_wait = self._next_allowed.get(host, 0.0) - now
+            if host_wait <= 0:
+                self._active[host] += 1
+                self._in_flight += 1
+                return queue.popleft(), None
+            wait = host_wait if wait is None else min(wait, host_wait)
+        return None, wait
+
+    async def acquire(self) -> Optional[str]:
+        """
+        Waits until a URL may be crawled and hands it out.
+
+        Returns:
+            Optional[str]: The next URL, or None once every URL has been crawled
+        """
+        loop = asyncio.get_running_loop()
+        async with self._condition:
+            while True:
+                if not self.pending and not self._in_flight:
+                    return None
+
+                url, wait = self._pick_ready_url(loop.time())
+                if url is not None:
+                    return url
+
+                # Either all hosts are busy (wait for a release) or cooling down (wait for the delay)
+                try:
+                    await asyncio.wait_for(self._condition.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    def retry(self, url: str, backoff: float):
+        """
+        Queues a handed out URL again, to be tried once the backoff has passed.
+
+        The whole host waits for the backoff, retries are mostly caused by the
+        host struggling. Call it before `release()`, so the crawl is never
+        considered finished in between.
+
+        Args:
+            url: The URL that was handed out by `acquire()`
+            backoff: Seconds to wait before the host is contacted again
+        """
+        self.add(url, not_before=asyncio.get_running_loop().time() + backoff)
+
+    async def release(self, url: str, delay: Optional[float] = None):
+        """
+        Marks a URL as done and starts the politeness delay of its host.
+
+        Args:
+            url: The URL that was handed out by `acquire()`
+            delay: Optional delay overriding the politeness delay (or the rate controller)
+        """
+        host = get_host(url)
+        if delay is None:
+            if self.rate_controller is not None:
+                delay = self.rate_controller.delay(host)
+            else:
+                delay = random.uniform(*self.politeness_delay)
+
+        async with self._condition:
+            self._active[host] = max(0, self._active[host] - 1)
+            self._in_flight = max(0, self._in_flight - 1)
+            now = asyncio.get_running_loop().time()
+            self._next_allowed[host] = max(self._next_allowed.get(host, 0.0), now + delay)
+            self._condition.notify_all()
@@ -0,0 +1,532 @@
+import argparse
+import codecs
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import requests
+
+from tools.crawl_manifest import canonicalize_url
+
+
+DEFAULT_CACHE_PATH = Path("../DATA") / "http_cache.sqlite"
+
+# Seconds a response stays fresh when the server does not say (Cache-Control / Expires)
+DEFAULT_TTL = 24 * 3600
+# Responses are never kept fresh longer than this, whatever the server says
+MAX_TTL = 7 * 24 * 3600
+
+# Least recently used responses are evicted above this total size
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Larger bodies (PDFs, videos, ...) are not cached
+MAX_ENTRY_BYTES = 8 * 1024 * 1024
+
+# Content types of web pages, for callers that only want HTML
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+# Bytes read from the network at a time when streaming a body
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Elements whose content is not visible text
+INVISIBLE_TAGS = {"script", "style", "noscript", "template", "svg"}
+
+MAX_AGE_PATTERN = re.compile(r"max-age\s*=\s*\"?(\d+)", re.IGNORECASE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    original_url TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    encoding TEXT,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_time REAL NOT NULL,
+    expires_time REAL NOT NULL,
+    last_access REAL NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 1,
+    read_max_bytes INTEGER,
+    read_text_chars INTEGER
+);
+CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+@dataclass
+class CachedResponse:
+    """A response served from the cache or the network, with the parts of `requests.Response` the tools use."""
+    url: str
+    status_code: int
+    content: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+    encoding: Optional[str] = None
+    from_cache: bool = False
+    complete: bool = True
+
+    @property
+    def text(self) -> str:
+        """The body decoded like `requests.Response.text`."""
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+class UnsupportedContentType(requests.exceptions.RequestException):
+    """The server answered with a content type the caller cannot use (PDF, image, ...)."""
+
+
+class TextMeter(HTMLParser):
+    """Counts the visible text of an HTML document that arrives in pieces."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chars = 0
+        self._invisible = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in INVISIBLE_TAGS:
+            self._invisible += 1
+
+    def handle_endtag(self, tag):
+        if tag in INVISIBLE_TAGS and self._invisible:
+            self._invisible -= 1
+
+    def handle_data(self, data):
+        if not self._invisible:
+            self.chars += len(data.strip())
+
+
+def read_body(chunks: Iterable[bytes], encoding: Optional[str] = None, max_bytes: Optional[int] = None,
+              text_chars: Optional[int] = None) -> Tuple[bytes, bool]:
+    """
+    Reads a body piece by piece, stopping early at a size or text limit.
+
+    Args:
+        chunks: The pieces of the body, e.g. `response.iter_content()` of a streamed response
+        encoding: The character encoding of the body, to measure its text
+        max_bytes: Optional maximum bytes to read
+        text_chars: Optional amount of visible text after which the rest of the page is not needed
+
+    Returns:
+        Tuple[bytes, bool]: The body read so far and whether it is the complete body
+    """
+    meter = decoder = None
+    if text_chars:
+        meter = TextMeter()
+        try:
+            decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    read, size = [], 0
+    for chunk in chunks:
+        if max_bytes is not None and size + len(chunk) > max_bytes:
+            read.append(chunk[:max_bytes - size])
+            return b"".join(read), False
+        read.append(chunk)
+        size += len(chunk)
+        if meter is not None:
+            meter.feed(decoder.decode(chunk))
+            if meter.chars >= text_chars:
+                return b"".join(read), False
+    return b"".join(read), True
+
+
+def media_type(headers: Dict[str, str]) -> str:
+    """The media type of a response without parameters, e.g. "text/html"; empty if not given."""
+    headers = {name.lower(): value for name, value in headers.items()}
+    return headers.get("content-type", "").split(";")[0].strip().lower()
+
+
+def freshness_lifetime(headers: Dict[str, str], default_ttl: float = DEFAULT_TTL) -> Optional[float]:
+    """
+    Determines how long a response may be served from the cache.
+
+    Args:
+        headers: The response headers
+        default_ttl: Lifetime when the server gives none
+
+    Returns:
+        Optional[float]: Seconds the response stays fresh (0 means revalidate on every use),
+            None if it must not be stored (`no-store`)
+    """
+    headers = {name.lower(): value for name, value in headers.items()}
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0.0
+    match = MAX_AGE_PATTERN.search(cache_control)
+    if match:
+        return min(float(match.group(1)), MAX_TTL)
+    if headers.get("expires"):
+        try:
+            expires = parsedate_to_datetime(headers["expires"]).timestamp()
+        except (TypeError, ValueError):
+            # Invalid dates (like "0") mean already expired
+            return 0.0
+        return min(max(0.0, expires - time.time()), MAX_TTL)
+    return default_ttl
+
+
+class HttpCache:
+    """
+    A persistent cache of GET responses, shared by all agents and processes.
+
+    Responses are stored in SQLite keyed by canonical URL, so trivially
+    different spellings of a URL share one entry. Freshness follows
+    Cache-Control (`no-store`, `no-cache`, `max-age`) and Expires, with a
+    default TTL otherwise. Expired responses with an ETag or Last-Modified
+    are revalidated with a conditional request instead of downloaded again.
+    The least recently used responses are evicted once the cache exceeds its
+    size limit. Hits, misses etc. are counted in the database, so the
+    counters cover every process using the cache.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 default_ttl: float = DEFAULT_TTL, max_entry_bytes: int = MAX_ENTRY_BYTES):
+        """
+        Args:
+            path: Location of the SQLite database file
+            max_bytes: Total size of the cached bodies above which the least recently used are evicted
+            default_ttl: Seconds a response stays fresh when the server does not say
+            max_entry_bytes: Larger bodies are not cached
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.max_entry_bytes = max_entry_bytes
+        # Counters of this process only, `stats()` reports the shared ones
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+            columns = {row["name"] for row in self._connection.execute("PRAGMA table_info(responses)")}
+            for column, definition in (("complete", "INTEGER NOT NULL DEFAULT 1"), ("read_max_bytes", "INTEGER"),
+                                       ("read_text_chars", "INTEGER")):
+                if column not in columns:
+                    self._connection.execute(f"ALTER TABLE responses ADD COLUMN {column} {definition}")
+
+    def close(self):
+        """Closes the database connection."""
+        self._connection.close()
+
+    def _count(self, name: str):
+        self.counters[name] += 1
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                (name,),
+            )
+
+    def _load(self, url: str) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._connection.execute("SELECT * FROM responses WHERE url = ?", (url,)).fetchone()
+
+    def _touch(self, url: str, expires_time: Optional[float] = None):
+        with self._lock, self._connection:
+            if expires_time is None:
+                self._connection.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url))
+            else:
+                self._connection.execute(
+                    "UPDATE responses SET last_access = ?, expires_time = ? WHERE url = ?",
+                    (time.time(), expires_time, url),
+                )
+
+    @staticmethod
+    def _covers(row: sqlite3.Row, max_bytes: Optional[int], text_chars: Optional[int]) -> bool:
+        """Whether a cached body holds everything a fetch with these limits would read."""
+        if row["complete"]:
+            return True
+        if row["read_max_bytes"] is None and row["read_text_chars"] is None:
+            # Cut off with unknown limits (cached before they were recorded)
+            return False
+        # A limit the body was not read with did not cut it off; any other must not be raised
+        return all(read is None or (wanted is not None and wanted <= read)
+                   for wanted, read in ((max_bytes, row["read_max_bytes"]), (text_chars, row["read_text_chars"])))
+
+    @staticmethod
+    def _to_response(row: sqlite3.Row, max_bytes: Optional[int] = None,
+                     text_chars: Optional[int] = None) -> CachedResponse:
+        """Builds the response of a cached row, cut off at the limits of the streaming fetch asking for it."""
+        body, complete = row["body"], bool(row["complete"])
+        if max_bytes is not None or text_chars is not None:
+            pieces = (body[start:start + STREAM_CHUNK_BYTES] for start in range(0, len(body), STREAM_CHUNK_BYTES))
+            body, cut_complete = read_body(pieces, row["encoding"], max_bytes, text_chars)
+            complete = complete and cut_complete
+        return CachedResponse(
+            url=row["original_url"],
+            status_code=row["status_code"],
+            content=body,
+            headers=json.loads(row["headers"]),
+            encoding=row["encoding"],
+            from_cache=True,
+            complete=complete,
+        )
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """
+        Returns the cached response of a URL if it is still fresh, without touching the network.
+
+        Args:
+            url: The URL (any spelling)
+
+        Returns:
+            Optional[CachedResponse]: The response, None if it is not cached or expired; check
+                `complete`, the body may have been cut off by a streaming fetch
+        """
+        key = canonicalize_url(url)
+        row = self._load(key)
+        if row is None or row["expires_time"] <= time.time():
+            return None
+        self._touch(key)
+        return self._to_response(row)
+
+    def store(self, url: str, response: CachedResponse, max_bytes: Optional[int] = None,
+              text_chars: Optional[int] = None) -> bool:
+        """
+        Stores a response, unless the server forbids it or it is not worth caching.
+
+        Only 200 responses are stored, and responses that expire right away
+        only if they carry an ETag or Last-Modified to revalidate them with.
+        Bodies cut off by a streaming fetch are stored as incomplete, with the
+        limits they were read with, and only served to fetches whose limits
+        are no larger.
+
+        Args:
+            url: The requested URL
+            response: The response
+            max_bytes: The byte limit the body was read with
+            text_chars: The text limit the body was read with
+
+        Returns:
+            bool: Whether the response was stored
+        """
+        lifetime = freshness_lifetime(response.headers, self.default_ttl)
+        headers = {name.lower() for name in response.headers}
+        # A response that is stale right away is only useful if it can be revalidated
+        revalidatable = lifetime or headers & {"etag", "last-modified"}
+        if (response.status_code != 200 or lifetime is None or not revalidatable
+                or len(response.content) > self.max_entry_bytes):
+            self._count("uncacheable")
+            return False
+
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(url, original_url, status_code, headers, encoding, body, size, stored_time, expires_time, last_access, "
+                "complete, read_max_bytes, read_text_chars) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    canonicalize_url(url), url, response.status_code, json.dumps(dict(response.headers)),
+                    response.encoding, response.content, len(response.content), now, now + lifetime, now,
+                    int(response.complete),
+                    None if response.complete else max_bytes,
+                    None if response.complete else text_chars,
+                ),
+            )
+        self._count("stored")
+        self._evict()
+        return True
+
+    def _evict(self):
+        """Deletes the least recently used responses until the cache fits its size limit."""
+        with self._lock, self._connection:
+            total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            evicted = 0
+            for row in self._connection.execute("SELECT url, size FROM responses ORDER BY last_access").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._connection.execute("DELETE FROM responses WHERE url = ?", (row["url"],))
+                total -= row["size"]
+                evicted += 1
+        for _ in range(evicted):
+            self._count("evicted")
+
+    def fetch(self, url: str, timeout: float = 20, headers: Optional[Dict[str, str]] = None,
+              max_bytes: Optional[int] = None, text_chars: Optional[int] = None,
+              content_types: Optional[Tuple[str, ...]] = None,
+              session: Optional[requests.Session] = None) -> CachedResponse:
+        """
+        GETs a URL through the cache.
+
+        A fresh cached response is returned without a request. An expired one
+        is revalidated with its ETag / Last-Modified; if the server answers
+        304 Not Modified it is served (and kept) from the cache.
+
+        The body is streamed: an unwanted content type is refused as soon as
+        the headers arrive, and reading stops at `max_bytes` or once the page
+        has `text_chars` of visible text, so memory stays bounded whatever
+        the size of the page. Such cut-off bodies have `complete` False. The
+        same limits apply to bodies served from the cache; a cut-off body is
+        downloaded again for a fetch with larger limits.
+
+        Args:
+            url: The URL
+            timeout: Request timeout in seconds
+            headers: Optional extra request headers
+            max_bytes: Optional maximum bytes of the body to download
+            text_chars: Optional amount of visible text (HTML) after which the rest is not downloaded
+            content_types: Optional accepted media types, e.g. `HTML_CONTENT_TYPES`
+            session: Optional session to reuse pooled connections, a one-off connection otherwise
+
+        Returns:
+            CachedResponse: The response; `from_cache` tells whether the body came from the cache
+
+        Raises:
+            UnsupportedContentType: If the response is not one of `content_types`
+            requests.exceptions.RequestException: On network errors and error status codes
+        """
+        key = canonicalize_url(url)
+        row = self._load(key)
+        # A cut-off body only serves fetches that would have cut it off at the same point or earlier
+        if row is not None and not self._covers(row, max_bytes, text_chars):
+            row = None
+        if row is not None and content_types and media_type(json.loads(row["headers"])) not in content_types:
+            raise UnsupportedContentType(f"{url} is {media_type(json.loads(row['headers']))}, not a web page")
+
+        now = time.time()
+        if row is not None and row["expires_time"] > now:
+            self._count("hits")
+            self._touch(key)
+            return self._to_response(row, max_bytes, text_chars)
+
+        request_headers = dict(headers or {})
+        if row is not None:
+            cached_headers = {name.lower(): value for name, value in json.loads(row["headers"]).items()}
+            if cached_headers.get("etag"):
+                request_headers["If-None-Match"] = cached_headers["etag"]
+            if cached_headers.get("last-modified"):
+                request_headers["If-Modified-Since"] = cached_headers["last-modified"]
+
+        with (session or requests).get(url, timeout=timeout, headers=request_headers, stream=True) as response:
+            if response.status_code == 304 and row is not None:
+                self._count("revalidated")
+                lifetime = freshness_lifetime(response.headers, self.default_ttl) or 0.0
+                self._touch(key, now + lifetime)
+                return self._to_response(row, max_bytes, text_chars)
+
+            self._count("misses")
+            response.raise_for_status()
+            content_type = media_type(response.headers)
+            if content_types and content_type and content_type not in content_types:
+                self._count("skipped")
+                raise UnsupportedContentType(f"{url} is {content_type}, not a web page", response=response)
+
+            body, complete = read_body(response.iter_content(STREAM_CHUNK_BYTES), response.encoding,
+                                       max_bytes, text_chars)
+            result = CachedResponse(
+                url=url,
+                status_code=response.status_code,
+                content=body,
+                headers=dict(response.headers),
+                encoding=response.encoding or requests.compat.chardet.detect(body)["encoding"],
+                complete=complete,
+            )
+        if not complete:
+            self._count("cut_off")
+        self.store(url, result, max_bytes, text_chars)
+        return result
+
+    def stats(self) -> dict:
+        """
+        Reports the cache counters over all processes and the size of the cache.
+
+        Returns:
+            dict: hits, misses, revalidated, stored, evicted, uncacheable, skipped (content type),
+                cut_off (streaming limit), hit_rate, entries, bytes
+        """
+        with self._lock:
+            counters = {row["name"]: row["value"] for row in self._connection.execute("SELECT * FROM counters")}
+            entries, size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        stats = {name: counters.get(name, 0)
+                 for name in ("hits", "misses", "revalidated", "stored", "evicted", "uncacheable", "skipped",
+                              "cut_off")}
+        lookups = stats["hits"] + stats["misses"] + stats["revalidated"]
+        stats["hit_rate"] = round((stats["hits"] + stats["revalidated"]) / lookups, 3) if lookups else 0.0
+        stats["entries"] = entries
+        stats["bytes"] = size
+        return stats
+
+    def purge_expired(self) -> int:
+        """
+        Deletes expired responses that cannot be revalidated (no ETag / Last-Modified).
+
+        Returns:
+            int: Number of deleted responses
+        """
+        deleted = 0
+        with self._lock, self._connection:
+            rows = self._connection.execute(
+                "SELECT url, headers FROM responses WHERE expires_time <= ?", (time.time(),)
+            ).fetchall()
+            for row in rows:
+                headers = {name.lower() for name in json.loads(row["headers"])}
+                if not headers & {"etag", "last-modified"}:
+                    self._connection.execute("DELETE FROM responses WHERE url = ?", (row["url"],))
+                    deleted += 1
+        return deleted
+
+    def clear(self):
+        """Deletes all cached responses and resets the counters."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+            self._connection.execute("DELETE FROM counters")
+        self.counters.clear()
+
+
+_cache: Optional[HttpCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> HttpCache:
+    """Returns the process-wide HTTP cache at the default location."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+        return _cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or clean up the shared HTTP response cache.")
+    parser.add_argument("--purge-expired", action="store_true",
+                        help="Delete expired responses that cannot be revalidated")
+    parser.add_argument("--clear", action="store_true", help="Delete all cached responses and reset the counters")
+    args = parser.parse_args()
+
+    cache = HttpCache()
+    try:
+        if args.clear:
+            cache.clear()
+        elif args.purge_expired:
+            print(f"Deleted {cache.purge_expired()} expired responses")
+        stats = cache.stats()
+        print(f"{stats['entries']} responses, {stats['bytes'] / 1024 / 1024:.1f} MB")
+        print(f"{stats['hits']} hits, {stats['revalidated']} revalidated, {stats['misses']} misses "
+              f"(hit rate {stats['hit_rate']:.1%}), {stats['evicted']} evicted, {stats['uncacheable']} not cacheable")
+        print(f"{stats['skipped']} skipped for their content type, {stats['cut_off']} downloads cut off early")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
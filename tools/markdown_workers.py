@@ -0,0 +1,210 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Hashable, Iterable, Iterator, Optional, Tuple
+
+from tools.content_extraction import extract_article_markdown
+
+
+def worker_context() -> multiprocessing.context.BaseContext:
+    """
+    The start method for conversion processes.
+
+    The pool is started from the crawler's event loop thread while browser and
+    agent threads are running; forking such a process can deadlock the child.
+    A fork server forks the workers from a clean single-threaded process
+    instead, with the conversion code preloaded. As with spawn, workers import
+    the calling script, so scripts keep their work under
+    `if __name__ == "__main__"`.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["tools.content_extraction"])
+    return context
+
+
+def default_worker_count() -> int:
+    """One conversion process per core, leaving a core for the event loop and the agent."""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+class ConversionPool:
+    """
+    Converts HTML to markdown in worker processes.
+
+    Parsing, boilerplate stripping and markdownify are CPU-bound and hold the
+    GIL, so converting inline stalls the crawler's event loop (and every other
+    download with it) or the agent's thread. The pool runs
+    `extract_article_markdown` in separate processes instead: the crawler
+    awaits `convert()` while other pages keep downloading, and batches are
+    streamed through `convert_many()`, which spreads them over all cores.
+
+    The processes are started on first use. A pool with 0 workers converts
+    inline, e.g. where processes cannot be started.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        """
+        Args:
+            workers: Number of conversion processes, by default one per core except one (at least one)
+        """
+        self.workers = default_worker_count() if workers is None else workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context())
+            return self._executor
+
+    def _restart(self):
+        """Drops a broken executor (a worker died, e.g. out of memory), the next call starts a new one."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _convert_inline(self, html: str, strip: bool) -> Tuple[str, Optional[dict]]:
+        """Converts in the calling process after a worker died."""
+        print("Conversion worker died, converting inline")
+        self._restart()
+        return extract_article_markdown(html, strip)
+
+    def submit(self, html: str, strip: bool = True) -> Future:
+        """
+        Queues a page for conversion.
+
+        Args:
+            html: The page HTML
+            strip: Keep only the main article (see `extract_article_markdown`)
+
+        Returns:
+            Future: Resolves to (markdown, extraction stats)
+        """
+        if self.workers <= 0:
+            future = Future()
+            try:
+                future.set_result(extract_article_markdown(html, strip))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        executor = self._get_executor()
+        try:
+            return executor.submit(extract_article_markdown, html, strip)
+        except BrokenProcessPool:
+            self._restart()
+            return self._get_executor().submit(extract_article_markdown, html, strip)
+
+    def convert_now(self, html: str, strip: bool = True) -> Tuple[str, Optional[dict]]:
+        """
+        Converts a page and waits for it, for synchronous callers like tools.
+
+        Args:
+            html: The page HTML
+            strip: Keep only the main article
+
+        Returns:
+            Tuple[str, Optional[dict]]: The markdown and the extraction stats
+        """
+        try:
+            return self.submit(html, strip).result()
+        except BrokenProcessPool:
+            return self._convert_inline(html, strip)
+
+    async def convert(self, html: str, strip: bool = True) -> Tuple[str, Optional[dict]]:
+        """
+        Converts a page without blocking the running event loop.
+
+        Args:
+            html: The page HTML
+            strip: Keep only the main article
+
+        Returns:
+            Tuple[str, Optional[dict]]: The markdown and the extraction stats
+        """
+        try:
+            return await asyncio.wrap_future(self.submit(html, strip))
+        except BrokenProcessPool:
+            return self._convert_inline(html, strip)
+
+    def convert_many(self, pages: Iterable[Tuple[Hashable, str]], strip: bool = True,
+                     max_pending: Optional[int] = None,
+                     return_exceptions: bool = False) -> Iterator[Tuple[Hashable, str, Optional[dict]]]:
+        """
+        Streams pages through the workers and yields them as they are converted.
+
+        Pages are submitted while earlier ones are converting, with at most
+        `max_pending` in flight, so a lazy iterable (e.g. pages still being
+        downloaded) is consumed as fast as the workers keep up.
+
+        Args:
+            pages: (key, html) pairs, the key identifies the page in the results (e.g. its URL)
+            strip: Keep only the main article
+            max_pending: Pages queued at the same time, twice the workers by default
+            return_exceptions: Yield (key, exception, None) for a page that fails to convert
+                instead of raising, so the other pages are still converted
+
+        Returns:
+            Iterator[Tuple[Hashable, str, Optional[dict]]]: (key, markdown, extraction stats) in
+                order of completion; a page that fails to convert raises when it is yielded
+        """
+        max_pending = max_pending or max(2, 2 * self.workers)
+        pending = {}
+        pages = iter(pages)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    key, html = next(pages)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[self.submit(html, strip)] = (key, html)
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, html = pending.pop(future)
+                try:
+                    try:
+                        markdown, extraction = future.result()
+                    except BrokenProcessPool:
+                        markdown, extraction = self._convert_inline(html, strip)
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    markdown, extraction = e, None
+                yield key, markdown, extraction
+
+    def shutdown(self):
+        """Stops the worker processes."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_conversion_pool: Optional[ConversionPool] = None
+_conversion_pool_lock = threading.Lock()
+
+
+def get_conversion_pool() -> ConversionPool:
+    """
+    Returns the process-wide conversion pool, creating it on first use.
+
+    Returns:
+        ConversionPool: The shared pool
+    """
+    global _conversion_pool
+    with _conversion_pool_lock:
+        if _conversion_pool is None:
+            _conversion_pool = ConversionPool()
+            atexit.register(_conversion_pool.shutdown)
+        return _conversion_pool
@@ -0,0 +1,352 @@
+import argparse
+import hashlib
+import re
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from tools.content_store import read_markdown_file
+from tools.corpus_index import markdown_to_text
+from tools.crawl_manifest import CrawlManifest, canonicalize_url
+
+
+DEFAULT_INDEX_PATH = Path("../DATA/crawl_results") / "near_duplicates.sqlite"
+
+# Pages whose 64 bit SimHashes differ in at most this many bits are near-duplicates; a copy
+# with ~5% different text (bylines, share bars, an edited sentence) is usually within 7 bits,
+# unrelated pages differ in ~32
+MAX_DISTANCE = 7
+
+# The fingerprint is split into MAX_DISTANCE + 1 bands: two fingerprints within
+# MAX_DISTANCE bits agree on at least one band, so only pages sharing a band are compared
+BANDS = MAX_DISTANCE + 1
+BAND_BITS = 64 // BANDS
+
+# Words per shingle, and the least shingles a page needs to be fingerprinted
+SHINGLE_WORDS = 3
+MIN_SHINGLES = 50
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# The values of a byte that have bit j set, to add up SimHash weights a byte at a time
+BYTE_VALUES_WITH_BIT = [[value for value in range(256) if value >> bit & 1] for bit in range(8)]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS fingerprints (
+    url TEXT PRIMARY KEY,
+    original_url TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    simhash INTEGER NOT NULL,
+    cluster TEXT NOT NULL,
+    fingerprinted_time TEXT NOT NULL,
+    {", ".join(f"band{band} INTEGER NOT NULL" for band in range(BANDS))}
+);
+CREATE INDEX IF NOT EXISTS fingerprints_cluster ON fingerprints (cluster);
+{"".join(f"CREATE INDEX IF NOT EXISTS fingerprints_band{band} ON fingerprints (band{band});" for band in range(BANDS))}
+"""
+
+
+def simhash(markdown: str) -> Optional[int]:
+    """
+    Computes the 64 bit SimHash of a page's text.
+
+    The text is reduced to lower-cased word 3-shingles, each hashed with
+    BLAKE2b and weighted by its count. Pages with the same text up to small
+    edits (bylines, dates, a changed sentence) get fingerprints that differ in
+    only a few bits.
+
+    Args:
+        markdown: The markdown of the page
+
+    Returns:
+        Optional[int]: The fingerprint (unsigned), None if the page is too short to compare
+    """
+    words = [word.lower() for word in WORD_PATTERN.findall(markdown_to_text(markdown))]
+    shingles = Counter(" ".join(words[start:start + SHINGLE_WORDS])
+                       for start in range(len(words) - SHINGLE_WORDS + 1))
+    if len(shingles) < MIN_SHINGLES:
+        return None
+
+    # Weight per value of each of the 8 bytes, then per bit: 8 additions per shingle instead of 64
+    histograms = [[0] * 256 for _ in range(8)]
+    total = 0
+    for shingle, weight in shingles.items():
+        digest = hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+        total += weight
+        for position, byte in enumerate(digest):
+            histograms[position][byte] += weight
+
+    fingerprint = 0
+    for position, histogram in enumerate(histograms):
+        for bit, values in enumerate(BYTE_VALUES_WITH_BIT):
+            if 2 * sum(histogram[value] for value in values) > total:
+                fingerprint |= 1 << (8 * position + bit)
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits of two fingerprints."""
+    return bin(a ^ b).count("1")
+
+
+def _to_signed(value: int) -> int:
+    """SQLite integers are signed 64 bit."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _bands(fingerprint: int) -> List[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [fingerprint >> (band * BAND_BITS) & mask for band in range(BANDS)]
+
+
+class NearDuplicateIndex:
+    """
+    Finds pages that republish the same article, also across domains.
+
+    Every crawled page gets a SimHash fingerprint, stored in SQLite with its
+    bands as an LSH index: a lookup only compares the pages that share a band
+    instead of the whole corpus. Near-duplicates join the cluster of the page
+    they copy; the first page of a cluster is its representative, so
+    downstream work (like summarization) runs once per cluster.
+    """
+
+    def __init__(self, path: Path = DEFAULT_INDEX_PATH, max_distance: int = MAX_DISTANCE):
+        """
+        Args:
+            path: Location of the SQLite database file
+            max_distance: Largest Hamming distance (up to MAX_DISTANCE) that counts as near-duplicate
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_distance = min(max_distance, MAX_DISTANCE)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        """Closes the database connection."""
+        self._connection.close()
+
+    def _matches(self, fingerprint: int, exclude: str = "") -> List[dict]:
+        bands = _bands(fingerprint)
+        where = " OR ".join(f"band{band} = ?" for band in range(BANDS))
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT url, original_url, domain, simhash, cluster FROM fingerprints WHERE ({where}) AND url != ?",
+                bands + [exclude],
+            ).fetchall()
+        matches = []
+        for row in rows:
+            distance = hamming_distance(fingerprint, row["simhash"] & ((1 << 64) - 1))
+            if distance <= self.max_distance:
+                matches.append(dict(row, distance=distance))
+        return sorted(matches, key=lambda match: match["distance"])
+
+    def find(self, markdown: str, exclude_url: Optional[str] = None) -> List[dict]:
+        """
+        Finds the fingerprinted pages a text is a near-duplicate of.
+
+        Args:
+            markdown: The markdown of the page
+            exclude_url: Optional URL to ignore (usually the page itself)
+
+        Returns:
+            List[dict]: Matches (original_url, domain, cluster, distance), closest first
+        """
+        fingerprint = simhash(markdown)
+        if fingerprint is None:
+            return []
+        return self._matches(fingerprint, canonicalize_url(exclude_url) if exclude_url else "")
+
+    def add(self, url: str, domain: str, markdown: str) -> Optional[dict]:
+        """
+        Fingerprints a page and puts it into a cluster.
+
+        A page that was fingerprinted before (crawled again) keeps its cluster:
+        only pages fingerprinted before it count as originals, so a
+        representative never becomes a copy of its own copies.
+
+        Args:
+            url: The crawled URL
+            domain: The domain name of the page
+            markdown: The markdown of the page
+
+        Returns:
+            Optional[dict]: The closest page it is a near-duplicate of (original_url, domain, cluster,
+                distance), None if it is new, a representative or too short to compare
+        """
+        fingerprint = simhash(markdown)
+        if fingerprint is None:
+            return None
+        canonical = canonicalize_url(url)
+        matches = self._matches(fingerprint, canonical)
+        with self._lock:
+            known = self._connection.execute(
+                "SELECT cluster, fingerprinted_time FROM fingerprints WHERE url = ?", (canonical,)
+            ).fetchone()
+
+        if known is None:
+            closest = matches[0] if matches else None
+            cluster = closest["cluster"] if closest else url
+            fingerprinted_time = datetime.now().isoformat()
+        else:
+            # Still a copy only if it is still close to its representative
+            representative = canonicalize_url(known["cluster"])
+            closest = next((match for match in matches if match["url"] == representative), None)
+            cluster = known["cluster"] if closest or representative == canonical else url
+            fingerprinted_time = known["fingerprinted_time"]
+
+        columns = ["url", "original_url", "domain", "simhash", "cluster", "fingerprinted_time"]
+        columns += [f"band{band}" for band in range(BANDS)]
+        values = [canonical, url, domain, _to_signed(fingerprint), cluster, fingerprinted_time]
+        values += _bands(fingerprint)
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO fingerprints ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                values,
+            )
+        return closest
+
+    def representative(self, url: str) -> str:
+        """
+        Returns the page that stands for the cluster of a URL.
+
+        Args:
+            url: The URL (any spelling)
+
+        Returns:
+            str: The representative URL, the URL itself if it was not fingerprinted
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT cluster FROM fingerprints WHERE url = ?", (canonicalize_url(url),)
+            ).fetchone()
+        return row["cluster"] if row else url
+
+    def cluster(self, url: str) -> List[str]:
+        """
+        Returns all pages in the same cluster as a URL.
+
+        Args:
+            url: The URL (any spelling)
+
+        Returns:
+            List[str]: The URLs of the cluster, representative first; just the URL if it has no copies
+        """
+        representative = self.representative(url)
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT original_url FROM fingerprints WHERE cluster = ? ORDER BY original_url != ?, fingerprinted_time",
+                (representative, representative),
+            ).fetchall()
+        return [row["original_url"] for row in rows] or [url]
+
+    def clusters(self, min_size: int = 2) -> Dict[str, List[str]]:
+        """
+        Lists the clusters of near-duplicate pages.
+
+        Args:
+            min_size: Smallest cluster to list, 2 lists only pages that have copies
+
+        Returns:
+            Dict[str, List[str]]: URLs per representative
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT cluster, original_url FROM fingerprints WHERE cluster IN "
+                "(SELECT cluster FROM fingerprints GROUP BY cluster HAVING COUNT(*) >= ?) "
+                "ORDER BY cluster, original_url != cluster, fingerprinted_time",
+                (min_size,),
+            ).fetchall()
+        clusters: Dict[str, List[str]] = {}
+        for row in rows:
+            clusters.setdefault(row["cluster"], []).append(row["original_url"])
+        return clusters
+
+    def unique(self, urls: List[str]) -> List[str]:
+        """
+        Reduces a list of URLs to one per cluster, e.g. to summarize every article once.
+
+        Args:
+            urls: The URLs
+
+        Returns:
+            List[str]: The representative of every cluster, in order of first appearance
+        """
+        return list(dict.fromkeys(self.representative(url) for url in urls))
+
+    def index_manifest(self, manifest: CrawlManifest) -> int:
+        """
+        Fingerprints every successfully crawled page of the manifest that is not fingerprinted yet.
+
+        Args:
+            manifest: The crawl manifest
+
+        Returns:
+            int: Number of near-duplicates found among the newly fingerprinted pages
+        """
+        with self._lock:
+            known = {row["url"] for row in self._connection.execute("SELECT url FROM fingerprints")}
+        found = 0
+        for entry in manifest.successful_entries():
+            if entry["url"] in known:
+                continue
+            try:
+                markdown = read_markdown_file(entry["markdown_path"])
+            except OSError as e:
+                print(f"Could not read saved markdown of {entry['original_url']}: {e}")
+                continue
+            if self.add(entry["original_url"], entry["domain"], markdown) is not None:
+                found += 1
+        return found
+
+
+_index: Optional[NearDuplicateIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    """Returns the process-wide near-duplicate index at the default location."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NearDuplicateIndex()
+        return _index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate pages among the crawled pages.")
+    parser.add_argument("--rebuild", action="store_true", help="Fingerprint all crawled pages of the manifest first")
+    parser.add_argument("--url", help="Show the cluster of this URL instead of all clusters")
+    args = parser.parse_args()
+
+    index = NearDuplicateIndex()
+    try:
+        if args.rebuild:
+            manifest = CrawlManifest()
+            try:
+                print(f"Found {index.index_manifest(manifest)} near-duplicates")
+            finally:
+                manifest.close()
+        if args.url:
+            print("\n".join(index.cluster(args.url)))
+            return
+        clusters = index.clusters()
+        for representative, urls in clusters.items():
+            print(f"{representative} ({len(urls) - 1} copies)")
+            for url in urls[1:]:
+                print(f"    {url}")
+        print(f"{len(clusters)} clusters with near-duplicates")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
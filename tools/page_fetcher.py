@@ -0,0 +1,250 @@
+import asyncio
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import aiohttp
+
+from tools.content_extraction import extract_article_markdown
+from tools.http_cache import TextMeter
+from tools.markdown_workers import ConversionPool
+from tools.rate_control import parse_retry_after
+
+
+# Realistic browser headers, static blogs tend to block obvious bots
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+}
+
+# Markers of pages that only render their content with JavaScript
+JS_APP_ROOT_PATTERN = re.compile(
+    r'<div[^>]+id=["\'](?:root|app|__next|__nuxt|svelte)["\'][^>]*>\s*</div>',
+    re.IGNORECASE,
+)
+NOSCRIPT_PATTERN = re.compile(
+    r'<noscript[^>]*>[^<]*(?:enable|requires?|turn on)\s+javascript',
+    re.IGNORECASE,
+)
+
+# Bot protection answers with these statuses and a challenge page that only a browser gets past
+CHALLENGE_STATUS_CODES = {403, 503}
+CHALLENGE_PATTERN = re.compile(
+    r'<title>\s*(?:just a moment|attention required|checking your browser|access denied|ddos-guard)'
+    r'|challenge-platform|cf-chl|cf_chl_opt|captcha|_incapsula_resource|ddos protection by',
+    re.IGNORECASE,
+)
+
+# Characters of HTML measured at a time, measuring stops once a page has enough text
+TEXT_METER_CHUNK_CHARS = 16384
+
+
+@dataclass
+class FetchResult:
+    """The outcome of fetching a single page through one of the tiers."""
+    url: str
+    success: bool
+    markdown: str = ""
+    html: str = ""
+    tier: str = "http"
+    status_code: Optional[int] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    error_message: Optional[str] = None
+    elapsed: float = 0.0
+    not_modified: bool = False
+    bytes_received: int = 0
+    timings: Dict[str, float] = field(default_factory=dict)
+    extraction: Optional[Dict[str, float]] = None
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """The HTTP cache validators (ETag / Last-Modified) of the response, if any."""
+        headers = {name.lower(): value for name, value in self.headers.items()}
+        validators = {}
+        for key, header in (("etag", "etag"), ("last_modified", "last-modified")):
+            if headers.get(header):
+                validators[key] = headers[header]
+        return validators
+
+    @property
+    def retry_after(self) -> Optional[float]:
+        """Seconds the server asked us to wait (Retry-After header), if any."""
+        headers = {name.lower(): value for name, value in self.headers.items()}
+        return parse_retry_after(headers.get("retry-after"))
+
+
+def visible_text_length(html: str, enough: Optional[int] = None) -> int:
+    """
+    Measures the visible text of an HTML page, navigation and footers included.
+
+    Args:
+        html: The HTML
+        enough: Optional length after which measuring stops
+
+    Returns:
+        int: Characters of visible text (at least `enough` if measuring stopped early)
+    """
+    meter = TextMeter()
+    for start in range(0, len(html), TEXT_METER_CHUNK_CHARS):
+        meter.feed(html[start:start + TEXT_METER_CHUNK_CHARS])
+        if enough is not None and meter.chars >= enough:
+            break
+    return meter.chars
+
+
+def detect_js_rendering(html: str, min_text_chars: int = 500) -> Optional[str]:
+    """
+    Checks whether a page fetched over plain HTTP needs a real browser.
+
+    The text is measured on the HTML before boilerplate is stripped: a short
+    article with its navigation and footer was rendered fine, while an app
+    shell has hardly any visible text at all.
+
+    Args:
+        html: The raw HTML returned by the server
+        min_text_chars: Pages with less visible text than this are considered empty
+
+    Returns:
+        Optional[str]: The reason to escalate to the browser, or None if the HTTP result is usable
+    """
+    if JS_APP_ROOT_PATTERN.search(html):
+        return "empty javascript app root"
+    if NOSCRIPT_PATTERN.search(html):
+        return "page asks for javascript"
+    text_chars = visible_text_length(html, enough=min_text_chars)
+    if text_chars < min_text_chars:
+        return f"too little text ({text_chars} chars)"
+    return None
+
+
+def detect_challenge(status_code: Optional[int], html: str) -> Optional[str]:
+    """
+    Checks whether a failed HTTP response is a bot challenge that a real browser may pass.
+
+    Other failures (404, 410, responses that are not HTML, ...) are final,
+    a browser would get the same answer.
+
+    Args:
+        status_code: The HTTP status of the response
+        html: The body of the response
+
+    Returns:
+        Optional[str]: The reason to escalate to the browser, or None if the failure is final
+    """
+    if status_code in CHALLENGE_STATUS_CODES and CHALLENGE_PATTERN.search(html):
+        return f"bot challenge (HTTP {status_code})"
+    return None
+
+
+class HttpFetcher:
+    """
+    The fast tier: fetches pages over a pooled async HTTP client and converts
+    their main article to markdown without starting a browser.
+    """
+
+    def __init__(self, limit_per_host: int = 2, timeout: float = 20.0, strip_boilerplate: bool = True,
+                 converter: Optional[ConversionPool] = None):
+        """
+        Args:
+            limit_per_host: Maximum number of pooled connections per host
+            timeout: Total timeout per request in seconds
+            strip_boilerplate: Remove navigation, banners, footers etc. and keep the main article
+            converter: Optional conversion pool to convert pages in while other downloads continue;
+                without it pages are converted on the event loop
+        """
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.strip_boilerplate = strip_boilerplate
+        self.converter = converter
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Creates the client session on first use (it must live on the running loop)."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=BROWSER_HEADERS,
+                connector=aiohttp.TCPConnector(limit_per_host=self.limit_per_host),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def fetch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> FetchResult:
+        """
+        Fetches a page and converts it to markdown.
+
+        The boilerplate removed on the way is reported in `extraction`. With a
+        converter the conversion runs in its worker processes, so the event
+        loop keeps serving the other downloads meanwhile.
+
+        When validators from a previous crawl are given, the request is
+        conditional and an unchanged page comes back as `not_modified`
+        without a body.
+
+        Args:
+            url: The URL to fetch
+            etag: Optional ETag of the stored copy (sent as If-None-Match)
+            last_modified: Optional Last-Modified of the stored copy (sent as If-Modified-Since)
+
+        Returns:
+            FetchResult: The result, `success` is False on HTTP or network errors
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        start = time.perf_counter()
+        session = await self._get_session()
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    elapsed = time.perf_counter() - start
+                    return FetchResult(
+                        url=url,
+                        success=True,
+                        status_code=304,
+                        headers=dict(response.headers),
+                        not_modified=True,
+                        elapsed=elapsed,
+                        timings={"http": round(elapsed, 4)},
+                    )
+
+                body = await response.read()
+                result = FetchResult(
+                    url=url,
+                    success=response.status < 400,
+                    html=body.decode(response.get_encoding(), errors="replace"),
+                    status_code=response.status,
+                    headers=dict(response.headers),
+                    bytes_received=len(body),
+                    timings={"http": round(time.perf_counter() - start, 4)},
+                )
+                if not result.success:
+                    result.error_message = f"HTTP {response.status}"
+                elif "html" not in response.headers.get("Content-Type", "html").lower():
+                    result.success = False
+                    result.error_message = f"Unexpected content type {response.headers.get('Content-Type')}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            result = FetchResult(url=url, success=False, error_message=f"{type(e).__name__}: {e}",
+                                 timings={"http": round(time.perf_counter() - start, 4)})
+
+        # Converted after the connection went back to the pool
+        if result.success:
+            convert_start = time.perf_counter()
+            if self.converter is not None:
+                result.markdown, result.extraction = await self.converter.convert(result.html, self.strip_boilerplate)
+            else:
+                result.markdown, result.extraction = extract_article_markdown(result.html, self.strip_boilerplate)
+            result.timings["markdown"] = round(time.perf_counter() - convert_start, 4)
+
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    async def close(self):
+        """Closes the pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,240 @@
+import random
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Deque, Dict, Optional
+
+
+# Responses telling us to slow down
+THROTTLE_STATUS_CODES = {429, 503}
+# Responses worth asking again for later
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+# Network errors that are usually gone on the next attempt
+TRANSIENT_ERROR_PATTERN = re.compile(r"timeout|timed out|connection|reset by peer|temporar", re.IGNORECASE)
+TIMEOUT_PATTERN = re.compile(r"timeout|timed out", re.IGNORECASE)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header.
+
+    Args:
+        value: The header value, either seconds or an HTTP date
+
+    Returns:
+        Optional[float]: Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def is_throttled(status_code: Optional[int], error_message: Optional[str] = None) -> bool:
+    """
+    Checks whether a response means the host wants us to slow down.
+
+    Args:
+        status_code: The HTTP status, None if no response was received
+        error_message: The error of the request, if any
+
+    Returns:
+        bool: True for 429/503 responses and timeouts
+    """
+    if status_code in THROTTLE_STATUS_CODES:
+        return True
+    return bool(error_message and TIMEOUT_PATTERN.search(error_message))
+
+
+def is_retryable(status_code: Optional[int], error_message: Optional[str] = None) -> bool:
+    """
+    Checks whether a failed request may succeed when tried again.
+
+    Args:
+        status_code: The HTTP status, None if no response was received
+        error_message: The error of the request, if any
+
+    Returns:
+        bool: True for throttling, server errors and transient network errors
+    """
+    if status_code in RETRYABLE_STATUS_CODES:
+        return True
+    if status_code is not None and 400 <= status_code < 500:
+        # Client errors (404, 403, ...) do not go away by asking again
+        return False
+    return bool(error_message and TRANSIENT_ERROR_PATTERN.search(error_message))
+
+
+@dataclass
+class HostRate:
+    """The request rate of one host and its recent outcomes."""
+    rate: float
+    outcomes: Deque[bool] = field(default_factory=deque)
+    retry_after: float = 0.0
+
+
+class HostRateController:
+    """
+    Adapts the delay between requests to each host to how the host behaves.
+
+    The request rate follows AIMD (additive increase, multiplicative
+    decrease): every fast, successful response raises it a little, while
+    throttling (429/503, timeouts), slow responses or a high error rate cut it.
+    A Retry-After header is always honored. The resulting delay is jittered so
+    workers do not hit a host in lockstep.
+    """
+
+    def __init__(
+            self,
+            initial_delay: float = 3.0,
+            min_delay: float = 0.5,
+            max_delay: float = 120.0,
+            increase: float = 0.05,
+            decrease_factor: float = 0.5,
+            latency_target: float = 10.0,
+            error_window: int = 20,
+            max_error_rate: float = 0.2,
+            jitter: float = 0.3,
+    ):
+        """
+        Args:
+            initial_delay: Seconds between two requests to a host before anything is known about it
+            min_delay: Lower bound of the delay, however healthy a host looks
+            max_delay: Upper bound of the delay (Retry-After may exceed it)
+            increase: Requests per second added to the rate after a healthy response
+            decrease_factor: Factor the rate is multiplied with when the host struggles
+            latency_target: Responses slower than this many seconds count as struggling
+            error_window: Number of recent responses the error rate is computed over
+            max_error_rate: Error rate above which the host counts as struggling
+            jitter: Relative random spread applied to the delay
+        """
+        # The rate is the inverse of the delay, a zero delay would be an infinite rate
+        self.min_delay = max(min_delay, 0.001)
+        self.initial_delay = max(initial_delay, self.min_delay)
+        self.max_delay = max_delay
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.error_window = error_window
+        self.max_error_rate = max_error_rate
+        self.jitter = jitter
+        self._hosts: Dict[str, HostRate] = {}
+
+    def _host(self, host: str) -> HostRate:
+        if host not in self._hosts:
+            self._hosts[host] = HostRate(rate=1.0 / self.initial_delay, outcomes=deque(maxlen=self.error_window))
+        return self._hosts[host]
+
+    def observe(self, host: str, latency: float, status_code: Optional[int] = None,
+                error_message: Optional[str] = None, retry_after: Optional[float] = None):
+        """
+        Feeds the outcome of a request to a host into its rate.
+
+        Args:
+            host: The host the request went to
+            latency: Seconds the request took
+            status_code: The HTTP status, None if no response was received
+            error_message: The error of the request, if any
+            retry_after: Seconds the host asked us to wait (Retry-After), if any
+        """
+        state = self._host(host)
+        failed = bool(error_message) or (status_code is not None and status_code >= 400)
+        state.outcomes.append(failed)
+        error_rate = sum(state.outcomes) / len(state.outcomes)
+
+        if is_throttled(status_code, error_message) or latency > self.latency_target:
+            state.rate *= self.decrease_factor
+        elif failed and error_rate > self.max_error_rate:
+            state.rate *= self.decrease_factor
+        elif not failed:
+            state.rate += self.increase
+        state.rate = min(max(state.rate, 1.0 / self.max_delay), 1.0 / self.min_delay)
+        state.retry_after = retry_after or 0.0
+
+    def delay(self, host: str) -> float:
+        """
+        Returns how long to wait before the next request to a host.
+
+        Args:
+            host: The host
+
+        Returns:
+            float: The jittered delay in seconds, at least the host's last Retry-After
+        """
+        state = self._host(host)
+        delay = random.uniform(1 - self.jitter, 1 + self.jitter) / state.rate
+        return max(delay, state.retry_after)
+
+    def current_delay(self, host: str) -> float:
+        """Returns the host's delay without jitter, e.g. for reporting."""
+        return 1.0 / self._host(host).rate
+
+
+class RetryPolicy:
+    """
+    Decides whether a failed page is tried again and when.
+
+    Retries wait with jittered exponential backoff ("full jitter": a random
+    time up to `base_delay * 2^attempt`), never shorter than a Retry-After the
+    host sent. A retry budget caps the number of retries over a whole run, so
+    a site that is down cannot keep the crawl busy.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 2.0, max_delay: float = 60.0,
+                 retry_budget: int = 50):
+        """
+        Args:
+            max_attempts: Maximum number of attempts per page, including the first one
+            base_delay: Backoff of the first retry in seconds
+            max_delay: Upper bound of the backoff (Retry-After may exceed it)
+            retry_budget: Maximum number of retries over the whole run
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budget = retry_budget
+        self.retries = 0
+
+    def should_retry(self, attempt: int, status_code: Optional[int] = None,
+                     error_message: Optional[str] = None) -> bool:
+        """
+        Decides whether to try a failed page again, spending budget if so.
+
+        Args:
+            attempt: The number of the attempt that just failed (1 for the first)
+            status_code: The HTTP status, None if no response was received
+            error_message: The error of the request, if any
+
+        Returns:
+            bool: True if the page should be queued again
+        """
+        if attempt >= self.max_attempts or self.retries >= self.retry_budget:
+            return False
+        if not is_retryable(status_code, error_message):
+            return False
+        self.retries += 1
+        return True
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Returns how long to wait before the next attempt.
+
+        Args:
+            attempt: The number of the attempt that just failed (1 for the first)
+            retry_after: Seconds the host asked us to wait, if any
+
+        Returns:
+            float: The backoff in seconds
+        """
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(backoff, retry_after or 0.0)
@@ -0,0 +1,257 @@
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from smolagents.tools import Tool
+
+from tools.chunk_retrieval import (
+    Chunk,
+    estimate_tokens,
+    format_chunks,
+    pack_chunks,
+    select_chunks,
+    split_markdown,
+)
+from tools.content_store import read_page_markdown
+from tools.http_cache import HTML_CONTENT_TYPES, get_http_cache
+from tools.markdown_workers import get_conversion_pool
+from tools.near_duplicates import NearDuplicateIndex, get_near_duplicate_index
+
+
+# Tokens of article text an agent gets per tool call, leaves room in an 8192 token context
+DEFAULT_TOKEN_BUDGET = 2500
+
+# Tokens kept free in every summarization call for the instructions and the answer
+SUMMARY_TOKENS = 700
+PROMPT_TOKENS = 300
+
+MAP_PROMPT = """Summarize part {part} of {parts} of the article "{title}".
+Keep every key insight, number, name and conclusion{focus}. Answer with concise bullet points only.
+
+{text}"""
+
+REDUCE_PROMPT = """Below are summaries of consecutive parts of the article "{title}".
+Merge them into one summary of the key insights{focus}. Keep the numbers, drop repetitions.
+Answer with concise bullet points only.
+
+{text}"""
+
+
+def load_article_markdown(url: str) -> Tuple[str, str]:
+    """
+    Gets the markdown of an article, from the local crawl if it was crawled, from the web
+    (through the shared HTTP cache) otherwise.
+
+    Args:
+        url: The article URL
+
+    Returns:
+        Tuple[str, str]: (markdown, where it came from: "local crawl" or "web")
+
+    Raises:
+        requests.exceptions.RequestException: If the page is not crawled and cannot be fetched
+    """
+    markdown = read_page_markdown(url)
+    if markdown:
+        return markdown, "local crawl"
+
+    response = get_http_cache().fetch(url, timeout=20, content_types=HTML_CONTENT_TYPES)
+    markdown, _ = get_conversion_pool().convert_now(response.text)
+    return markdown, "web"
+
+
+def article_cluster(url: str, markdown: str, index: NearDuplicateIndex) -> str:
+    """
+    Finds the cluster of near-duplicate articles an article belongs to.
+
+    Args:
+        url: The article URL
+        markdown: The article, to look up copies of pages that were not crawled
+        index: The near-duplicate index
+
+    Returns:
+        str: The URL representing the cluster, the article's own URL if it has no known copies
+    """
+    representative = index.representative(url)
+    if representative == url:
+        matches = index.find(markdown, exclude_url=url)
+        if matches:
+            representative = matches[0]["cluster"]
+    return representative
+
+
+def article_title(chunks: List[Chunk], url: str) -> str:
+    """Returns the top-level heading of an article, its URL if it has none."""
+    for chunk in chunks:
+        if chunk.heading:
+            return chunk.heading.split(" > ")[0]
+    return url
+
+
+def ask_model(model, prompt: str) -> str:
+    """Sends a single user message to a smolagents model and returns the answer text."""
+    message = model([{"role": "user", "content": [{"type": "text", "text": prompt}]}])
+    return (message.content or "").strip()
+
+
+def map_reduce_summarize(markdown: str, model, focus: Optional[str] = None, context_tokens: int = 8192,
+                         title: Optional[str] = None) -> Tuple[str, dict]:
+    """
+    Summarizes an article of any length within the model's context window.
+
+    The article is split into sections, consecutive sections are packed into
+    batches that fit the context and summarized one by one (map). The partial
+    summaries are then merged, in several rounds if they do not fit the
+    context together (reduce). Nothing of the article is cut off.
+
+    Args:
+        markdown: The article
+        model: The smolagents model to summarize with
+        focus: Optional aspect the summary should concentrate on, e.g. the task of the agent
+        context_tokens: Context window of the model (`num_ctx`)
+        title: Optional title used in the prompts, the first heading otherwise
+
+    Returns:
+        Tuple[str, dict]: The summary and usage stats (sections, model_calls, prompt_tokens, rounds)
+    """
+    batch_tokens = max(500, context_tokens - SUMMARY_TOKENS - PROMPT_TOKENS)
+    chunks = split_markdown(markdown, max_tokens=min(800, batch_tokens))
+    title = title or article_title(chunks, "the article")
+    focus_text = f", especially regarding: {focus}" if focus else ""
+    stats = {"sections": len(chunks), "model_calls": 0, "prompt_tokens": 0, "rounds": 0}
+    if not chunks:
+        return "", stats
+
+    def call(prompt: str) -> str:
+        stats["model_calls"] += 1
+        stats["prompt_tokens"] += estimate_tokens(prompt)
+        return ask_model(model, prompt)
+
+    # Map: summarize each batch of consecutive sections
+    batches = pack_chunks(chunks, batch_tokens)
+    stats["rounds"] = 1
+    summaries = [
+        call(MAP_PROMPT.format(part=number, parts=len(batches), title=title, focus=focus_text,
+                               text=format_chunks(batch, batch)))
+        for number, batch in enumerate(batches, 1)
+    ]
+
+    # Reduce: merge partial summaries until one is left
+    while len(summaries) > 1:
+        stats["rounds"] += 1
+        parts = pack_chunks([Chunk(index, "", summary) for index, summary in enumerate(summaries)], batch_tokens)
+        if len(parts) == len(summaries):
+            # Every summary fills a context on its own, merge them pairwise
+            parts = [parts[start:start + 2] for start in range(0, len(parts), 2)]
+            parts = [[chunk for batch in pair for chunk in batch] for pair in parts]
+        summaries = [
+            call(REDUCE_PROMPT.format(title=title, focus=focus_text,
+                                      text="\n\n".join(chunk.text for chunk in part)))
+            for part in parts
+        ]
+    return summaries[0], stats
+
+
+class ReadArticleTool(Tool):
+    name = "read_article"
+    description = (
+        "Reads an article (from our crawled blog posts if available, otherwise from the web) and returns "
+        "only the sections most relevant to a question, with markers for the sections left out. "
+        "Ask again with another question to read other parts instead of visiting the page again."
+    )
+    inputs = {
+        "url": {"type": "string", "description": "The url of the article to read."},
+        "question": {
+            "type": "string",
+            "description": "What you are looking for in the article. Without it the article is read from the start.",
+            "nullable": True,
+        },
+    }
+    output_type = "string"
+
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET):
+        """
+        Args:
+            token_budget: Maximum estimated tokens of article text returned per call
+        """
+        super().__init__()
+        self.token_budget = token_budget
+
+    def forward(self, url: str, question: Optional[str] = None) -> str:
+        try:
+            markdown, source = load_article_markdown(url)
+        except requests.exceptions.Timeout:
+            return "The request timed out. Please try again later or check the URL."
+        except requests.exceptions.RequestException as e:
+            return f"Error fetching the webpage: {str(e)}"
+
+        chunks = split_markdown(markdown)
+        total_tokens = sum(chunk.tokens for chunk in chunks)
+        if total_tokens <= self.token_budget:
+            selected = chunks
+        else:
+            selected = select_chunks(chunks, question, self.token_budget)
+        used_tokens = sum(chunk.tokens for chunk in selected)
+
+        header = (f"Article {url} ({source}): {len(selected)} of {len(chunks)} sections, "
+                  f"~{used_tokens} of ~{total_tokens} tokens")
+        if question and len(selected) < len(chunks):
+            header += f", most relevant to: {question}"
+        return f"{header}\n\n{format_chunks(selected, chunks)}"
+
+
+class SummarizeArticleTool(Tool):
+    name = "summarize_article"
+    description = (
+        "Summarizes a whole article of any length (from our crawled blog posts if available, otherwise "
+        "from the web) part by part, so nothing is cut off. Returns the key insights as bullet points. "
+        "Copies of an article that was already summarized (e.g. republished on another blog) are not "
+        "summarized again."
+    )
+    inputs = {
+        "url": {"type": "string", "description": "The url of the article to summarize."},
+        "focus": {
+            "type": "string",
+            "description": "Optional aspect the summary should concentrate on.",
+            "nullable": True,
+        },
+    }
+    output_type = "string"
+
+    def __init__(self, model, context_tokens: int = 8192, near_duplicates: Optional[NearDuplicateIndex] = None):
+        """
+        Args:
+            model: The smolagents model that writes the summaries
+            context_tokens: Context window of the model (`num_ctx`)
+            near_duplicates: Optional near-duplicate index to find copies with, the default one otherwise
+        """
+        super().__init__()
+        self.model = model
+        self.context_tokens = context_tokens
+        self.near_duplicates = near_duplicates
+        # Summaries per (cluster, focus), so every article is summarized once
+        self._summaries: Dict[Tuple[str, Optional[str]], str] = {}
+
+    def forward(self, url: str, focus: Optional[str] = None) -> str:
+        try:
+            markdown, source = load_article_markdown(url)
+        except requests.exceptions.Timeout:
+            return "The request timed out. Please try again later or check the URL."
+        except requests.exceptions.RequestException as e:
+            return f"Error fetching the webpage: {str(e)}"
+
+        cluster = article_cluster(url, markdown, self.near_duplicates or get_near_duplicate_index())
+        summary = self._summaries.get((cluster, focus))
+        if summary is not None:
+            if cluster == url:
+                print(f"Not summarizing {url} again")
+                return f"{url} was summarized already:\n{summary}"
+            print(f"Not summarizing {url} again, it is a copy of {cluster}")
+            return f"{url} is a copy of {cluster}, which was summarized already:\n{summary}"
+
+        summary, stats = map_reduce_summarize(markdown, self.model, focus, self.context_tokens)
+        print(f"Summarized {url} ({source}): {stats['sections']} sections in {stats['model_calls']} model calls "
+              f"over {stats['rounds']} rounds, ~{stats['prompt_tokens']} prompt tokens")
+        if not summary:
+            return f"The article {url} has no text to summarize."
+        self._summaries[(cluster, focus)] = summary
+        return f"Summary of {url}:\n{summary}"
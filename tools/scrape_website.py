@@ -1,102 +1,77 @@
 import asyncio
+import hashlib
 import json
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-import requests
 import time
-import random
-from xml.etree import ElementTree
 import re
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
 from smolagents import tool
 
 # Import your crawler components
-from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig
+from crawl4ai import AsyncWebCrawler, CrawlerRunConfig
 from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
 
-
-def get_site_urls(input_sitemap_url):
+from tools.atomic_files import atomic_write_json, atomic_write_text
+from tools.browser_pool import CrawlerPool, create_browser_config, get_crawler_pool
+from tools.content_store import ContentStore
+from tools.corpus_index import CorpusIndex
+from tools.crawl_journal import CrawlJournal
+from tools.crawl_manifest import CrawlManifest
+from tools.crawl_metrics import CrawlMetrics
+from tools.crawl_scheduler import HostScheduler, get_host
+from tools.near_duplicates import NearDuplicateIndex
+from tools.markdown_workers import ConversionPool, get_conversion_pool
+from tools.page_fetcher import FetchResult, HttpFetcher, detect_challenge, detect_js_rendering
+from tools.rate_control import HostRateController, RetryPolicy
+from tools.sitemap_parser import SitemapEntry
+from tools.sitemap_resolver import SitemapResolver
+from tools.url_frontier import UrlFrontier
+
+# The crawl summary is rewritten after this many pages, not only at the end
+SUMMARY_CHECKPOINT_EVERY = 10
+
+
+def get_site_entries(input_sitemap_url, max_depth: int = 3, max_sitemaps: int = 200,
+                     concurrency: int = 8) -> List[SitemapEntry]:
     """
-    Fetches all URLs from a sitemap.
-    Uses more robust request headers to avoid 403 Forbidden errors.
+    Fetches all entries (URL and lastmod) from a sitemap.
+    Sitemap indexes are expanded completely, all sub-sitemaps of a level are
+    fetched concurrently over one pooled session.
+
+    Args:
+        input_sitemap_url: The sitemap or sitemap index to read
+        max_depth: How many levels of sitemap indexes to follow
+        max_sitemaps: Maximum number of sitemaps fetched in total
+        concurrency: Maximum number of sitemaps fetched at the same time
 
     Returns:
-        List[str]: List of URLs
+        List[SitemapEntry]: List of (loc, lastmod) entries
     """
-    sitemap_url = input_sitemap_url
-
-    # More realistic browser headers
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Referer': '/'.join(sitemap_url.split('/')[:3]),  # Base domain as referer
-        'Cache-Control': 'no-cache',
-        'Pragma': 'no-cache'
-    }
-
+    resolver = SitemapResolver(max_depth=max_depth, max_sitemaps=max_sitemaps, concurrency=concurrency)
     try:
-        session = requests.Session()
-
-        # First visit the main site to get cookies
-        base_url = '/'.join(sitemap_url.split('/')[:3])
-        session.get(base_url, headers=headers, timeout=15)
-
-        # Add a small delay to mimic human behavior
-        time.sleep(random.uniform(1, 2))
-
-        # Then request the sitemap
-        response = session.get(sitemap_url, headers=headers, timeout=15)
-        response.raise_for_status()
+        return asyncio.run(resolver.resolve_entries(input_sitemap_url))
+    except Exception as e:
+        print(f"Error fetching sitemap: {e}")
+        return []
 
-        print(f"Request status code: {response.status_code}")
 
-        # Check if it's an XML file
-        if 'xml' in response.headers.get('Content-Type', '').lower() or response.text.strip().startswith('<?xml'):
-            # Parse the XML
-            try:
-                root = ElementTree.fromstring(response.content)
+def get_site_urls(input_sitemap_url, max_depth: int = 3, max_sitemaps: int = 200, concurrency: int = 8):
+    """
+    Fetches all URLs from a sitemap.
 
-                # Try with namespace
-                namespace = {'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-                urls = [loc.text for loc in root.findall('.//ns:loc', namespace)]
+    Args:
+        input_sitemap_url: The sitemap or sitemap index to read
+        max_depth: How many levels of sitemap indexes to follow
+        max_sitemaps: Maximum number of sitemaps fetched in total
+        concurrency: Maximum number of sitemaps fetched at the same time
 
-                # If no URLs found with namespace, try without namespace
-                if not urls:
-                    print("Trying without namespace...")
-                    urls = [loc.text for loc in root.findall('.//loc')]
-
-                # Check if this is a sitemap index
-                if not urls and ("<sitemapindex" in response.text or "sitemap" in response.text.lower()):
-                    print("This appears to be a sitemap index. Fetching linked sitemaps...")
-                    sitemap_urls = [loc.text for loc in root.findall('.//ns:sitemap/ns:loc', namespace)]
-
-                    if not sitemap_urls:
-                        sitemap_urls = [loc.text for loc in root.findall('.//sitemap/loc')]
-
-                    all_urls = []
-                    for sub_sitemap in sitemap_urls[:3]:  # Limit to first 3 sitemaps
-                        print(f"Fetching sub-sitemap: {sub_sitemap}")
-                        time.sleep(1)  # Be polite
-                        sub_urls = get_site_urls(sub_sitemap)
-                        all_urls.extend(sub_urls)
-
-                    return all_urls
-            except ElementTree.ParseError:
-                print("XML parsing error. The response may not be a valid XML sitemap.")
-                urls = []
-        else:
-            print("Response doesn't appear to be XML. Looking for URLs directly...")
-            # If not XML, try to extract URLs directly using regex
-            urls = re.findall(r'https?://[^\s<>"\']+', response.text)
-            # Filter to only include URLs from the same domain
-            domain = '/'.join(sitemap_url.split('/')[:3])
-            urls = [url for url in urls if url.startswith(domain)]
-
-        return urls
-    except Exception as e:
-        print(f"Error fetching sitemap: {e}")
-        return []
+    Returns:
+        List[str]: List of URLs
+    """
+    return [entry.loc for entry in get_site_entries(input_sitemap_url, max_depth, max_sitemaps, concurrency)]
 
 
 def get_domain_name(url):
@@ -129,13 +104,31 @@ def create_safe_filename(url):
     # Create safe filename from URL
     safe_filename = "".join(c if c.isalnum() else "_" for c in url.split("//")[-1])
     if len(safe_filename) > 100:
-        safe_filename = safe_filename[:100]
+        # Keep long URLs apart that only differ after the cut
+        url_hash = hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]
+        safe_filename = f"{safe_filename[:91]}_{url_hash}"
     return safe_filename
 
 
+def compute_content_hash(markdown: str) -> str:
+    """
+    Computes the hash identifying the content of a page.
+
+    Args:
+        markdown: The markdown content
+
+    Returns:
+        str: The hex SHA-256 of the content
+    """
+    return hashlib.sha256(markdown.encode("utf-8")).hexdigest()
+
+
 def is_already_scraped(url, results_dir):
     """
-    Checks if a URL has already been scraped.
+    Checks if a URL has already been scraped by looking for its markdown file.
+
+    `crawl_concurrent` uses the crawl manifest instead, which answers this
+    for a whole batch of URLs in one query.
 
     Args:
         url: The URL to check
@@ -155,18 +148,276 @@ def is_already_scraped(url, results_dir):
     return False
 
 
-async def crawl_sequential(urls: List[str], sitemap_url: str):
+def metadata_path_for(results_dir: Path, url: str, stored: Optional[dict] = None) -> Path:
     """
-    Sequentially crawls a list of URLs and saves results.
+    Returns the path of the metadata JSON of a URL.
+
+    Pages crawled before long file names got a hash suffix are stored under
+    their old name, which the manifest entry of the page still knows.
 
     Args:
-        urls: List of URLs to crawl
-        sitemap_url: Original sitemap URL (used to determine the domain folder)
+        results_dir: The domain directory
+        url: The crawled URL
+        stored: Optional manifest entry of the page, its `meta_path` / `markdown_path` win
+
+    Returns:
+        Path: The stored metadata path, the `<safe_filename>_meta.json` path otherwise
     """
-    if not urls:
-        print("No URLs to crawl")
-        return "No URLs to crawl, Skip this page and continue with the next."
+    stored = stored or {}
+    if (stored.get("meta_path") or "").endswith("_meta.json"):
+        return Path(stored["meta_path"])
+    markdown_path = stored.get("markdown_path") or ""
+    if markdown_path.endswith(".md") and Path(markdown_path).parent == results_dir:
+        return Path(markdown_path[:-len(".md")] + "_meta.json")
+    return results_dir / f"{create_safe_filename(url)}_meta.json"
+
+
+def save_crawl_result(results_dir: Path, url: str, markdown: str, extra_metadata: Optional[dict] = None,
+                      content_store: Optional[ContentStore] = None) -> Path:
+    """
+    Saves the markdown of a successfully crawled page and its metadata.
+
+    Args:
+        results_dir: The domain directory to save into
+        url: The crawled URL
+        markdown: The markdown content of the page
+        extra_metadata: Optional additional fields for the metadata JSON (e.g. the fetch tier). If it
+            has stage `timings`, the time spent writing the markdown is added to them
+        content_store: Optional content store; the markdown is then stored compressed under its
+            hash instead of as `<safe_filename>.md`
+
+    Returns:
+        Path: The path of the saved markdown (file or content-store object)
+    """
+    # Save markdown
+    write_start = time.perf_counter()
+    if content_store is not None:
+        markdown_path = content_store.path_for(content_store.put(markdown))
+    else:
+        markdown_path = results_dir / f"{create_safe_filename(url)}.md"
+        atomic_write_text(markdown_path, markdown)
+    write_seconds = time.perf_counter() - write_start
+
+    # Save metadata
+    metadata = {
+        "url": url,
+        "crawl_time": datetime.now().isoformat(),
+        "success": True,
+        "markdown_length": len(markdown),
+        "content_hash": compute_content_hash(markdown)
+    }
+    if content_store is not None:
+        metadata["content_path"] = str(markdown_path)
+    metadata.update(extra_metadata or {})
+    if "timings" in metadata:
+        metadata["timings"] = dict(metadata["timings"], write_markdown=round(write_seconds, 4))
+
+    atomic_write_json(metadata_path_for(results_dir, url), metadata)
+
+    return markdown_path
+
+
+def load_crawl_metadata(results_dir: Path, url: str, stored: Optional[dict] = None) -> Optional[dict]:
+    """
+    Loads the metadata JSON of a previously crawled URL.
+
+    Args:
+        results_dir: The domain directory
+        url: The crawled URL
+        stored: Optional manifest entry of the page, to find metadata saved under an older file name
+
+    Returns:
+        Optional[dict]: The metadata, or None if the URL was never crawled successfully
+    """
+    try:
+        with open(metadata_path_for(results_dir, url, stored), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def update_crawl_metadata(results_dir: Path, url: str, updates: dict, stored: Optional[dict] = None):
+    """
+    Updates fields in the metadata JSON of a previously crawled URL.
+
+    Args:
+        results_dir: The domain directory
+        url: The crawled URL
+        updates: Fields to add or overwrite
+        stored: Optional manifest entry of the page, to update metadata saved under an older file name
+    """
+    metadata = load_crawl_metadata(results_dir, url, stored) or {"url": url}
+    metadata.update(updates)
+    atomic_write_json(metadata_path_for(results_dir, url, stored), metadata)
+
+
+def needs_recrawl(metadata: dict, sitemap_lastmod: Optional[str]) -> bool:
+    """
+    Decides whether a previously crawled page has to be fetched again.
+
+    A page whose sitemap lastmod did not change since the last crawl is
+    skipped without a request. Everything else is fetched (conditionally,
+    if validators were stored).
+
+    Args:
+        metadata: The stored metadata (or manifest entry) of the page
+        sitemap_lastmod: The lastmod currently listed in the sitemap
+
+    Returns:
+        bool: True if the page should be fetched
+    """
+    stored_lastmod = metadata.get("sitemap_lastmod")
+    if sitemap_lastmod and stored_lastmod:
+        return sitemap_lastmod > stored_lastmod
+    return True
+
+
+def save_crawl_error(results_dir: Path, url: str, error_message: str, extra_metadata: Optional[dict] = None) -> Path:
+    """
+    Saves the error information of a failed crawl.
+
+    Args:
+        results_dir: The domain directory to save into
+        url: The URL that failed
+        error_message: The error reported by the crawler
+        extra_metadata: Optional additional fields for the error JSON
+
+    Returns:
+        Path: The path of the saved error file
+    """
+    error_metadata = {
+        "url": url,
+        "crawl_time": datetime.now().isoformat(),
+        "success": False,
+        "error_message": error_message
+    }
+    error_metadata.update(extra_metadata or {})
 
+    error_path = results_dir / f"{create_safe_filename(url)}_error.json"
+    atomic_write_json(error_path, error_metadata)
+
+    return error_path
+
+
+def crawl_summary_path(results_dir: Path, sitemap_url: Optional[str] = None) -> Path:
+    """
+    Returns where the summary of a sitemap's crawl is written.
+
+    A site's summary is crawl_summary.json. When further sitemaps of a crawl
+    write into the same domain directory (e.g. a sitemap index and its posts
+    sitemap), each of those gets a summary named after its sitemap.
+
+    Args:
+        results_dir: The domain directory
+        sitemap_url: The sitemap, if it is not the first one crawled into the directory
+
+    Returns:
+        Path: crawl_summary.json, or crawl_summary_<sitemap path>.json for a further sitemap
+    """
+    if sitemap_url is None:
+        return results_dir / "crawl_summary.json"
+    parts = urlsplit(sitemap_url)
+    name = create_safe_filename(parts.path + (f"?{parts.query}" if parts.query else "")).strip("_")
+    return results_dir / f"crawl_summary_{name or 'sitemap'}.json"
+
+
+def write_crawl_summary(results_dir: Path, sitemap_url: str, total_urls_attempted: int, successful_crawls: int,
+                        skipped_urls: int, metrics: Optional[dict] = None, shared_directory: bool = False):
+    """
+    Writes the crawl summary of a sitemap's crawl run.
+
+    Args:
+        results_dir: The domain directory to save into
+        sitemap_url: The sitemap that was crawled
+        total_urls_attempted: Number of URLs that were (to be) crawled
+        successful_crawls: Number of URLs crawled successfully
+        skipped_urls: Number of URLs skipped because they were scraped before
+        metrics: Optional stage timings and counters (see `CrawlMetrics.summary`)
+        shared_directory: Another sitemap of the crawl already writes crawl_summary.json into `results_dir`
+    """
+    summary = {
+        "crawl_time": datetime.now().isoformat(),
+        "sitemap_url": sitemap_url,
+        "total_urls_attempted": total_urls_attempted,
+        "successful_crawls": successful_crawls,
+        "skipped_urls": skipped_urls,
+        "results_directory": str(results_dir)
+    }
+    if metrics is not None:
+        summary["metrics"] = metrics
+
+    atomic_write_json(crawl_summary_path(results_dir, sitemap_url if shared_directory else None), summary)
+
+
+@dataclass
+class SiteCrawl:
+    """The pages planned for one sitemap in a crawl and its running totals."""
+    sitemap_url: str
+    domain: str
+    results_dir: Path
+    urls_to_crawl: List[str]
+    skipped_urls: int = 0
+    lastmods: Dict[str, str] = field(default_factory=dict)
+    stored_metadata: Dict[str, dict] = field(default_factory=dict)
+    successful_crawls: int = 0
+    unchanged_urls: int = 0
+    failed_urls: int = 0
+    retries: int = 0
+    completed: int = 0
+    metrics: Optional[CrawlMetrics] = None
+    # Set when an earlier sitemap of the same crawl writes into the same results directory
+    shared_directory: bool = False
+
+    @property
+    def hosts(self) -> List[str]:
+        """The hosts of the site's planned URLs."""
+        return sorted({get_host(url) for url in self.urls_to_crawl})
+
+    def write_summary(self):
+        """Writes (or checkpoints) the crawl summary of the site's sitemap, with its hosts' metrics."""
+        write_crawl_summary(
+            self.results_dir, self.sitemap_url, len(self.urls_to_crawl), self.successful_crawls, self.skipped_urls,
+            self.metrics.summary(self.hosts) if self.metrics is not None else None,
+            self.shared_directory,
+        )
+
+    def message(self, recrawl: bool = False) -> str:
+        """
+        Describes the outcome of the crawl for the agent.
+
+        Args:
+            recrawl: Whether the crawl refreshed previously crawled pages
+
+        Returns:
+            str: The result message
+        """
+        if len(self.urls_to_crawl) != self.skipped_urls:
+            message = f"Crawling complete. Processed {len(self.urls_to_crawl)} URLs with {self.successful_crawls} successful crawls. Skipped {self.skipped_urls} previously scraped URLs."
+            if recrawl:
+                message += f" {self.unchanged_urls} URLs were unchanged since the last crawl."
+            return message
+        else:
+            return "No sites were scraped since everything is up to date"
+
+
+def plan_site_crawl(urls: List[str], sitemap_url: str, manifest: CrawlManifest,
+                    lastmods: Optional[Dict[str, str]] = None, recrawl: bool = False) -> SiteCrawl:
+    """
+    Decides which URLs of a sitemap have to be crawled.
+
+    Already scraped URLs are skipped, or, when recrawling, the ones whose
+    sitemap lastmod did not change.
+
+    Args:
+        urls: The candidate URLs of the sitemap (already cut to the site's quota)
+        sitemap_url: Original sitemap URL (used to determine the domain folder)
+        manifest: The crawl manifest to check the URLs against
+        lastmods: Optional sitemap lastmod per URL
+        recrawl: Refresh previously crawled pages instead of skipping them
+
+    Returns:
+        SiteCrawl: The planned crawl of the site
+    """
     # Get domain name for the folder
     domain = get_domain_name(sitemap_url)
 
@@ -174,159 +425,597 @@ async def crawl_sequential(urls: List[str], sitemap_url: str):
     results_dir = Path("../DATA/crawl_results") / domain
     results_dir.mkdir(parents=True, exist_ok=True)
 
-    browser_config = BrowserConfig(
-        headless=True,
-        extra_args=[
-            "--disable-gpu",
-            "--disable-dev-shm-usage",
-            "--no-sandbox",
-            "--disable-setuid-sandbox",
-            "--disable-web-security",
-            "--disable-features=IsolateOrigins,site-per-process"
-        ],
+    lastmods = lastmods or {}
+
+    # Directories written before the manifest existed are imported once
+    manifest.migrate_directory(results_dir, domain)
+
+    # Filter out already scraped URLs (or, when recrawling, the ones that did not change)
+    candidates = list(dict.fromkeys(urls))
+    new_urls = set(manifest.find_new_urls(candidates))
+    stored_metadata = manifest.get_many(url for url in candidates if url not in new_urls) if recrawl else {}
+    urls_to_crawl = []
+    skipped_urls = 0
+    for url in candidates:
+        if url in new_urls or (url in stored_metadata and needs_recrawl(stored_metadata[url], lastmods.get(url))):
+            urls_to_crawl.append(url)
+        else:
+            skipped_urls += 1
+
+    print(f"Skipped {skipped_urls} already scraped URLs of {domain}")
+
+    return SiteCrawl(
+        sitemap_url=sitemap_url,
+        domain=domain,
+        results_dir=results_dir,
+        urls_to_crawl=urls_to_crawl,
+        skipped_urls=skipped_urls,
+        lastmods=lastmods,
+        stored_metadata=stored_metadata,
     )
 
+
+async def crawl_sites(
+        sites: List[SiteCrawl],
+        manifest: CrawlManifest,
+        max_concurrency: int = 4,
+        per_host_concurrency: int = 1,
+        politeness_delay: Tuple[float, float] = (2.0, 4.0),
+        pool: Optional[CrawlerPool] = None,
+        use_http_tier: bool = True,
+        content_store: Optional[ContentStore] = None,
+        journal: Optional[CrawlJournal] = None,
+        run_id: Optional[str] = None,
+        rate_controller: Optional[HostRateController] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        metrics: Optional[CrawlMetrics] = None,
+        corpus_index: Optional[CorpusIndex] = None,
+        strip_boilerplate: bool = True,
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+        converter: Optional[ConversionPool] = None,
+):
+    """
+    Crawls the planned URLs of one or more sites with one shared pool of workers.
+
+    All URLs go into a single per-host scheduler, different hosts (and sites)
+    are crawled in parallel. The delay between two requests to the same host
+    starts in the politeness range and then adapts: it shrinks while the host
+    answers quickly and without errors, and grows on 429/503, timeouts and
+    Retry-After. Transient failures are queued again with jittered
+    exponential backoff until the run's retry budget is spent. Results are
+    saved into each site's domain folder and the counters of each `SiteCrawl`
+    are updated in place.
+
+    Every page's stage timings (http, markdown, browser, dedupe, write,
+    manifest), byte counts, tier and attempts are stored in its metadata and
+    aggregated per host into `metrics`, whose percentiles end up in each
+    sitemap's crawl summary. Saved pages are added to the full-text
+    `corpus_index`, if one is given.
+
+    Both tiers keep only the main article of a page: navigation, cookie
+    banners, footers, share links and related posts are stripped before the
+    markdown is saved, and the tokens saved are recorded per page. The
+    conversion to markdown runs in the worker processes of `converter`, so it
+    overlaps with the downloads instead of stalling them.
+
+    With a `near_duplicates` index every saved page is fingerprinted. Pages
+    that republish an article already crawled are flagged in their metadata
+    (`near_duplicate_of`, `cluster`), and copies of a page of another domain
+    are kept out of the corpus index.
+
+    Args:
+        sites: The planned site crawls (see `plan_site_crawl`)
+        manifest: The crawl manifest to record results in
+        max_concurrency: Number of pages crawling at the same time, over all sites
+        per_host_concurrency: Maximum number of pages crawling the same host at the same time
+        politeness_delay: (min, max) seconds to wait between two requests to the same host
+        pool: Optional warm crawler pool to borrow the browser from. The coroutine
+            must then run on the pool's loop (`pool.run(...)`) and the browser stays open.
+        use_http_tier: Try the plain HTTP fetch before the browser
+        content_store: Optional content store to save markdown compressed and de-duplicated by hash
+        journal: Optional crawl journal to log intents and completions to
+        run_id: The journal run the crawl belongs to (required with a journal)
+        rate_controller: Optional controller adapting the delay per host, one starting
+            from the politeness delay otherwise
+        retry_policy: Optional retry policy (attempts, backoff, budget) for the run
+        metrics: Optional collector for stage timings and counters, e.g. to export them afterwards
+        corpus_index: Optional full-text index to add the saved pages to
+        strip_boilerplate: Keep only the main article of every page instead of the whole page
+        near_duplicates: Optional near-duplicate index to fingerprint and cluster the saved pages in
+        converter: Optional pool converting the pages to markdown, the process-wide one otherwise
+    """
+    if rate_controller is None:
+        rate_controller = HostRateController(
+            initial_delay=sum(politeness_delay) / 2,
+            min_delay=min(0.5, politeness_delay[0]),
+        )
+    retry_policy = retry_policy or RetryPolicy()
+    metrics = metrics if metrics is not None else CrawlMetrics()
+    converter = converter or get_conversion_pool()
+
     crawl_config = CrawlerRunConfig(
         markdown_generator=DefaultMarkdownGenerator()
     )
 
-    # Create the crawler (opens the browser)
-    crawler = AsyncWebCrawler(config=browser_config)
-    await crawler.start()
+    # A URL listed by several sitemaps is crawled once, for the first site listing it
+    site_for_url: Dict[str, SiteCrawl] = {}
+    results_dirs = set()
+    for site in sites:
+        site.metrics = metrics
+        site.shared_directory = site.results_dir in results_dirs
+        results_dirs.add(site.results_dir)
+        for url in site.urls_to_crawl:
+            site_for_url.setdefault(url, site)
+        if journal is not None:
+            journal.intents(run_id, site.sitemap_url, site.urls_to_crawl)
+
+    scheduler = HostScheduler(
+        list(site_for_url),
+        per_host_concurrency=per_host_concurrency,
+        politeness_delay=politeness_delay,
+        rate_controller=rate_controller,
+    )
+    attempts: Dict[str, int] = {}
+
+    http_fetcher = HttpFetcher(limit_per_host=per_host_concurrency, strip_boilerplate=strip_boilerplate,
+                               converter=converter)
+    crawler = None
+    crawler_lock = asyncio.Lock()
+
+    async def get_crawler():
+        # The browser is only started once a page actually needs it
+        nonlocal crawler
+        async with crawler_lock:
+            if crawler is None:
+                if pool is not None:
+                    crawler = await pool.get_crawler()
+                else:
+                    crawler = AsyncWebCrawler(config=create_browser_config())
+                    await crawler.start()
+            return crawler
+
+    async def fetch_with_browser(url: str, worker_id: int) -> FetchResult:
+        start = time.perf_counter()
+        browser = await get_crawler()
+        session_id = await pool.lease_session(worker_id) if pool is not None else f"session{worker_id}"
+        result = await browser.arun(
+            url=url,
+            config=crawl_config,
+            session_id=session_id
+        )
+        elapsed = time.perf_counter() - start
+        markdown, extraction = "", None
+        timings = {"browser": round(elapsed, 4)}
+        if result.success:
+            html = getattr(result, "html", None) or ""
+            if strip_boilerplate and html:
+                convert_start = time.perf_counter()
+                markdown, extraction = await converter.convert(html)
+                timings["markdown"] = round(time.perf_counter() - convert_start, 4)
+            if not markdown:
+                markdown, extraction = result.markdown.raw_markdown, None
+        return FetchResult(
+            url=url,
+            success=result.success,
+            markdown=markdown,
+            extraction=extraction,
+            tier="browser",
+            status_code=result.status_code,
+            headers=dict(result.response_headers or {}),
+            error_message=result.error_message,
+            elapsed=elapsed,
+            bytes_received=len((getattr(result, "html", None) or "").encode("utf-8")),
+            timings=timings,
+        )
+
+    async def fetch_page(site: SiteCrawl, url: str, worker_id: int) -> Tuple[FetchResult, dict]:
+        tier_info = {}
+        http_timings = {}
+        if use_http_tier:
+            validators = site.stored_metadata.get(url, {})
+            http_result = await http_fetcher.fetch(url, validators.get("etag"), validators.get("last_modified"))
+            if http_result.not_modified:
+                return http_result, tier_info
+            if http_result.success:
+                reason = detect_js_rendering(http_result.html)
+            else:
+                reason = detect_challenge(http_result.status_code, http_result.html)
+            if reason is None:
+                # A usable page or a failure the browser would get as well (404, not HTML, throttling, ...)
+                return http_result, tier_info
+            print(f"Escalating {url} to the browser: {reason}")
+            tier_info = {"http_seconds": round(http_result.elapsed, 3), "escalation_reason": reason}
+            http_timings = http_result.timings
+        result = await fetch_with_browser(url, worker_id)
+        # Keep what the failed HTTP attempt cost, it is part of the page's time
+        result.timings = {**http_timings, **result.timings}
+        return result, tier_info
+
+    async def worker(worker_id: int):
+        while True:
+            url = await scheduler.acquire()
+            if url is None:
+                return
+            site = site_for_url[url]
+            results_dir = site.results_dir
+            attempt = attempts[url] = attempts.get(url, 0) + 1
+            status = "error"
+            backoff = None
+            fetch_tier = None
+            timings = {}
+            bytes_received = 0
+            page_start = time.perf_counter()
+            try:
+                result, tier_info = await fetch_page(site, url, worker_id)
+                fetch_tier = result.tier
+                timings = dict(result.timings)
+                bytes_received = result.bytes_received
+                rate_controller.observe(get_host(url), result.elapsed, result.status_code,
+                                        None if result.success else result.error_message, result.retry_after)
+                tier_info.update({
+                    "fetch_tier": result.tier,
+                    "fetch_seconds": round(result.elapsed, 3),
+                    "sitemap_lastmod": site.lastmods.get(url),
+                    "bytes_received": bytes_received,
+                    "timings": timings,
+                })
+                tier_info.update(result.validators)
+                if result.extraction:
+                    tier_info["content_extraction"] = result.extraction
+                    metrics.count(get_host(url), "boilerplate_tokens_removed", result.extraction["tokens_removed"])
+                if attempt > 1:
+                    tier_info["attempts"] = attempt
+
+                if not result.success and retry_policy.should_retry(attempt, result.status_code, result.error_message):
+                    backoff = retry_policy.backoff(attempt, result.retry_after)
+                    print(f"Retrying {url} in {backoff:.1f}s (attempt {attempt} failed: {result.error_message})")
+                elif result.not_modified:
+                    print(f"Unchanged since last crawl: {url}")
+                    site.unchanged_urls += 1
+                    checked = {
+                        "checked_time": datetime.now().isoformat(),
+                        "sitemap_lastmod": site.lastmods.get(url) or site.stored_metadata[url].get("sitemap_lastmod"),
+                    }
+                    update_crawl_metadata(results_dir, url, checked, site.stored_metadata.get(url))
+                    manifest.update(url, **checked)
+                    status = "unchanged"
+                elif result.success:
+                    print(f"Successfully crawled ({result.tier}): {url}")
+                    site.successful_crawls += 1
+                    stage_start = time.perf_counter()
+                    content_hash = compute_content_hash(result.markdown)
+                    duplicate_of = manifest.find_by_content_hash(content_hash, exclude_url=url)
+                    if duplicate_of:
+                        print(f"Same content as already crawled {duplicate_of}")
+                        tier_info["duplicate_of"] = duplicate_of
+                    copy_of = None
+                    if near_duplicates is not None:
+                        copy_of = near_duplicates.add(url, site.domain, result.markdown)
+                    if copy_of is not None:
+                        print(f"Near-duplicate of {copy_of['original_url']} ({copy_of['distance']} bits apart)")
+                        tier_info["near_duplicate_of"] = copy_of["original_url"]
+                        tier_info["cluster"] = copy_of["cluster"]
+                        metrics.count(get_host(url), "near_duplicates")
+                    timings["dedupe"] = round(time.perf_counter() - stage_start, 4)
+                    tier_info["markdown_bytes"] = len(result.markdown.encode("utf-8"))
+                    metrics.count(get_host(url), "markdown_bytes", tier_info["markdown_bytes"])
+
+                    stage_start = time.perf_counter()
+                    markdown_path = save_crawl_result(results_dir, url, result.markdown, tier_info, content_store)
+                    timings["write"] = round(time.perf_counter() - stage_start, 4)
+
+                    stage_start = time.perf_counter()
+                    manifest.record(
+                        url, site.domain, "success",
+                        markdown_path=str(markdown_path),
+                        meta_path=str(metadata_path_for(results_dir, url)),
+                        markdown_length=len(result.markdown),
+                        content_hash=content_hash,
+                        crawl_time=datetime.now().isoformat(),
+                        **tier_info,
+                    )
+                    timings["manifest"] = round(time.perf_counter() - stage_start, 4)
+
+                    if corpus_index is not None and (copy_of is None or copy_of["domain"] == site.domain):
+                        stage_start = time.perf_counter()
+                        corpus_index.add(url, site.domain, result.markdown, content_hash)
+                        timings["index"] = round(time.perf_counter() - stage_start, 4)
+                    status = "success"
+                    print(f"Saved results to: {markdown_path}")
+                else:
+                    print(f"Failed: {url} - Error: {result.error_message}")
+                    site.failed_urls += 1
+                    error_path = save_crawl_error(results_dir, url, result.error_message, tier_info)
+                    manifest.record(url, site.domain, "error", meta_path=str(error_path), **tier_info,
+                                    error_message=result.error_message)
+            except Exception as e:
+                rate_controller.observe(get_host(url), 0.0, error_message=str(e))
+                if retry_policy.should_retry(attempt, error_message=str(e)):
+                    backoff = retry_policy.backoff(attempt)
+                    print(f"Retrying {url} in {backoff:.1f}s (attempt {attempt} failed: {e})")
+                else:
+                    print(f"Failed: {url} - Error: {e}")
+                    site.failed_urls += 1
+                    error_path = save_crawl_error(results_dir, url, str(e))
+                    manifest.record(url, site.domain, "error", meta_path=str(error_path), error_message=str(e))
+            finally:
+                try:
+                    host = get_host(url)
+                    if backoff is not None:
+                        scheduler.retry(url, backoff)
+                        site.retries += 1
+                        metrics.count(host, "retries")
+                    timings["total"] = round(time.perf_counter() - page_start, 4)
+                    for stage, seconds in timings.items():
+                        metrics.observe(host, stage, seconds)
+                    metrics.count(host, "bytes_received", bytes_received)
+                    if backoff is None:
+                        metrics.count(host, "pages", tier=fetch_tier or "none", status=status)
+                        if journal is not None:
+                            journal.done(run_id, url, status)
+                        site.completed += 1
+                        if site.completed % SUMMARY_CHECKPOINT_EVERY == 0:
+                            site.write_summary()
+                finally:
+                    # The host slot is freed even when the bookkeeping fails, or the crawl never finishes
+                    await scheduler.release(url)
+
+    worker_ids = []
+    try:
+        worker_count = max(1, min(max_concurrency, len(site_for_url)))
+        print(f"Crawling {len(site_for_url)} URLs of {len(sites)} sites on {scheduler.hosts} hosts "
+              f"with {worker_count} workers")
+        # On a shared pool the workers get slots no other running crawl holds, i.e. browser pages of their own
+        worker_ids = [pool.acquire_slot() if pool is not None else i + 1 for i in range(worker_count)]
+        await asyncio.gather(*(worker(worker_id) for worker_id in worker_ids))
+    finally:
+        # Clean up, a pooled browser is closed by the pool when idle
+        if pool is not None:
+            for worker_id in worker_ids:
+                pool.release_slot(worker_id)
+        await http_fetcher.close()
+        if crawler is not None and pool is None:
+            await crawler.close()
+
+        # Save summaries
+        for site in sites:
+            site.write_summary()
+            print(f"\nCrawling complete. Results saved in: {site.results_dir}")
+
+
+async def crawl_concurrent(
+        urls: List[str],
+        sitemap_url: str,
+        max_concurrency: int = 4,
+        per_host_concurrency: int = 1,
+        politeness_delay: Tuple[float, float] = (2.0, 4.0),
+        max_urls: int = 30,
+        pool: Optional[CrawlerPool] = None,
+        use_http_tier: bool = True,
+        lastmods: Optional[Dict[str, str]] = None,
+        recrawl: bool = False,
+        manifest: Optional[CrawlManifest] = None,
+        content_store: Optional[ContentStore] = None,
+        journal: Optional[CrawlJournal] = None,
+        run_id: Optional[str] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        prometheus_path: Optional[Path] = None,
+        corpus_index: Optional[CorpusIndex] = None,
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+        converter: Optional[ConversionPool] = None,
+):
+    """
+    Crawls a list of URLs with a bounded pool of workers and saves results.
+
+    URLs are handed out by a per-host scheduler: requests to the same host are
+    spaced by an adaptive delay starting in the politeness range, while
+    different hosts are crawled in parallel, so the total time scales with the
+    number of hosts rather than the number of URLs. Throttled and transient
+    failures are retried with backoff.
+
+    Pages are first fetched over plain HTTP and converted to markdown. Only
+    pages that look JavaScript-rendered or empty, and bot challenges, are
+    escalated to the headless browser, which is started on first need. The tier used for every page is
+    recorded as `fetch_tier` in its metadata JSON.
 
+    All files are written atomically. With a journal, every URL's intent and
+    completion is logged so an interrupted crawl can be picked up again by
+    `resume_crawl`; the sitemap's crawl summary is checkpointed while the crawl runs.
+    Saved pages are added to the full-text corpus index right away.
+
+    In recrawl mode, pages that were crawled before are not skipped but
+    refreshed as a delta: pages whose sitemap lastmod is unchanged are left
+    alone, the others are fetched with the stored ETag/Last-Modified
+    validators and only re-saved if the server reports a change.
+
+    To crawl several sitemaps under one scheduler use `tools.batch_crawl.run_batch`.
+
+    Args:
+        urls: List of URLs to crawl
+        sitemap_url: Original sitemap URL (used to determine the domain folder)
+        max_concurrency: Number of browser pages crawling at the same time
+        per_host_concurrency: Maximum number of pages crawling the same host at the same time
+        politeness_delay: (min, max) seconds to wait between two requests to the same host
+        max_urls: Maximum number of URLs to crawl in this run
+        pool: Optional warm crawler pool to borrow the browser from. The coroutine
+            must then run on the pool's loop (`pool.run(...)`) and the browser stays open.
+        use_http_tier: Try the plain HTTP fetch before the browser
+        lastmods: Optional sitemap lastmod per URL, stored in the metadata
+        recrawl: Refresh previously crawled pages instead of skipping them
+        manifest: Optional crawl manifest to use, the default one under ../DATA/crawl_results otherwise
+        content_store: Optional content store to save markdown compressed and de-duplicated by hash
+        journal: Optional crawl journal to log intents and completions to
+        run_id: Optional journal run this crawl belongs to; without it the crawl is its own run
+        retry_policy: Optional retry policy (attempts, backoff, budget), the default one otherwise
+        prometheus_path: Optional file to export the crawl metrics to in the Prometheus text format
+        corpus_index: Optional full-text index to add saved pages to, the default one under
+            ../DATA/crawl_results otherwise
+        near_duplicates: Optional near-duplicate index to fingerprint saved pages in, the default
+            one under ../DATA/crawl_results otherwise
+        converter: Optional pool converting the pages to markdown, the process-wide one otherwise
+    """
+    if not urls:
+        print("No URLs to crawl")
+        return "No URLs to crawl, Skip this page and continue with the next."
+
+    own_manifest = manifest is None
+    if own_manifest:
+        manifest = CrawlManifest()
+    own_index = corpus_index is None
+    if own_index:
+        corpus_index = CorpusIndex()
+    own_near_duplicates = near_duplicates is None
+    if own_near_duplicates:
+        near_duplicates = NearDuplicateIndex()
+
+    own_run = journal is not None and run_id is None
+    metrics = CrawlMetrics()
     try:
-        session_id = "session1"
-        successful_crawls = 0
-        skipped_urls = 0
-        max_urls = 30
-        urls_to_crawl = urls[:max_urls]
-
-        # Filter out already scraped URLs
-        filtered_urls = []
-        for url in urls_to_crawl:
-            if not is_already_scraped(url, results_dir):
-                filtered_urls.append(url)
-            else:
-                skipped_urls += 1
-
-        print(f"Skipped {skipped_urls} already scraped URLs")
-        urls_to_crawl = filtered_urls
-
-        for i, url in enumerate(urls_to_crawl):
-            # Add a random delay between requests
-            if i > 0:
-                delay = random.uniform(2, 4)
-                print(f"Waiting {delay:.1f} seconds before next request...")
-                await asyncio.sleep(delay)
-
-            result = await crawler.arun(
-                url=url,
-                config=crawl_config,
-                session_id=session_id
-            )
-
-            # Create safe filename from URL
-            safe_filename = create_safe_filename(url)
-
-            if result.success:
-                print(f"Successfully crawled: {url}")
-                successful_crawls += 1
-
-                # Save markdown
-                markdown_path = results_dir / f"{safe_filename}.md"
-                markdown_path.write_text(result.markdown.raw_markdown, encoding="utf-8")
-
-                # Save metadata
-                metadata = {
-                    "url": url,
-                    "crawl_time": datetime.now().isoformat(),
-                    "success": True,
-                    "markdown_length": len(result.markdown.raw_markdown)
-                }
-
-                metadata_path = results_dir / f"{safe_filename}_meta.json"
-                with open(metadata_path, 'w', encoding='utf-8') as f:
-                    json.dump(metadata, f, indent=2)
-
-                print(f"Saved results to: {markdown_path}")
-            else:
-                print(f"Failed: {url} - Error: {result.error_message}")
-
-                # Save error information
-                error_metadata = {
-                    "url": url,
-                    "crawl_time": datetime.now().isoformat(),
-                    "success": False,
-                    "error_message": result.error_message
-                }
-
-                error_path = results_dir / f"{safe_filename}_error.json"
-                with open(error_path, 'w', encoding='utf-8') as f:
-                    json.dump(error_metadata, f, indent=2)
+        site = plan_site_crawl(urls[:max_urls], sitemap_url, manifest, lastmods, recrawl)
+        if own_run:
+            run_id = journal.start_run([sitemap_url], max_urls=max_urls, recrawl=recrawl,
+                                       content_store=content_store is not None)
+        await crawl_sites(
+            [site], manifest,
+            max_concurrency=max_concurrency,
+            per_host_concurrency=per_host_concurrency,
+            politeness_delay=politeness_delay,
+            pool=pool,
+            use_http_tier=use_http_tier,
+            content_store=content_store,
+            journal=journal,
+            run_id=run_id,
+            retry_policy=retry_policy,
+            metrics=metrics,
+            corpus_index=corpus_index,
+            near_duplicates=near_duplicates,
+            converter=converter,
+        )
     finally:
-        # Clean up
-        await crawler.close()
-
-        # Save summary
-        summary = {
-            "crawl_time": datetime.now().isoformat(),
-            "total_urls_attempted": len(urls_to_crawl),
-            "successful_crawls": successful_crawls,
-            "skipped_urls": skipped_urls,
-            "results_directory": str(results_dir)
-        }
-
-        summary_path = results_dir / "crawl_summary.json"
-        with open(summary_path, 'w', encoding='utf-8') as f:
-            json.dump(summary, f, indent=2)
-
-        print(f"\nCrawling complete. Results saved in: {results_dir}")
-
-    if len(urls_to_crawl) != skipped_urls:
-        return f"Crawling complete. Processed {len(urls_to_crawl)} URLs with {successful_crawls} successful crawls. Skipped {skipped_urls} previously scraped URLs."
-    else:
-        return "No sites were scraped since everything is up to date"
+        if own_manifest:
+            manifest.close()
+        if own_index:
+            corpus_index.close()
+        if own_near_duplicates:
+            near_duplicates.close()
+        if prometheus_path is not None:
+            metrics.write_prometheus(prometheus_path)
+
+    if own_run:
+        journal.end_run(run_id)
+
+    return site.message(recrawl)
+
+
+async def crawl_sequential(urls: List[str], sitemap_url: str):
+    """
+    Sequentially crawls a list of URLs and saves results.
+
+    Kept for callers that rely on one-page-at-a-time crawling; it is
+    `crawl_concurrent` with a single worker.
+
+    Args:
+        urls: List of URLs to crawl
+        sitemap_url: Original sitemap URL (used to determine the domain folder)
+    """
+    return await crawl_concurrent(urls, sitemap_url, max_concurrency=1)
+
+
+async def resume_crawl(journal: Optional[CrawlJournal] = None, frontier: Optional[UrlFrontier] = None,
+                       **crawl_options) -> List[str]:
+    """
+    Continues every journaled run that was interrupted.
+
+    URLs whose intent was logged without a completion are crawled again, and
+    sitemaps of a multi-sitemap run that were never started are resolved and
+    crawled with the run's original options. Each resumed run is closed in the
+    journal once done, and finished runs are compacted away.
+
+    Args:
+        journal: The journal to resume from, the default one under ../DATA/crawl_results otherwise
+        frontier: Optional URL frontier to select the pages of sitemaps that were never started,
+            the default one otherwise
+        **crawl_options: Extra keyword arguments for `crawl_concurrent` (e.g. pool, max_concurrency)
+
+    Returns:
+        List[str]: One result message per resumed sitemap
+    """
+    journal = journal or CrawlJournal()
+    frontier = frontier or UrlFrontier()
+    messages = []
+    for run_id, run in journal.unfinished_runs().items():
+        print(f"Resuming run {run_id} ({len(run['sitemaps'])} sitemaps)")
+        options = dict(run["options"])
+        max_urls = options.pop("max_urls", 30)
+        recrawl = options.pop("recrawl", False)
+        quotas = options.pop("quotas", {})
+        # Pages of a run stay in the storage the run started with
+        run_options = dict(crawl_options)
+        if options.pop("content_store", False):
+            run_options.setdefault("content_store", ContentStore())
+
+        for sitemap_url in run["sitemaps"]:
+            if sitemap_url in run["started"]:
+                urls = run["pending"].get(sitemap_url, [])
+                lastmods = {}
+                if not urls:
+                    continue
+            else:
+                entries = await SitemapResolver().resolve_entries(sitemap_url)
+                entries = frontier.select(entries, quotas.get(sitemap_url, max_urls))
+                urls = [entry.loc for entry in entries]
+                lastmods = {entry.loc: entry.lastmod for entry in entries if entry.lastmod}
+
+            messages.append(await crawl_concurrent(
+                urls, sitemap_url,
+                max_urls=len(urls),
+                lastmods=lastmods,
+                recrawl=recrawl,
+                journal=journal,
+                run_id=run_id,
+                **run_options,
+            ))
+        journal.end_run(run_id)
+
+    journal.compact()
+    return messages
 
 
 @tool
-def scrape_website_using_sitemap_url(sitemap_url: str) -> str:
+def scrape_website_using_sitemap_url(sitemap_url: str, use_content_store: Optional[bool] = False) -> str:
     """
     A tool that scrapes websites by using the web address to the sitemap.xml
 
     This function is designed to be used by an AI agent. It handles the asyncio
     event loop internally so the agent doesn't need to worry about async/await.
+    The headless browser is kept warm between calls, so scraping several
+    sitemaps in a row only pays the browser startup once. To crawl many sites
+    without an agent, use `python -m tools.batch_crawl`.
 
     Args:
-        sitemap_url: the full web address to the sitemap.xml
+        sitemap_url: the full web address to the sitemap.xml, or the address of the website to find its sitemap
+        use_content_store: Optional, save the pages compressed and de-duplicated instead of as .md files (defaults to False)
 
     Returns:
         str: A message indicating the result of the scraping operation
     """
-    # If sitemap_url doesn't end with .xml, we'll append sitemap.xml
-    if not sitemap_url.endswith('.xml'):
-        if not sitemap_url.endswith('/'):
-            sitemap_url += '/'
-        sitemap_url += 'sitemap.xml'
-        print(f"Adjusted URL to: {sitemap_url}")
-
-    # Get URLs from the sitemap
-    print(f"Fetching URLs from sitemap: {sitemap_url}")
-    urls = get_site_urls(sitemap_url)
-
-    if not urls:
+    # Imported here, the batch runner builds on this module
+    from tools.batch_crawl import run_batch
+
+    # Run the crawler on the warm browser pool's event loop
+    pool = get_crawler_pool()
+    journal = CrawlJournal()
+    summary = pool.run(run_batch([sitemap_url], pool=pool, journal=journal, summary_path=None,
+                                 content_store=ContentStore() if use_content_store else None))
+    journal.compact()
+
+    site = summary["sites"][0]
+    if not site["urls_found"]:
         print("No URLs found to crawl")
-        return "No URLs found to crawl. The site may be blocking access or using a non-standard format."
-
-    print(f"Found {len(urls)} URLs to crawl")
-
-    for url in urls[:11]:
-        print(url)
-
-    # Run the crawler in an asyncio event loop
-    result = asyncio.run(crawl_sequential(urls[:11], sitemap_url))
+        return site["message"]
 
     # Return a descriptive message
-    return f"Scraping complete: the 11 latest URLs and processed them.\n{result}"
+    return f"Scraping complete: the {site['urls_attempted'] + site['skipped_urls']} latest URLs and processed them.\n{site['message']}"
 
 
 if __name__ == "__main__":
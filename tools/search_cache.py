@@ -0,0 +1,224 @@
+import argparse
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Any, Optional
+
+
+DEFAULT_CACHE_PATH = Path("../DATA") / "search_cache.sqlite"
+
+# Seconds search results are reused; company listings and blog posts do not change by the hour
+DEFAULT_TTL = 3 * 24 * 3600
+
+# Punctuation search engines ignore between words (quotes and operators like - or site: are kept)
+IGNORED_PUNCTUATION_PATTERN = re.compile(r"[,;!?¿¡()\[\]{}]+|(?<!\w)\.|\.(?!\w)")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS searches (
+    provider TEXT NOT NULL,
+    query TEXT NOT NULL,
+    filter_year INTEGER NOT NULL,
+    original_query TEXT NOT NULL,
+    results TEXT NOT NULL,
+    max_results INTEGER,
+    stored_time REAL NOT NULL,
+    expires_time REAL NOT NULL,
+    PRIMARY KEY (provider, query, filter_year)
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a search query so that spellings the provider treats alike share one cache entry.
+
+    Unicode is normalized (NFKC), case is folded, punctuation that search
+    engines ignore is dropped and whitespace is collapsed, so "Firmen an
+    Kaiser-Wilhelm-Allee 80, Leverkusen" and "firmen an  Kaiser-Wilhelm-Allee 80
+    Leverkusen" are the same query.
+
+    Args:
+        query: The query as the agent wrote it
+
+    Returns:
+        str: The normalized query
+    """
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = IGNORED_PUNCTUATION_PATTERN.sub(" ", query)
+    return " ".join(query.split())
+
+
+class SearchCache:
+    """
+    A persistent cache of web search results, shared by all search tools and processes.
+
+    Entries are keyed by provider, normalized query and year filter and
+    expire after a TTL. Results are stored as JSON, so a tool can cache its
+    raw results (DuckDuckGo) or its formatted answer (Google).
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_TTL):
+        """
+        Args:
+            path: Location of the SQLite database file
+            ttl: Seconds results are reused
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        # Counters of this process only, `stats()` reports the shared ones
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+
+    def close(self):
+        """Closes the database connection."""
+        self._connection.close()
+
+    def _count(self, name: str):
+        self.counters[name] += 1
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                (name,),
+            )
+
+    def get(self, provider: str, query: str, filter_year: Optional[int] = None,
+            max_results: Optional[int] = None) -> Optional[Any]:
+        """
+        Looks up the results of a search.
+
+        Args:
+            provider: The search provider, e.g. "duckduckgo" or "serper"
+            query: The query (any spelling, it is normalized)
+            filter_year: Optional year the results were restricted to
+            max_results: Optional number of results wanted; entries searched with fewer are not used
+                and list results are cut to it
+
+        Returns:
+            Optional[Any]: The cached results, None if there are none or they expired
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT results, max_results, expires_time FROM searches "
+                "WHERE provider = ? AND query = ? AND filter_year = ?",
+                (provider, normalize_query(query), filter_year or 0),
+            ).fetchone()
+        if row is None or row["expires_time"] <= time.time():
+            self._count("misses")
+            return None
+
+        results = json.loads(row["results"])
+        if max_results is not None and row["max_results"] is not None and isinstance(results, list):
+            # A search for fewer results than wanted only counts if it found everything there is
+            if row["max_results"] < max_results and len(results) >= row["max_results"]:
+                self._count("misses")
+                return None
+            results = results[:max_results]
+        self._count("hits")
+        return results
+
+    def put(self, provider: str, query: str, results: Any, filter_year: Optional[int] = None,
+            max_results: Optional[int] = None):
+        """
+        Stores the results of a search.
+
+        Args:
+            provider: The search provider
+            query: The query as searched
+            results: The results, anything JSON serializable
+            filter_year: Optional year the results were restricted to
+            max_results: Optional number of results that was asked for
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO searches "
+                "(provider, query, filter_year, original_query, results, max_results, stored_time, expires_time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (provider, normalize_query(query), filter_year or 0, query, json.dumps(results, ensure_ascii=False),
+                 max_results, now, now + self.ttl),
+            )
+        self._count("stored")
+
+    def stats(self) -> dict:
+        """
+        Reports the cache counters over all processes and the number of cached searches.
+
+        Returns:
+            dict: hits, misses, stored, hit_rate, entries
+        """
+        with self._lock:
+            counters = {row["name"]: row["value"] for row in self._connection.execute("SELECT * FROM counters")}
+            entries = self._connection.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+        stats = {name: counters.get(name, 0) for name in ("hits", "misses", "stored")}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["entries"] = entries
+        return stats
+
+    def purge_expired(self) -> int:
+        """
+        Deletes expired searches.
+
+        Returns:
+            int: Number of deleted searches
+        """
+        with self._lock, self._connection:
+            return self._connection.execute("DELETE FROM searches WHERE expires_time <= ?", (time.time(),)).rowcount
+
+    def clear(self):
+        """Deletes all cached searches and resets the counters."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM searches")
+            self._connection.execute("DELETE FROM counters")
+        self.counters.clear()
+
+
+_cache: Optional[SearchCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """Returns the process-wide search cache at the default location."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SearchCache()
+        return _cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or clean up the shared search result cache.")
+    parser.add_argument("--purge-expired", action="store_true", help="Delete expired searches")
+    parser.add_argument("--clear", action="store_true", help="Delete all cached searches and reset the counters")
+    args = parser.parse_args()
+
+    cache = SearchCache()
+    try:
+        if args.clear:
+            cache.clear()
+        elif args.purge_expired:
+            print(f"Deleted {cache.purge_expired()} expired searches")
+        stats = cache.stats()
+        print(f"{stats['entries']} searches cached, {stats['hits']} hits, {stats['misses']} misses "
+              f"(hit rate {stats['hit_rate']:.1%})")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
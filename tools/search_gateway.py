@@ -0,0 +1,242 @@
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Optional, TypeVar
+
+from tools.rate_control import RetryPolicy, is_retryable
+
+
+T = TypeVar("T")
+
+# Errors of search providers that mean "slow down": DuckDuckGo's RatelimitException, HTTP 429, quota messages
+RATE_LIMIT_PATTERN = re.compile(r"rate ?limit|too many requests|\b429\b|quota", re.IGNORECASE)
+
+
+@dataclass
+class ProviderLimits:
+    """How fast a search provider may be queried."""
+    rate: float
+    burst: int = 2
+    min_rate: float = 0.05
+    max_attempts: int = 4
+
+
+# Sustainable rates in requests per second; DuckDuckGo blocks bursts quickly, the paid APIs allow more
+DEFAULT_PROVIDER_LIMITS = {
+    "duckduckgo": ProviderLimits(rate=0.5, burst=3),
+    "serper": ProviderLimits(rate=5.0, burst=5),
+    "serpapi": ProviderLimits(rate=1.0, burst=3),
+}
+FALLBACK_LIMITS = ProviderLimits(rate=1.0, burst=2)
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """
+    Checks whether a search failed because the provider wants us to slow down.
+
+    Args:
+        error: The exception raised by the search
+
+    Returns:
+        bool: True for rate limit exceptions and 429 / quota errors
+    """
+    return bool(RATE_LIMIT_PATTERN.search(f"{type(error).__name__} {error}"))
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket with an adaptive rate.
+
+    Tokens refill at `rate` per second up to `burst`. When the provider
+    throttles, the rate is halved and the bucket pauses; every success raises
+    it again a little, up to the configured rate, so the bucket settles just
+    below what the provider sustains.
+    """
+
+    def __init__(self, limits: ProviderLimits):
+        """
+        Args:
+            limits: The rate, burst and minimum rate of the provider
+        """
+        self.limits = limits
+        self.rate = limits.rate
+        self._tokens = float(limits.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.limits.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """
+        Blocks until a request may be sent.
+
+        Returns:
+            float: Seconds waited
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+            waited += wait
+
+    def throttled(self, pause: float):
+        """Halves the rate and holds back every request for `pause` seconds."""
+        with self._lock:
+            self.rate = max(self.limits.min_rate, self.rate / 2)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self._tokens = 0.0
+
+    def succeeded(self):
+        """Raises the rate back towards the configured one."""
+        with self._lock:
+            self.rate = min(self.limits.rate, self.rate + self.limits.rate / 10)
+
+
+class _Flight:
+    """A search in progress that identical searches wait for."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[Exception] = None
+
+
+class SearchGateway:
+    """
+    The one way out to the search providers for every agent and tool in the process.
+
+    Each provider gets a token bucket, so bursts from several agents are
+    spread out to a rate the provider sustains. Identical searches running
+    at the same time are sent once and all callers get the same answer
+    (single-flight). Rate limit and transient errors are retried with
+    jittered exponential backoff, pausing the provider for everybody.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, ProviderLimits]] = None,
+                 retry_policy: Optional[RetryPolicy] = None):
+        """
+        Args:
+            limits: Optional limits per provider, DEFAULT_PROVIDER_LIMITS otherwise
+            retry_policy: Optional policy computing the backoff between attempts
+        """
+        self.limits = dict(DEFAULT_PROVIDER_LIMITS if limits is None else limits)
+        self.retry_policy = retry_policy or RetryPolicy(base_delay=2.0, max_delay=30.0)
+        self.counters: Dict[str, Counter] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._flights: Dict[tuple, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, provider: str) -> TokenBucket:
+        with self._lock:
+            if provider not in self._buckets:
+                self._buckets[provider] = TokenBucket(self.limits.get(provider, FALLBACK_LIMITS))
+                self.counters[provider] = Counter()
+            return self._buckets[provider]
+
+    def _count(self, provider: str, name: str, value: float = 1):
+        with self._lock:
+            self.counters[provider][name] += value
+
+    def search(self, provider: str, key: Hashable, call: Callable[[], T]) -> T:
+        """
+        Runs a search through the provider's rate limit, once for all identical concurrent searches.
+
+        Args:
+            provider: The search provider, e.g. "duckduckgo" or "serper"
+            key: Identifies the search, e.g. (normalized query, filter year); equal keys share one request
+            call: Sends the search to the provider
+
+        Returns:
+            T: What `call` returned
+
+        Raises:
+            Exception: What `call` raised on its last attempt
+        """
+        bucket = self._bucket(provider)
+        flight_key = (provider, key)
+        with self._lock:
+            flight = self._flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[flight_key] = _Flight()
+        if not leader:
+            self._count(provider, "coalesced")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._send(provider, bucket, call)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[flight_key]
+            flight.done.set()
+
+    def _send(self, provider: str, bucket: TokenBucket, call: Callable[[], T]) -> T:
+        attempt = 0
+        while True:
+            attempt += 1
+            self._count(provider, "waited_seconds", bucket.acquire())
+            self._count(provider, "requests")
+            try:
+                result = call()
+            except Exception as e:
+                rate_limited = is_rate_limited(e)
+                if not rate_limited and not is_retryable(None, f"{type(e).__name__} {e}"):
+                    raise
+                if rate_limited:
+                    self._count(provider, "rate_limited")
+                if attempt >= bucket.limits.max_attempts:
+                    raise
+                backoff = self.retry_policy.backoff(attempt)
+                if rate_limited:
+                    bucket.throttled(backoff)
+                self._count(provider, "retries")
+                print(f"{provider} search failed ({type(e).__name__}: {e}), retrying in {backoff:.1f}s "
+                      f"at {bucket.rate:.2f} requests/s")
+                time.sleep(0.0 if rate_limited else backoff)
+                continue
+            bucket.succeeded()
+            return result
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        Reports requests, coalesced searches, rate limits, retries and waiting time per provider.
+
+        Returns:
+            Dict[str, dict]: The counters and the current rate (requests/s) per provider
+        """
+        with self._lock:
+            return {
+                provider: {**counters, "rate": round(self._buckets[provider].rate, 3)}
+                for provider, counters in self.counters.items()
+            }
+
+
+_gateway: Optional[SearchGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_search_gateway() -> SearchGateway:
+    """Returns the process-wide search gateway."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = SearchGateway()
+        return _gateway
@@ -0,0 +1,333 @@
+import asyncio
+import json
+import re
+import threading
+import zlib
+from datetime import datetime, timedelta
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+from smolagents import tool
+
+from tools.atomic_files import atomic_write_json
+from tools.sitemap_resolver import SITEMAP_HEADERS, get_base_url
+
+
+DEFAULT_CACHE_PATH = Path("../DATA/crawl_results") / "sitemap_cache.json"
+
+# Where sites usually keep their sitemaps and feeds, most specific kinds first
+COMMON_SITEMAP_PATHS = (
+    "sitemap_index.xml",
+    "sitemap-index.xml",
+    "sitemap.xml",
+    "wp-sitemap.xml",
+    "post-sitemap.xml",
+    "sitemap-posts.xml",
+    "sitemap.xml.gz",
+    "feed.xml",
+    "rss.xml",
+    "atom.xml",
+    "index.xml",
+    "feed",
+    "rss",
+)
+
+# Root elements of the documents the sitemap resolver understands
+SITEMAP_ROOT_PATTERN = re.compile(rb"<(?:\w+:)?(urlset|sitemapindex|rss|feed|rdf:RDF)\b", re.IGNORECASE)
+ROBOTS_SITEMAP_PATTERN = re.compile(r"^\s*sitemap\s*:\s*(\S+)", re.IGNORECASE | re.MULTILINE)
+
+FEED_TYPES = {"application/rss+xml", "application/atom+xml", "application/feed+json"}
+
+# Only the beginning of a candidate is read to recognize it
+SNIFF_BYTES = 4096
+
+# Responses that may answer differently on the next try, so "no sitemap" is not cached after them
+TRANSIENT_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class LinkHintParser(HTMLParser):
+    """Collects `<link rel="sitemap">` and RSS/Atom `<link rel="alternate">` hints of a page."""
+
+    def __init__(self, page_url: str):
+        super().__init__()
+        self.page_url = page_url
+        self.sitemaps: List[str] = []
+        self.feeds: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "link":
+            return
+        attrs = {name: (value or "") for name, value in attrs}
+        rel = attrs.get("rel", "").lower().split()
+        href = attrs.get("href")
+        if not href:
+            return
+        if "sitemap" in rel:
+            self.sitemaps.append(urljoin(self.page_url, href))
+        elif "alternate" in rel and attrs.get("type", "").lower() in FEED_TYPES:
+            self.feeds.append(urljoin(self.page_url, href))
+
+
+def looks_like_sitemap(head: bytes) -> Optional[str]:
+    """
+    Recognizes sitemaps and feeds from the first bytes of a response.
+
+    Args:
+        head: The beginning of the body (gzip compressed bodies are decompressed)
+
+    Returns:
+        Optional[str]: The root element ("urlset", "sitemapindex", "rss", "feed", ...), None otherwise
+    """
+    if head.startswith(b"\x1f\x8b"):
+        try:
+            head = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(head)
+        except zlib.error:
+            return None
+    match = SITEMAP_ROOT_PATTERN.search(head)
+    return match.group(1).decode().lower() if match else None
+
+
+def candidate_urls(site_url: str) -> List[str]:
+    """
+    Lists the common sitemap locations of a site.
+
+    Both the site root and, for URLs with a path (e.g. https://example.com/blog/),
+    the path itself are tried.
+
+    Args:
+        site_url: Any URL of the site
+
+    Returns:
+        List[str]: Candidate sitemap URLs, most promising first
+    """
+    base_url = get_base_url(site_url)
+    prefixes = [base_url + "/"]
+    path = urlsplit(site_url).path
+    # Strip a file name (or a wrongly guessed sitemap) from the path
+    if path and not path.endswith("/"):
+        path = path.rsplit("/", 1)[0] + "/"
+    if path not in ("", "/"):
+        prefixes.insert(0, base_url + path)
+    return [prefix + name for prefix in prefixes for name in COMMON_SITEMAP_PATHS]
+
+
+class SitemapDiscovery:
+    """
+    Finds the sitemaps of a site without guessing or a language model.
+
+    In one round of concurrent requests it reads the `Sitemap:` directives of
+    robots.txt, the `<link rel>` hints of the page and probes the common
+    sitemap and feed locations. Answers are cached per domain, in memory and
+    in a JSON file, so a site is only probed again when the cache expires.
+    That a site has no sitemap is only cached when every request got a
+    definite answer (e.g. 404), not after timeouts or server errors.
+    """
+
+    def __init__(self, cache_path: Optional[Path] = DEFAULT_CACHE_PATH, cache_ttl: timedelta = timedelta(days=7),
+                 timeout: float = 10.0, concurrency: int = 16):
+        """
+        Args:
+            cache_path: JSON file to persist discovered sitemaps in, None to cache in memory only
+            cache_ttl: How long a cached answer is used
+            timeout: Total timeout per request in seconds
+            concurrency: Maximum number of requests at the same time
+        """
+        self.cache_path = Path(cache_path) if cache_path is not None else None
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self._lock = threading.Lock()
+        self._cache: Dict[str, dict] = self._load_cache()
+
+    def _load_cache(self) -> Dict[str, dict]:
+        if self.cache_path is None or not self.cache_path.exists():
+            return {}
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            print(f"Could not read the sitemap cache {self.cache_path}, starting a new one")
+            return {}
+
+    @staticmethod
+    def _cache_key(site_url: str) -> str:
+        parts = urlsplit(site_url if "//" in site_url else "https://" + site_url)
+        path = parts.path if parts.path.endswith("/") else parts.path.rsplit("/", 1)[0] + "/"
+        return f"{parts.netloc.lower()}{path}"
+
+    def cached(self, site_url: str) -> Optional[List[str]]:
+        """
+        Returns the cached sitemaps of a site, if the answer has not expired.
+
+        Args:
+            site_url: Any URL of the site
+
+        Returns:
+            Optional[List[str]]: The sitemaps, None if the site has to be probed
+        """
+        with self._lock:
+            entry = self._cache.get(self._cache_key(site_url))
+        if not entry:
+            return None
+        if datetime.now() - datetime.fromisoformat(entry["checked"]) > self.cache_ttl:
+            return None
+        return entry["sitemaps"]
+
+    def _store(self, site_url: str, sitemaps: List[str]):
+        with self._lock:
+            self._cache[self._cache_key(site_url)] = {"sitemaps": sitemaps, "checked": datetime.now().isoformat()}
+            if self.cache_path is not None:
+                self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+                atomic_write_json(self.cache_path, self._cache)
+
+    async def _get_head(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                        url: str, size: int = SNIFF_BYTES) -> Tuple[Optional[str], bytes, Optional[int]]:
+        """
+        Fetches the beginning of a URL, returns (final URL after redirects, body head, status).
+
+        The status is None when the request failed without an HTTP response.
+        """
+        async with semaphore:
+            try:
+                async with session.get(url, headers={"Referer": get_base_url(url)}) as response:
+                    if response.status >= 400:
+                        return None, b"", response.status
+                    head = b""
+                    async for chunk in response.content.iter_chunked(8192):
+                        head += chunk
+                        if len(head) >= size:
+                            break
+                    return str(response.url), head[:size], response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeError, ValueError):
+                return None, b"", None
+
+    async def discover(self, site_url: str, refresh: bool = False,
+                       session: Optional[aiohttp.ClientSession] = None) -> List[str]:
+        """
+        Finds the sitemaps (and, failing those, the feeds) of a site.
+
+        Args:
+            site_url: Any URL of the site, e.g. https://bair.berkeley.edu/blog/
+            refresh: Ignore the cache
+            session: Optional client session to reuse, a new one is created otherwise
+
+        Returns:
+            List[str]: Sitemap URLs, best first: robots.txt directives, `<link rel="sitemap">`
+                hints, probed sitemaps, then feeds. Empty if nothing was found.
+        """
+        if "//" not in site_url:
+            site_url = "https://" + site_url
+        if not refresh:
+            cached = self.cached(site_url)
+            if cached is not None:
+                return cached
+
+        own_session = session is None
+        if own_session:
+            session = aiohttp.ClientSession(
+                headers=SITEMAP_HEADERS,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        semaphore = asyncio.Semaphore(self.concurrency)
+        base_url = get_base_url(site_url)
+        candidates = candidate_urls(site_url)
+        try:
+            robots, page, *probes = await asyncio.gather(
+                self._get_head(session, semaphore, base_url + "/robots.txt", size=64 * 1024),
+                self._get_head(session, semaphore, site_url if site_url.endswith("/") else base_url + "/",
+                               size=64 * 1024),
+                *(self._get_head(session, semaphore, url) for url in candidates),
+            )
+        finally:
+            if own_session:
+                await session.close()
+
+        declared = ROBOTS_SITEMAP_PATTERN.findall(robots[1].decode("utf-8", errors="replace"))
+
+        hints = LinkHintParser(page[0] or base_url)
+        if page[0]:
+            try:
+                hints.feed(page[1].decode("utf-8", errors="replace"))
+            except Exception:
+                # Broken markup only costs us the hints
+                pass
+
+        sitemaps, feeds = [], []
+        for (final_url, head, _), url in zip(probes, candidates):
+            kind = looks_like_sitemap(head)
+            if kind is None:
+                continue
+            (feeds if kind in ("rss", "feed", "rdf:rdf") else sitemaps).append(final_url or url)
+
+        found = list(dict.fromkeys(declared + hints.sitemaps + sitemaps + feeds + hints.feeds))
+        if found:
+            print(f"Found {len(found)} sitemaps for {site_url}: {', '.join(found[:5])}")
+        else:
+            print(f"No sitemap found for {site_url}")
+            # A sitemap may hide behind a request that failed, ask again next time
+            failed = sum(status is None or status in TRANSIENT_STATUSES for _, _, status in (robots, page, *probes))
+            if failed:
+                print(f"{failed} requests to {site_url} failed, not caching the answer")
+                return found
+        self._store(site_url, found)
+        return found
+
+    async def discover_many(self, site_urls: List[str], refresh: bool = False) -> Dict[str, List[str]]:
+        """
+        Discovers the sitemaps of several sites concurrently.
+
+        Args:
+            site_urls: The sites
+            refresh: Ignore the cache
+
+        Returns:
+            Dict[str, List[str]]: Sitemaps per site
+        """
+        results = await asyncio.gather(*(self.discover(url, refresh) for url in site_urls))
+        return dict(zip(site_urls, results))
+
+
+_discovery: Optional[SitemapDiscovery] = None
+
+
+def get_sitemap_discovery() -> SitemapDiscovery:
+    """Returns the process-wide discovery with the default on-disk cache."""
+    global _discovery
+    if _discovery is None:
+        _discovery = SitemapDiscovery()
+    return _discovery
+
+
+def discover_sitemaps(site_url: str, refresh: bool = False) -> List[str]:
+    """
+    Finds the sitemaps of a site (synchronous version of `SitemapDiscovery.discover`).
+
+    Args:
+        site_url: Any URL of the site
+        refresh: Ignore the cache
+
+    Returns:
+        List[str]: Sitemap URLs, best first
+    """
+    return asyncio.run(get_sitemap_discovery().discover(site_url, refresh))
+
+
+@tool
+def find_sitemap(website_url: str) -> str:
+    """
+    A tool that finds the sitemap of a website. It checks robots.txt, the page's
+    link hints and the usual sitemap and feed locations, all at once.
+
+    Args:
+        website_url: the web address of the website, e.g. https://bair.berkeley.edu/blog/
+
+    Returns:
+        str: The sitemap URLs found (best first), or a message that none was found
+    """
+    sitemaps = discover_sitemaps(website_url)
+    if not sitemaps:
+        return f"No sitemap or feed found for {website_url}."
+    return "Sitemaps found (best first):\n" + "\n".join(sitemaps)
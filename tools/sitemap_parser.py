@@ -0,0 +1,242 @@
+import re
+import zlib
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+from xml.etree import ElementTree
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+URL_PATTERN = re.compile(rb'https?://[^\s<>"\']+')
+
+# Bodies that start like a sitemap or feed are parsed as XML, anything else (HTML, plain text) is scanned for links
+XML_START_PATTERN = re.compile(rb'<(?:\?xml|(?:[\w.-]+:)?(?:urlset|sitemapindex|rss|feed|RDF))[\s/>]')
+XML_SNIFF_BYTES = 64
+LEADING_BYTES = b'\xef\xbb\xbf \t\r\n'
+
+# Elements that describe one entry in a sitemap, sitemap index, RSS or Atom feed
+RECORD_TAGS = {'url', 'sitemap', 'item', 'entry'}
+
+
+class SitemapEntry(NamedTuple):
+    """One page (or sub-sitemap) listed in a sitemap or feed."""
+    loc: str
+    lastmod: Optional[str] = None
+    is_sitemap: bool = False
+
+
+def normalize_lastmod(value: Optional[str]) -> Optional[str]:
+    """
+    Normalizes sitemap (W3C datetime) and RSS (RFC 822) dates to ISO 8601 in UTC.
+
+    Args:
+        value: The raw date string
+
+    Returns:
+        Optional[str]: The normalized date, the stripped raw value if it cannot be parsed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return value
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+def _local_name(tag: str) -> str:
+    """Strips the XML namespace from a tag."""
+    return tag.rsplit('}', 1)[-1]
+
+
+class SitemapStreamParser:
+    """
+    Incremental parser for sitemaps, sitemap indexes and RSS/Atom feeds.
+
+    Bytes are fed in as they arrive from the network; gzip compressed bodies
+    (.xml.gz) are detected by their magic bytes and decompressed on the fly.
+    Parsed elements are dropped right away, so memory stays bounded no matter
+    how many URLs a sitemap contains. Responses that do not start like a
+    sitemap or feed (e.g. HTML pages) fall back to scanning the text for
+    same-domain links.
+    """
+
+    def __init__(self, base_url: Optional[str] = None):
+        """
+        Args:
+            base_url: Only used for non-XML responses: links must start with it
+        """
+        self.base_url = base_url.encode() if base_url else None
+
+        self._decompressor = None
+        self._compression_checked = False
+        self._mode = None  # "xml" or "text", decided on the first bytes
+        self._raw_head = b''
+        self._head = b''
+        self._xml_parser = None
+        self._stack = []
+        self._text_tail = b''
+
+    def feed(self, chunk: bytes) -> List[SitemapEntry]:
+        """
+        Feeds the next chunk of the response body.
+
+        Args:
+            chunk: Raw bytes as received
+
+        Returns:
+            List[SitemapEntry]: The entries completed by this chunk
+        """
+        if self._mode is None:
+            if not self._compression_checked:
+                self._raw_head += chunk
+                if len(self._raw_head) < 2:
+                    return []
+                self._compression_checked = True
+                if self._raw_head.startswith(GZIP_MAGIC):
+                    self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                chunk, self._raw_head = self._raw_head, b''
+            if self._decompressor is not None:
+                chunk = self._decompressor.decompress(chunk)
+            self._head = (self._head + chunk).lstrip(LEADING_BYTES)
+            if len(self._head) < XML_SNIFF_BYTES:
+                return []
+            return self._start()
+        elif self._decompressor is not None:
+            chunk = self._decompressor.decompress(chunk)
+
+        return self._feed(chunk)
+
+    def _start(self) -> List[SitemapEntry]:
+        """Picks the XML or text mode from the buffered beginning of the body and parses it."""
+        data, self._head = self._head.lstrip(LEADING_BYTES), b''
+        if XML_START_PATTERN.match(data):
+            self._mode = 'xml'
+            self._xml_parser = ElementTree.XMLPullParser(events=('start', 'end'))
+        else:
+            self._mode = 'text'
+            print("Response doesn't appear to be an XML sitemap. Looking for URLs directly...")
+        return self._feed(data)
+
+    def close(self) -> List[SitemapEntry]:
+        """
+        Signals the end of the body.
+
+        Returns:
+            List[SitemapEntry]: Entries completed by the remaining buffered bytes
+        """
+        entries = []
+        if self._mode is None:
+            # The whole body was shorter than what is needed to pick the mode
+            self._head += self._raw_head
+            if self._decompressor is not None:
+                self._head += self._decompressor.flush()
+            if not self._head.strip():
+                return entries
+            entries += self._start()
+        if self._decompressor is not None:
+            remaining = self._decompressor.flush()
+            if remaining:
+                entries += self._feed(remaining)
+        if self._mode == 'xml':
+            try:
+                self._xml_parser.close()
+            except ElementTree.ParseError as e:
+                print(f"XML parsing error. The sitemap may be truncated: {e}")
+        elif self._mode == 'text' and self._text_tail:
+            entries += self._feed_text(b'\n')
+        return entries
+
+    def _feed(self, data: bytes) -> List[SitemapEntry]:
+        """Dispatches decompressed data to the XML or text scanner."""
+        if self._mode == 'xml':
+            return self._feed_xml(data)
+        if self._mode == 'text':
+            return self._feed_text(data)
+        # Broken XML, ignore the rest of the body
+        return []
+
+    def _feed_xml(self, data: bytes) -> List[SitemapEntry]:
+        """Parses XML incrementally and emits finished records."""
+        entries = []
+        try:
+            self._xml_parser.feed(data)
+            for event, element in self._xml_parser.read_events():
+                if event == 'start':
+                    self._stack.append(element)
+                    continue
+
+                self._stack.pop()
+                if _local_name(element.tag) not in RECORD_TAGS:
+                    continue
+
+                entry = self._entry_from_element(element)
+                if entry is not None:
+                    entries.append(entry)
+
+                # Drop the finished record so the tree never grows
+                element.clear()
+                if self._stack:
+                    self._stack[-1].remove(element)
+        except ElementTree.ParseError as e:
+            print(f"XML parsing error. The response may not be a valid XML sitemap: {e}")
+            self._mode = 'broken'
+        return entries
+
+    @staticmethod
+    def _entry_from_element(element) -> Optional[SitemapEntry]:
+        """Builds an entry from a <url>, <sitemap>, <item> or <entry> element."""
+        kind = _local_name(element.tag)
+        loc = lastmod = None
+        for child in element:
+            name = _local_name(child.tag)
+            if name == 'loc' or (name == 'link' and kind == 'item'):
+                loc = (child.text or '').strip() or loc
+            elif name == 'link' and kind == 'entry':
+                # Atom links carry the URL in href, prefer the alternate (article) link
+                if child.get('rel', 'alternate') == 'alternate' and child.get('href'):
+                    loc = child.get('href').strip()
+            elif name in ('lastmod', 'pubDate', 'updated') or (name == 'published' and lastmod is None):
+                lastmod = child.text
+        if not loc:
+            return None
+        return SitemapEntry(loc, normalize_lastmod(lastmod), kind == 'sitemap')
+
+    def _feed_text(self, data: bytes) -> List[SitemapEntry]:
+        """Scans non-XML bodies for same-domain links, line by line."""
+        data = self._text_tail + data
+        cut = max(data.rfind(b'\n'), data.rfind(b' '))
+        if cut < 0:
+            self._text_tail = data
+            return []
+        data, self._text_tail = data[:cut + 1], data[cut + 1:]
+
+        entries = []
+        for match in URL_PATTERN.finditer(data):
+            url = match.group(0)
+            if self.base_url is None or url.startswith(self.base_url):
+                entries.append(SitemapEntry(url.decode('utf-8', errors='replace')))
+        return entries
+
+
+def iter_sitemap_entries(chunks: Iterable[bytes], base_url: Optional[str] = None) -> Iterator[SitemapEntry]:
+    """
+    Streams the entries of a sitemap, sitemap index or feed.
+
+    Args:
+        chunks: The response body in chunks (e.g. `response.iter_content(65536)`)
+        base_url: Only used for non-XML responses: links must start with it
+
+    Yields:
+        SitemapEntry: (loc, lastmod, is_sitemap) for every entry as soon as it is parsed
+    """
+    parser = SitemapStreamParser(base_url)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
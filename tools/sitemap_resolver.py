@@ -0,0 +1,154 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from tools.page_fetcher import BROWSER_HEADERS
+from tools.sitemap_parser import SitemapEntry, SitemapStreamParser
+
+
+SITEMAP_HEADERS = dict(BROWSER_HEADERS, **{
+    'Cache-Control': 'no-cache',
+    'Pragma': 'no-cache',
+})
+
+
+def get_base_url(url: str) -> str:
+    """
+    Returns scheme and host of a URL, e.g. https://example.com
+
+    Args:
+        url: The URL to shorten
+
+    Returns:
+        str: The base URL
+    """
+    return '/'.join(url.split('/')[:3])
+
+
+class SitemapResolver:
+    """
+    Resolves a sitemap (or a tree of sitemap indexes) into page URLs.
+
+    All sub-sitemaps of one level are fetched concurrently over a single
+    pooled session, so an index is resolved in about one round trip per
+    level. URLs and sitemaps are de-duplicated across the whole tree.
+    """
+
+    def __init__(self, max_depth: int = 3, max_sitemaps: int = 200, concurrency: int = 8, timeout: float = 15.0):
+        """
+        Args:
+            max_depth: How many levels of sitemap indexes to follow
+            max_sitemaps: Maximum number of sitemaps fetched in total (fan-out limit)
+            concurrency: Maximum number of sitemaps fetched at the same time
+            timeout: Total timeout per sitemap request in seconds
+        """
+        self.max_depth = max_depth
+        self.max_sitemaps = max_sitemaps
+        self.concurrency = concurrency
+        self.timeout = timeout
+        # Totals over everything this resolver fetched, for crawl metrics
+        self.sitemaps_fetched = 0
+        self.bytes_received = 0
+
+    async def _warm_up(self, session: aiohttp.ClientSession, base_url: str):
+        """Visits the homepage once to pick up cookies some sites require."""
+        try:
+            async with session.get(base_url, headers={'Referer': base_url}) as response:
+                await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Could not visit {base_url} for cookies: {e}")
+
+    async def _fetch(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                     sitemap_url: str) -> Tuple[List[SitemapEntry], List[str]]:
+        """Streams and parses a single sitemap (plain or gzip compressed)."""
+        parser = SitemapStreamParser(base_url=get_base_url(sitemap_url))
+        entries = []
+        async with semaphore:
+            try:
+                async with session.get(sitemap_url, headers={'Referer': get_base_url(sitemap_url)}) as response:
+                    response.raise_for_status()
+                    print(f"Request status code: {response.status} ({sitemap_url})")
+                    self.sitemaps_fetched += 1
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        self.bytes_received += len(chunk)
+                        entries.extend(parser.feed(chunk))
+                    entries.extend(parser.close())
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Error fetching sitemap {sitemap_url}: {e}")
+
+        pages = [entry for entry in entries if not entry.is_sitemap]
+        sub_sitemaps = [entry.loc for entry in entries if entry.is_sitemap]
+        return pages, sub_sitemaps
+
+    async def resolve(self, sitemap_url: str, session: Optional[aiohttp.ClientSession] = None) -> List[str]:
+        """
+        Resolves a sitemap URL into the de-duplicated list of page URLs.
+
+        Args:
+            sitemap_url: The sitemap or sitemap index to resolve
+            session: Optional client session to reuse, a new one is created otherwise
+
+        Returns:
+            List[str]: Page URLs in sitemap order
+        """
+        return [entry.loc for entry in await self.resolve_entries(sitemap_url, session)]
+
+    async def resolve_entries(self, sitemap_url: str,
+                              session: Optional[aiohttp.ClientSession] = None) -> List[SitemapEntry]:
+        """
+        Resolves a sitemap URL into the de-duplicated page entries, keeping their lastmod.
+
+        Args:
+            sitemap_url: The sitemap or sitemap index to resolve
+            session: Optional client session to reuse, a new one is created otherwise
+
+        Returns:
+            List[SitemapEntry]: Page entries in sitemap order
+        """
+        own_session = session is None
+        if own_session:
+            session = aiohttp.ClientSession(
+                headers=SITEMAP_HEADERS,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        page_entries: Dict[str, SitemapEntry] = {}
+        seen_sitemaps = {sitemap_url}
+        level = [sitemap_url]
+        fetched = 1
+
+        try:
+            await self._warm_up(session, get_base_url(sitemap_url))
+
+            for depth in range(self.max_depth + 1):
+                results = await asyncio.gather(*(self._fetch(session, semaphore, url) for url in level))
+
+                next_level = []
+                for pages, sub_sitemaps in results:
+                    for entry in pages:
+                        page_entries.setdefault(entry.loc, entry)
+                    for sub_sitemap in sub_sitemaps:
+                        if sub_sitemap not in seen_sitemaps:
+                            seen_sitemaps.add(sub_sitemap)
+                            next_level.append(sub_sitemap)
+
+                if not next_level:
+                    break
+                if depth == self.max_depth:
+                    print(f"Reached max sitemap depth {self.max_depth}, ignoring {len(next_level)} sub-sitemaps")
+                    break
+
+                budget = max(0, self.max_sitemaps - fetched)
+                if len(next_level) > budget:
+                    print(f"Sitemap limit {self.max_sitemaps} reached, ignoring {len(next_level) - budget} sub-sitemaps")
+                    next_level = next_level[:budget]
+                fetched += len(next_level)
+                print(f"Fetching {len(next_level)} sub-sitemaps (level {depth + 1})...")
+                level = next_level
+        finally:
+            if own_session:
+                await session.close()
+
+        return list(page_entries.values())
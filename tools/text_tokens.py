@@ -0,0 +1,28 @@
+import re
+
+
+# Rough tokens per character of English markdown for Qwen/Llama style tokenizers
+CHARS_PER_TOKEN = 4
+
+QUERY_TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Words that occur on nearly every page: they add nothing to the BM25 ranking
+# (their IDF is ~0) but make SQLite score almost every document of the corpus
+STOPWORDS = frozenset("""
+a about an and are as at be been but by can do does for from had has have how i if in into is it its
+me my no not of on or our so than that the their them then there these they this to was we were what
+when where which who why will with you your
+""".split())
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of model tokens of a text without a tokenizer.
+
+    Args:
+        text: The text
+
+    Returns:
+        int: The estimated token count (about 4 characters per token)
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
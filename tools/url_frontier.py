@@ -0,0 +1,183 @@
+import heapq
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+from urllib.parse import urlsplit
+
+from tools.crawl_manifest import canonicalize_url
+from tools.sitemap_parser import SitemapEntry, normalize_lastmod
+
+
+# Listing and utility pages that are never articles
+DEFAULT_EXCLUDE_PATTERNS = (
+    r"/(tag|tags|author|authors|category|categories|topic|topics|series|archive|archives)(/|$)",
+    r"/page/\d+/?$",
+    r"/(search|login|signin|signup|register|subscribe|newsletter|contact|about|privacy|terms|careers|jobs)(/|$)",
+    r"/(feed|rss|amp)/?$",
+    r"/wp-(content|admin|json)/",
+    r"\.(xml|gz|pdf|jpe?g|png|gif|svg|webp|zip|mp4|mp3)$",
+    r"[?&](replytocom|share|page)=",
+)
+
+# Dates in article URLs, e.g. /2024/05/17/slug or /2024/05/slug
+URL_DATE_PATTERN = re.compile(r"/(20\d{2}|19\d{2})/(0[1-9]|1[0-2])(?:/(0[1-9]|[12]\d|3[01]))?(?:/|$)")
+
+
+@dataclass
+class UrlRules:
+    """Which URLs of a domain are worth crawling."""
+    include: Tuple[str, ...] = ()
+    exclude: Tuple[str, ...] = DEFAULT_EXCLUDE_PATTERNS
+    min_depth: int = 1
+    max_depth: Optional[int] = None
+    require_date: bool = False
+
+    def __post_init__(self):
+        self._include: List[Pattern] = [re.compile(pattern, re.IGNORECASE) for pattern in self.include]
+        self._exclude: List[Pattern] = [re.compile(pattern, re.IGNORECASE) for pattern in self.exclude]
+
+    def rejection(self, url: str) -> Optional[str]:
+        """
+        Checks a URL against the rules.
+
+        Args:
+            url: The URL to check
+
+        Returns:
+            Optional[str]: Why the URL is rejected, None if it is accepted
+        """
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        target = path + (f"?{parts.query}" if parts.query else "")
+
+        depth = len([segment for segment in path.split("/") if segment])
+        if depth < self.min_depth:
+            return "too shallow"
+        if self.max_depth is not None and depth > self.max_depth:
+            return "too deep"
+        for pattern in self._exclude:
+            if pattern.search(target):
+                return f"excluded by {pattern.pattern}"
+        if self._include and not any(pattern.search(target) for pattern in self._include):
+            return "not included"
+        if self.require_date and not URL_DATE_PATTERN.search(path):
+            return "no date in URL"
+        return None
+
+
+# Article URLs of the sites in source/ai_blogs.py, domains without rules use the defaults
+DEFAULT_DOMAIN_RULES: Dict[str, UrlRules] = {
+    "bair.berkeley.edu": UrlRules(include=(r"^/blog/\d{4}/\d{2}/\d{2}/",)),
+    "huggingface.co": UrlRules(include=(r"^/blog/[^/]+/?$",)),
+    "openai.com": UrlRules(include=(r"^/(index|research)/[^/]+/?$",)),
+    "blog.paperspace.com": UrlRules(max_depth=1),
+}
+
+
+def url_date(url: str) -> Optional[str]:
+    """
+    Extracts the publication date from URLs like /2024/05/17/slug.
+
+    Args:
+        url: The URL
+
+    Returns:
+        Optional[str]: The date as ISO 8601 (UTC), None if the URL has no date
+    """
+    match = URL_DATE_PATTERN.search(urlsplit(url).path)
+    if not match:
+        return None
+    year, month, day = match.group(1), match.group(2), match.group(3) or "01"
+    return normalize_lastmod(f"{year}-{month}-{day}")
+
+
+class UrlFrontier:
+    """
+    Decides which sitemap entries are crawled and in which order.
+
+    Entries are filtered by the compiled rules of their domain (include and
+    exclude patterns, path depth, date segments) so tag, author and category
+    listings never use crawl budget. The rest is ordered newest first by
+    sitemap lastmod, falling back to the date in the URL; undated entries
+    follow in sitemap order.
+    """
+
+    def __init__(self, domain_rules: Optional[Dict[str, UrlRules]] = None, default_rules: Optional[UrlRules] = None):
+        """
+        Args:
+            domain_rules: Rules per host (a rule for example.com also applies to its subdomains),
+                `DEFAULT_DOMAIN_RULES` otherwise
+            default_rules: Rules for hosts without their own, the default exclude list otherwise
+        """
+        self.domain_rules = DEFAULT_DOMAIN_RULES if domain_rules is None else domain_rules
+        self.default_rules = default_rules or UrlRules()
+
+    def rules_for(self, url: str) -> UrlRules:
+        """
+        Returns the rules that apply to a URL.
+
+        Args:
+            url: The URL
+
+        Returns:
+            UrlRules: The rules of the most specific matching domain, or the default rules
+        """
+        host = (urlsplit(url).hostname or "").lower()
+        labels = host.split(".")
+        for start in range(len(labels) - 1):
+            rules = self.domain_rules.get(".".join(labels[start:]))
+            if rules is not None:
+                return rules
+        return self.domain_rules.get("www." + host, self.default_rules)
+
+    def accepts(self, url: str) -> bool:
+        """
+        Checks whether a URL is worth crawling.
+
+        Args:
+            url: The URL
+
+        Returns:
+            bool: True if the URL passes the rules of its domain
+        """
+        return self.rules_for(url).rejection(url) is None
+
+    def select(self, entries: Iterable[SitemapEntry], limit: Optional[int] = None) -> List[SitemapEntry]:
+        """
+        Picks the newest crawlable entries.
+
+        Args:
+            entries: Sitemap entries in sitemap order
+            limit: Optional maximum number of entries ("newest N"), all accepted entries otherwise
+
+        Returns:
+            List[SitemapEntry]: The accepted entries, newest first, de-duplicated by canonical URL
+        """
+        accepted = []
+        seen = set()
+        rejected: Dict[str, int] = {}
+        for index, entry in enumerate(entries):
+            if entry.is_sitemap:
+                continue
+            reason = self.rules_for(entry.loc).rejection(entry.loc)
+            if reason is not None:
+                rejected[reason] = rejected.get(reason, 0) + 1
+                continue
+            canonical = canonicalize_url(entry.loc)
+            if canonical in seen:
+                continue
+            seen.add(canonical)
+            date = entry.lastmod or url_date(entry.loc)
+            # Dated entries first (newest first), undated ones after them in sitemap order
+            accepted.append(((date is not None, date or "", -index), entry))
+
+        if rejected:
+            print(f"Frontier skipped {sum(rejected.values())} URLs: "
+                  + ", ".join(f"{count} {reason}" for reason, count in sorted(rejected.items(), key=lambda r: -r[1])))
+
+        if limit is None:
+            ranked = sorted(accepted, key=lambda item: item[0], reverse=True)
+        else:
+            # Only the top N have to be ordered, which keeps huge sitemaps cheap
+            ranked = heapq.nlargest(limit, accepted, key=lambda item: item[0])
+        return [entry for _, entry in ranked]
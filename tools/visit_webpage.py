@@ -1,9 +1,149 @@
-from typing import Any, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
 from smolagents.tools import Tool
+from smolagents.utils import truncate_content
 import requests
 import markdownify
 import smolagents
 
+from tools.crawl_scheduler import get_host
+from tools.http_cache import HTML_CONTENT_TYPES, CachedResponse, HttpCache, get_http_cache
+from tools.markdown_workers import get_conversion_pool
+
+# Characters of markdown returned to the agent
+MAX_OUTPUT_CHARS = 10000
+# Nothing beyond this is downloaded, however little text the page has
+MAX_DOWNLOAD_BYTES = 2 * 1024 * 1024
+
+# visit_webpages: pages per call, characters of all pages together (shared evenly) and at least per page
+MAX_BATCH_URLS = 10
+MAX_BATCH_OUTPUT_CHARS = 20000
+MIN_PAGE_CHARS = 2000
+
+
+@dataclass
+class PageVisit:
+    """The outcome of visiting one page: its markdown or why it could not be read."""
+    url: str
+    markdown: str = ""
+    error: Optional[str] = None
+    from_cache: bool = False
+    complete: bool = True
+
+
+def fetch_page(url: str, cache: HttpCache, max_chars: int = MAX_OUTPUT_CHARS,
+               session: Optional[requests.Session] = None) -> CachedResponse:
+    """
+    Downloads a web page through the HTTP cache, only as far as needed for `max_chars` of markdown.
+
+    Args:
+        url: The page URL
+        cache: The HTTP cache
+        max_chars: Characters of markdown that will be kept
+        session: Optional session to reuse pooled connections
+
+    Returns:
+        CachedResponse: The (possibly cut off) response
+
+    Raises:
+        requests.exceptions.RequestException: On network errors, bad status codes and non-HTML pages
+    """
+    # Read until the page has three times the kept characters of visible text (boilerplate included),
+    # the rest would be truncated anyway
+    return cache.fetch(url, timeout=20, max_bytes=MAX_DOWNLOAD_BYTES, text_chars=3 * max_chars,
+                       content_types=HTML_CONTENT_TYPES, session=session)
+
+
+def page_markdown(response: CachedResponse, markdown: str, max_chars: int = MAX_OUTPUT_CHARS) -> str:
+    """Truncates converted markdown for the agent, noting when the download was cut off."""
+    if not response.complete and len(markdown) <= max_chars:
+        markdown += f"\n\n[... page cut off after {len(response.content) // 1024} KB ...]"
+    return truncate_content(markdown, max_chars)
+
+
+def describe_error(error: Exception) -> str:
+    """The message the agent gets for a page that could not be visited."""
+    if isinstance(error, requests.exceptions.Timeout):
+        return "The request timed out. Please try again later or check the URL."
+    if isinstance(error, requests.exceptions.RequestException):
+        return f"Error fetching the webpage: {str(error)}"
+    return f"An unexpected error occurred: {str(error)}"
+
+
+def visit_webpages(urls: List[str], cache: Optional[HttpCache] = None, max_chars: int = MAX_OUTPUT_CHARS,
+                   max_workers: int = 8, per_host: int = 2) -> List[PageVisit]:
+    """
+    Visits several pages at once and converts them to markdown.
+
+    The pages are downloaded concurrently over one pooled session, with at
+    most `per_host` requests to the same host at a time, and each page is
+    handed to the conversion pool as soon as it arrives, so conversion
+    overlaps with the downloads still running. Pages go through the HTTP
+    cache like single visits.
+
+    Args:
+        urls: The page URLs, duplicates are visited once
+        cache: Optional response cache, the shared one otherwise
+        max_chars: Characters of markdown kept per page
+        max_workers: Pages downloading at the same time
+        per_host: Pages downloading from the same host at the same time
+
+    Returns:
+        List[PageVisit]: One visit per distinct URL, in the order given
+    """
+    urls = list(dict.fromkeys(urls))
+    cache = cache or get_http_cache()
+    visits: Dict[str, PageVisit] = {url: PageVisit(url) for url in urls}
+    responses: Dict[str, CachedResponse] = {}
+    host_slots: Dict[str, threading.Semaphore] = {}
+    for url in urls:
+        host_slots.setdefault(get_host(url), threading.Semaphore(per_host))
+
+    def download(url: str) -> CachedResponse:
+        with host_slots[get_host(url)]:
+            return fetch_page(url, cache, max_chars, session)
+
+    def downloaded_pages():
+        # Feeds the conversion pool in order of arrival
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                responses[url] = future.result()
+            except Exception as e:
+                visits[url].error = describe_error(e)
+                continue
+            yield url, responses[url].text
+
+    workers = max(1, min(max_workers, len(urls)))
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=len(host_slots) or 1, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="visit") as executor:
+            futures = {executor.submit(download, url): url for url in urls}
+            try:
+                pages = get_conversion_pool().convert_many(downloaded_pages(), return_exceptions=True)
+                for url, markdown, _ in pages:
+                    if isinstance(markdown, Exception):
+                        # Only this page failed, the others are still converted
+                        visits[url].error = describe_error(markdown)
+                        continue
+                    response = responses[url]
+                    visits[url].markdown = page_markdown(response, markdown, max_chars)
+                    visits[url].from_cache = response.from_cache
+                    visits[url].complete = response.complete
+            except Exception as e:
+                # The conversion pool itself failed
+                for visit in visits.values():
+                    if not visit.markdown and visit.error is None:
+                        visit.error = describe_error(e)
+    finally:
+        session.close()
+    return [visits[url] for url in urls]
+
 class VisitWebpageTool(Tool):
     name = "visit_webpage"
     description = "Visits a webpage at the given url and reads its content as a markdown string. Use this to browse webpages."
@@ -12,34 +152,62 @@ class VisitWebpageTool(Tool):
 
     def forward(self, url: str) -> str:
         try:
-            import requests
-            from markdownify import markdownify
-            from requests.exceptions import RequestException
-
-            from smolagents.utils import truncate_content
-        except ImportError as e:
-            raise ImportError(
-                "You must install packages `markdownify` and `requests` to run this tool: for instance run `pip install markdownify requests`."
-            ) from e
-        try:
-            # Send a GET request to the URL with a 20-second timeout
-            response = requests.get(url, timeout=20)
-            response.raise_for_status()  # Raise an exception for bad status codes
-
-            # Convert the HTML content to Markdown
-            markdown_content = markdownify(response.text).strip()
+            # GET the URL with a 20-second timeout, through the shared cache so revisits skip the network;
+            # raises for bad status codes and non-HTML pages, stops downloading once there is enough text
+            response = fetch_page(url, self.cache or get_http_cache())
 
-            # Remove multiple line breaks
-            markdown_content = re.sub(r"\n{3,}", "\n\n", markdown_content)
+            # Convert the main article to Markdown, without navigation, banners and footers,
+            # in a worker process so other threads keep running meanwhile
+            markdown_content, _ = get_conversion_pool().convert_now(response.text)
 
-            return truncate_content(markdown_content, 10000)
+            return page_markdown(response, markdown_content)
 
-        except requests.exceptions.Timeout:
-            return "The request timed out. Please try again later or check the URL."
-        except RequestException as e:
-            return f"Error fetching the webpage: {str(e)}"
         except Exception as e:
-            return f"An unexpected error occurred: {str(e)}"
+            return describe_error(e)
+
+    def __init__(self, cache: Optional[HttpCache] = None):
+        """
+        Args:
+            cache: Optional response cache, the shared one under ../DATA otherwise
+        """
+        super().__init__()
+        self.cache = cache
+
+
+class VisitWebpagesTool(Tool):
+    name = "visit_webpages"
+    description = (
+        "Visits several webpages at once and reads their content as markdown, one section per page. "
+        f"Use this instead of visiting pages one by one when you have more than one url (up to {MAX_BATCH_URLS})."
+    )
+    inputs = {'urls': {'type': 'array', 'description': 'The urls of the webpages to visit.'}}
+    output_type = "string"
+
+    def __init__(self, cache: Optional[HttpCache] = None, max_output_chars: int = MAX_BATCH_OUTPUT_CHARS):
+        """
+        Args:
+            cache: Optional response cache, the shared one under ../DATA otherwise
+            max_output_chars: Characters of markdown of all pages together, shared evenly among them
+        """
+        super().__init__()
+        self.cache = cache
+        self.max_output_chars = max_output_chars
+
+    def forward(self, urls: List[str]) -> str:
+        if isinstance(urls, str):
+            urls = [urls]
+        urls = list(dict.fromkeys(url.strip() for url in urls if url and url.strip()))
+        if not urls:
+            return "No urls given."
+        skipped = urls[MAX_BATCH_URLS:]
+        urls = urls[:MAX_BATCH_URLS]
+
+        max_chars = min(MAX_OUTPUT_CHARS, max(MIN_PAGE_CHARS, self.max_output_chars // len(urls)))
+        visits = visit_webpages(urls, self.cache, max_chars)
 
-    def __init__(self, *args, **kwargs):
-        self.is_initialized = False
+        sections = []
+        for number, visit in enumerate(visits, 1):
+            sections.append(f"## Page {number} of {len(visits)}: {visit.url}\n\n{visit.error or visit.markdown}")
+        if skipped:
+            sections.append(f"Not visited (only {MAX_BATCH_URLS} pages per call): " + ", ".join(skipped))
+        return "\n\n".join(sections)
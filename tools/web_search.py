@@ -1,16 +1,24 @@
 from typing import Any, Optional
+from smolagents.default_tools import GoogleSearchTool as BaseGoogleSearchTool
 from smolagents.tools import Tool
 import duckduckgo_search
 
+from tools.search_cache import SearchCache, get_search_cache, normalize_query
+from tools.search_gateway import SearchGateway, get_search_gateway
+
 class DuckDuckGoSearchTool(Tool):
     name = "web_search"
     description = "Performs a duckduckgo web search based on your query (think a Google search) then returns the top search results."
     inputs = {'query': {'type': 'string', 'description': 'The search query to perform.'}}
     output_type = "string"
 
-    def __init__(self, max_results=10, **kwargs):
+    def __init__(self, max_results=10, cache: Optional[SearchCache] = None,
+                 gateway: Optional[SearchGateway] = None, **kwargs):
         super().__init__()
         self.max_results = max_results
+        # Optional search cache and gateway, the shared ones otherwise
+        self.cache = cache
+        self.gateway = gateway
         try:
             from duckduckgo_search import DDGS
         except ImportError as e:
@@ -20,8 +28,60 @@ class DuckDuckGoSearchTool(Tool):
         self.ddgs = DDGS(**kwargs)
 
     def forward(self, query: str) -> str:
-        results = self.ddgs.text(query, max_results=self.max_results)
+        cache = self.cache or get_search_cache()
+        results = cache.get("duckduckgo", query, max_results=self.max_results)
+        if results is None:
+            def search():
+                results = self.ddgs.text(query, max_results=self.max_results)
+                if results:
+                    cache.put("duckduckgo", query, results, max_results=self.max_results)
+                return results
+
+            # Rate limited and sent once for identical searches of other agents running at the same time
+            results = (self.gateway or get_search_gateway()).search(
+                "duckduckgo", (normalize_query(query), self.max_results), search
+            )
+        else:
+            print(f"Search results for '{query}' from the search cache")
         if len(results) == 0:
             raise Exception("No results found! Try a less restrictive/shorter query.")
         postprocessed_results = [f"[{result['title']}]({result['href']})\n{result['body']}" for result in results]
         return "## Search Results\n\n" + "\n\n".join(postprocessed_results)
+
+
+class GoogleSearchTool(BaseGoogleSearchTool):
+    """
+    smolagents' Google search (SerpAPI or Serper) through the shared search
+    cache and gateway: repeated searches are answered from the cache, and
+    the paid API is called at a rate it sustains, once for identical
+    searches running at the same time.
+    """
+
+    def __init__(self, provider: str = "serpapi", cache: Optional[SearchCache] = None,
+                 gateway: Optional[SearchGateway] = None):
+        """
+        Args:
+            provider: "serpapi" or "serper", the API key is read from SERPAPI_API_KEY / SERPER_API_KEY
+            cache: Optional search cache, the shared one under ../DATA otherwise
+            gateway: Optional search gateway, the shared one otherwise
+        """
+        super().__init__(provider=provider)
+        self.cache = cache
+        self.gateway = gateway
+
+    def forward(self, query: str, filter_year: Optional[int] = None) -> str:
+        cache = self.cache or get_search_cache()
+        results = cache.get(self.provider, query, filter_year)
+        if results is not None:
+            print(f"Search results for '{query}' from the search cache")
+            return results
+
+        def search():
+            results = BaseGoogleSearchTool.forward(self, query, filter_year)
+            if not results.startswith("No results found"):
+                cache.put(self.provider, query, results, filter_year)
+            return results
+
+        return (self.gateway or get_search_gateway()).search(
+            self.provider, (normalize_query(query), filter_year), search
+        )